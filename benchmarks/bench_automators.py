@@ -0,0 +1,198 @@
+"""
+Offline end-to-end benchmark: runs the real Whisk and Instagram automators
+against the local stand-in pages in fake_sites.py, so changes to waits,
+locators, text entry or image handling can be timed without an account,
+network access or AI credits.
+
+Per-step timings come from events the fake pages report back (seconds since
+the automator was called); end-to-end time is the automator call itself.
+Generation, face analysis and sharing latencies are simulated with fixed
+delays, so differences between runs are the automation's own overhead.
+
+Usage:
+    python benchmarks/bench_automators.py --runs 3
+    python benchmarks/bench_automators.py --runs 3 --save bench_baseline.json
+    python benchmarks/bench_automators.py --runs 3 --compare bench_baseline.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_sites import FakeSites
+
+PROMPTS = [
+    "A cinematic portrait of a person in a neon-lit futuristic city.",
+    "A person sitting at an aesthetic cafe looking sideways, coffee mug.",
+    "A person walking along a beach at golden hour, wind in their hair.",
+]
+CAPTION = "Golden hour again ✨\n\nWhich one is your favourite?\n\n#automation #benchmark"
+# Regressions smaller than this are noise whatever the tolerance
+MIN_REGRESSION_S = 0.25
+
+
+def _configure(sites: FakeSites, workdir: str, args):
+    """Points the automators at the fake sites; must run before they are imported."""
+    os.environ.update({
+        "WHISK_URL": sites.whisk_url,
+        "INSTAGRAM_URL": sites.instagram_url,
+        "WHISK_STATE_FILE": os.path.join(workdir, "whisk_state.json"),
+        "WHISK_PROFILE_DIR": os.path.join(workdir, "chrome_profile"),
+        "IG_PROFILE_DIR": os.path.join(workdir, "chrome_profile_ig"),
+        "WHISK_GENERATION_TIMEOUT": str(args.gen_delay * 3 + 10),
+        "IG_SETTLE_SCALE": str(args.settle_scale),
+        "HEADLESS": "false" if args.headed else "true",
+        "REFERENCE_IMAGE_PATH": os.path.join(REPO_DIR, "reference_image.jpg"),
+        "BACKLOG_HARVEST": "0",
+        "FACE_METRICS_FILE": os.path.join(workdir, "face_metrics.jsonl"),
+        "ROUTE_METRICS_FILE": os.path.join(workdir, "route_metrics.jsonl"),
+        "IG_LOCATOR_CACHE_FILE": os.path.join(workdir, "ig_locator_cache.json"),
+        "TRACE_DIR": os.path.join(workdir, "traces"),
+        "RUN_TRACE_DIR": os.path.join(workdir, "run_traces"),
+        "RUN_METRICS_DB": os.path.join(workdir, "run_metrics.db"),
+        # Fixed deadlines, so a baseline stays comparable
+        "ADAPTIVE_TIMEOUTS": "0",
+    })
+    os.environ.setdefault("CHROME_CHANNEL", "")
+
+
+def _steps(events: list, started: float) -> dict:
+    """Seconds from `started` to each page event; repeated events are numbered (generate, generate#2, ...)."""
+    steps, seen = {}, {}
+    for at, _site, name in events:
+        seen[name] = seen.get(name, 0) + 1
+        steps[name if seen[name] == 1 else f"{name}#{seen[name]}"] = round(at - started, 3)
+    return steps
+
+
+def run_whisk(sites: FakeSites, workdir: str, fresh: bool) -> dict:
+    import whisk_automator
+
+    if fresh and os.path.exists(whisk_automator.STATE_FILE):
+        os.remove(whisk_automator.STATE_FILE)
+    started = time.monotonic()
+    paths = whisk_automator.generate_images(PROMPTS, os.path.join(workdir, "bench_whisk"))
+    total = time.monotonic() - started
+    return {"total": round(total, 3), "ok": len(paths.real) == len(PROMPTS), "steps": _steps(sites.events_since(started), started)}
+
+
+def run_instagram(sites: FakeSites, workdir: str, images: list) -> dict:
+    import ig_poster
+
+    started = time.monotonic()
+    ok = ig_poster.post_to_instagram(images, CAPTION)
+    total = time.monotonic() - started
+    return {"total": round(total, 3), "ok": bool(ok), "steps": _steps(sites.events_since(started), started)}
+
+
+def summarize(runs: list) -> dict:
+    """Median end-to-end time and median time to each step over the runs."""
+    names = []
+    for run in runs:
+        names += [n for n in run["steps"] if n not in names]
+    return {
+        "runs": len(runs),
+        "failures": sum(not r["ok"] for r in runs),
+        "total": round(statistics.median(r["total"] for r in runs), 3),
+        "steps": {n: round(statistics.median(r["steps"][n] for r in runs if n in r["steps"]), 3) for n in names},
+    }
+
+
+def print_summary(site: str, summary: dict, runs: list):
+    print(f"\n{site}: {summary['runs']} runs, {summary['failures']} failed, median end-to-end {summary['total']:.2f}s")
+    print(f"  {'step':<22} {'median (s)':>11} {'delta (s)':>10}")
+    previous = 0.0
+    for name, at in sorted(summary["steps"].items(), key=lambda item: item[1]):
+        print(f"  {name:<22} {at:>11.2f} {at - previous:>10.2f}")
+        previous = at
+    print("  per run: " + ", ".join(f"{r['total']:.2f}s" for r in runs))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics slower than the baseline by more than `tolerance` (fraction) and MIN_REGRESSION_S."""
+    regressions = []
+    for site, summary in results.items():
+        base = baseline.get(site)
+        if not base:
+            continue
+        metrics = [("end-to-end", summary["total"], base["total"])]
+        metrics += [(n, at, base["steps"][n]) for n, at in summary["steps"].items() if n in base["steps"]]
+        for name, now, before in metrics:
+            if now > before * (1 + tolerance) and now - before > MIN_REGRESSION_S:
+                regressions.append(f"{site} {name}: {before:.2f}s -> {now:.2f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the automators against local fake Whisk/Instagram pages")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per site")
+    parser.add_argument("--only", choices=["whisk", "instagram"], help="Benchmark one site only")
+    parser.add_argument("--gen-delay", type=float, default=2.0, help="Simulated seconds per generation request")
+    parser.add_argument("--analyze-delay", type=float, default=1.5, help="Simulated face analysis seconds")
+    parser.add_argument("--share-delay", type=float, default=1.0, help="Simulated seconds until a post is shared")
+    parser.add_argument("--variations", type=int, default=2, help="Images per generation response")
+    parser.add_argument("--settle-scale", type=float, default=0.1, help="IG_SETTLE_SCALE for the fixed Instagram pauses")
+    parser.add_argument("--fresh", action="store_true", help="Forget the saved Whisk project before every run")
+    parser.add_argument("--no-filler", action="store_true", help="Serve Instagram without the captured feed DOM")
+    parser.add_argument("--headed", action="store_true", help="Show the browser")
+    parser.add_argument("--save", help="Write the summary to this JSON file (a baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sites = FakeSites(generation_delay=args.gen_delay, analyze_delay=args.analyze_delay, share_delay=args.share_delay,
+                      variations=args.variations, feed_filler=not args.no_filler).start()
+    workdir = tempfile.mkdtemp(prefix="bench_automators_")
+    _configure(sites, workdir, args)
+    upload_image = os.path.join(workdir, "upload.jpg")
+    shutil.copy(os.path.join(REPO_DIR, "reference_image.jpg"), upload_image)
+
+    all_runs, results = {}, {}
+    try:
+        for site in ("whisk", "instagram"):
+            if args.only and args.only != site:
+                continue
+            runs = []
+            for _ in range(args.runs):
+                if site == "whisk":
+                    runs.append(run_whisk(sites, workdir, args.fresh))
+                else:
+                    runs.append(run_instagram(sites, workdir, [upload_image] * 3))
+            all_runs[site] = runs
+            results[site] = summarize(runs)
+    finally:
+        sites.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for site, summary in results.items():
+        print_summary(site, summary, all_runs[site])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n[ERROR] {len(regressions)} regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}.")
+
+    if any(summary["failures"] for summary in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Micro-benchmark: blob: URL extraction over CDP.
+
+Compares the old `Array.from(new Uint8Array(buf))` path with the base64
+path in blob_transfer.fetch_blob_bytes. Each mode runs in its own
+subprocess so the reported peak RSS belongs to that mode alone.
+
+Usage:
+    python benchmarks/bench_blob_transfer.py --size-mb 4 --runs 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ARRAY_JS = """
+    async (blobUrl) => {
+        const res = await fetch(blobUrl);
+        const blob = await res.blob();
+        const buf = await blob.arrayBuffer();
+        return Array.from(new Uint8Array(buf));
+    }
+"""
+
+# Builds a random JPEG-signed blob of the requested size and returns its URL
+MAKE_BLOB_JS = """
+    (size) => {
+        const bytes = new Uint8Array(size);
+        for (let i = 0; i < size; i += 65536) {
+            crypto.getRandomValues(bytes.subarray(i, Math.min(i + 65536, size)));
+        }
+        bytes.set([0xff, 0xd8, 0xff, 0xe0]);
+        return URL.createObjectURL(new Blob([bytes], { type: 'image/jpeg' }));
+    }
+"""
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (Linux/macOS via resource, Windows via psapi)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+
+
+def run_worker(mode: str, size_mb: float, runs: int) -> dict:
+    """Transfers the same blob `runs` times with one mode and reports throughput and peak RSS."""
+    from playwright.sync_api import sync_playwright
+    from blob_transfer import fetch_blob_bytes
+
+    size = int(size_mb * 1024 * 1024)
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        blob_url = page.evaluate(MAKE_BLOB_JS, size)
+        baseline_rss = _peak_rss_mb()
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            if mode == "array":
+                data = bytes(page.evaluate(ARRAY_JS, blob_url))
+            else:
+                data = fetch_blob_bytes(page, blob_url)
+            timings.append(time.perf_counter() - start)
+            assert len(data) == size, f"{mode}: got {len(data)} bytes, expected {size}"
+            del data
+
+        browser.close()
+
+    best = min(timings)
+    return {
+        "mode": mode,
+        "size_mb": size_mb,
+        "best_s": round(best, 4),
+        "mean_s": round(sum(timings) / len(timings), 4),
+        "mb_per_s": round(size_mb / best, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(_peak_rss_mb() - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blob extraction over CDP")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Blob size in MB (Whisk JPEGs are ~1-5 MB)")
+    parser.add_argument("--runs", type=int, default=5, help="Transfers per mode")
+    parser.add_argument("--worker", choices=["array", "base64"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.size_mb, args.runs)))
+        return
+
+    results = []
+    for mode in ("array", "base64"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", mode, "--size-mb", str(args.size_mb), "--runs", str(args.runs)],
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"\nBlob transfer: {args.size_mb} MB x {args.runs} runs")
+    print(f"{'mode':<8} {'best (s)':>9} {'mean (s)':>9} {'MB/s':>8} {'peak RSS':>10} {'RSS growth':>11}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['best_s']:>9} {r['mean_s']:>9} {r['mb_per_s']:>8} {r['peak_rss_mb']:>9}M {r['peak_rss_growth_mb']:>10}M")
+    speedup = results[0]["best_s"] / results[1]["best_s"]
+    print(f"\nbase64 is {speedup:.1f}x faster than Array.from(Uint8Array)")
+
+
+if __name__ == "__main__":
+    main()
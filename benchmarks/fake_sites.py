@@ -0,0 +1,301 @@
+"""
+Local stand-ins for Whisk and Instagram, served over localhost for offline benchmarks.
+
+The pages imitate only what the automators touch, using the labels seen in the
+captured whisk_tool_text.txt / ig_dialog_text.txt / ig_modal_dump.html:
+
+  Whisk      CLOSE-able credits popup, ADD IMAGES -> file input -> "Analyzing image..."
+             -> subject thumbnail and a /project/<id> URL, prompt textarea,
+             aspect_ratio menu, arrow_forward -> generateImage JSON (base64
+             variations after a configurable delay) rendered as blob: images.
+  Instagram  Sidebar Create (svg "New post") -> Post -> dialog with "Select from
+             computer" -> crop (Select crop / Original / 4:5) -> Next -> Next ->
+             "Write a caption..." -> Share -> "Your post has been shared."
+
+Every step the page reaches is reported to the server (/__event) and stored with
+a time.monotonic() timestamp, so a benchmark in the same process gets per-step
+timings without parsing logs.
+"""
+import os
+import re
+import json
+import time
+import base64
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_EVENT_JS = """
+function emit(name) { navigator.sendBeacon('/__event', SITE + ':' + name); }
+"""
+
+WHISK_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Whisk</title>
+<style>body{font-family:sans-serif} #results img{width:120px;margin:4px} [hidden]{display:none!important}</style>
+<script>
+// In <head> so page_waits' body.textContent checks never see this source
+const SITE = 'whisk';
+__EVENT_JS__
+const ANALYZE_MS = __ANALYZE_MS__;
+document.addEventListener('DOMContentLoaded', () => {
+  emit('page_loaded');
+  document.getElementById('close').onclick = () => document.getElementById('popup').remove();
+  document.getElementById('add').onclick = () => emit('add_images');
+  document.getElementById('file').onchange = async () => {
+    emit('file_selected');
+    document.getElementById('status').textContent = 'Analyzing image...';
+    const res = await fetch('/whisk/api/project', {method: 'POST'});
+    const {id} = await res.json();
+    setTimeout(() => {
+      document.getElementById('status').textContent = '';
+      document.getElementById('thumb').innerHTML = '<img src="/whisk/subject.jpg" width="96">';
+      history.replaceState(null, '', '/whisk/project/' + id);
+      emit('analysis_done');
+    }, ANALYZE_MS);
+  };
+  document.getElementById('ratio').onclick = () => { document.getElementById('ratios').hidden = false; };
+  for (const opt of document.querySelectorAll('.opt')) {
+    opt.onclick = () => { document.getElementById('ratios').hidden = true; emit('ratio_' + opt.textContent); };
+  }
+  document.getElementById('go').onclick = async () => {
+    emit('generate');
+    const prompt = document.getElementById('prompt').value;
+    const res = await fetch('/whisk/api/generateImage', {method: 'POST', body: JSON.stringify({prompt})});
+    const data = await res.json();
+    for (const panel of data.imagePanels) {
+      for (const img of panel.generatedImages) {
+        const bytes = Uint8Array.from(atob(img.encodedImage), c => c.charCodeAt(0));
+        const el = document.createElement('img');
+        el.src = URL.createObjectURL(new Blob([bytes], {type: 'image/jpeg'}));
+        document.getElementById('results').appendChild(el);
+      }
+    }
+    emit('results_rendered');
+  };
+});
+</script>
+</head><body>
+<div id="popup"><h2>Introducing AI Credits</h2><p>Create with AI credits (20 per video generation).</p><button id="close">CLOSE</button></div>
+<nav>menu Whisk EXPERIMENT add_photo_alternate MY LIBRARY About help_outlined PRO</nav>
+<section>
+  <span>person</span>
+  <button id="add">ADD IMAGES</button>
+  <input type="file" accept="image/*" id="file" hidden>
+  <div id="status"></div>
+  <div id="thumb">__THUMB__</div>
+</section>
+<textarea id="prompt" placeholder="Describe your idea or roll the dice for prompt ideas"></textarea>
+<button id="ratio"><span>aspect_ratio</span></button>
+<div id="ratios" hidden><div class="opt">1:1</div><div class="opt">9:16</div><div class="opt">16:9</div></div>
+<button id="tune"><span>tune</span></button>
+<button id="go"><span>arrow_forward</span></button>
+<div id="results"></div>
+<p>Disclaimer: /FX tools can make mistakes, so double-check them</p>
+</body></html>
+"""
+
+INSTAGRAM_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Instagram</title>
+<style>body{font-family:sans-serif} [hidden]{display:none!important}
+#dialog-root [role=dialog]{position:fixed;top:10%;left:20%;width:60%;background:#fff;border:1px solid #ccc;padding:12px}</style>
+<script>
+// In <head> so page_waits' body.textContent checks never see this source
+const SITE = 'instagram';
+__EVENT_JS__
+const SHARE_MS = __SHARE_MS__;
+document.addEventListener('DOMContentLoaded', () => {
+  emit('page_loaded');
+  const root = document.getElementById('dialog-root');
+  function dialog(html) { root.innerHTML = '<div role="dialog" aria-label="Create new post">' + html + '</div>'; }
+  function next(label, after) {
+    return '<div role="button" tabindex="0" class="next" data-after="' + after + '">' + label + '</div>';
+  }
+  document.getElementById('create').onclick = () => { document.getElementById('menu').hidden = false; emit('create'); };
+  document.getElementById('menu-post').onclick = () => {
+    document.getElementById('menu').hidden = true;
+    emit('post_menu');
+    dialog('<h1>Create new post</h1><p>Drag photos and videos here</p><button id="pick">Select from computer</button>'
+         + '<input type="file" id="files" accept="image/*" multiple hidden>');
+    document.getElementById('pick').onclick = () => document.getElementById('files').click();
+    document.getElementById('files').onchange = (e) => { emit('files_selected'); crop(e.target.files.length); };
+  };
+  function crop(count) {
+    dialog('<h1>Crop</h1>' + next('Next', 'filter') + '<p>' + count + ' photos</p>'
+         + '<button id="crop"><svg aria-label="Select crop" width="16" height="16"><rect width="16" height="16"/></svg></button>'
+         + '<div id="ratios" hidden><div role="button"><span>Original</span></div><div role="button"><span>1:1</span></div>'
+         + '<div role="button"><span>4:5</span></div><div role="button"><span>16:9</span></div></div>');
+    document.getElementById('crop').onclick = () => { document.getElementById('ratios').hidden = false; emit('crop_menu'); };
+    for (const r of document.querySelectorAll('#ratios [role=button]')) r.onclick = () => emit('ratio_' + r.textContent);
+  }
+  function filter() { dialog('<h1>Edit</h1>' + next('Next', 'caption') + '<p>Filters Adjustments</p>'); }
+  function caption() {
+    dialog('<h1>Create new post</h1><div role="button" tabindex="0" id="share">Share</div>'
+         + '<div contenteditable="true" role="textbox" aria-label="Write a caption..." id="caption"></div>');
+    const box = document.getElementById('caption');
+    box.addEventListener('input', () => { if (!box.dataset.typed) { box.dataset.typed = '1'; emit('caption_input'); } });
+    document.getElementById('share').onclick = () => {
+      emit('share');
+      dialog('<h1>Sharing</h1><p>Sharing...</p>');
+      setTimeout(() => { dialog('<h1>Post shared</h1><p>Your post has been shared.</p>'); emit('shared'); }, SHARE_MS);
+    };
+  }
+  root.addEventListener('click', (e) => {
+    const btn = e.target.closest('.next');
+    if (!btn) return;
+    emit('next_to_' + btn.dataset.after);
+    if (btn.dataset.after === 'filter') filter(); else caption();
+  });
+});
+</script>
+</head><body>
+<nav>
+  <a role="link">Home</a> <a role="link">Reels</a> <a role="link">Messages</a>
+  <div role="button" id="create" tabindex="0"><svg aria-label="New post" width="24" height="24"><rect width="24" height="24"/></svg><span>Create</span></div>
+  <div id="menu" hidden><a role="link" id="menu-post" tabindex="0">Post</a><a role="link">Live video</a><a role="link">Ad</a></div>
+</nav>
+<main id="feed">__FILLER__</main>
+<div id="dialog-root"></div>
+</body></html>
+"""
+
+
+def _feed_filler() -> str:
+    """
+    Body of the captured ig_modal_dump.html without scripts, styles or external
+    URLs, so the fake Instagram page has a realistically large DOM to search.
+    """
+    try:
+        with open(os.path.join(REPO_DIR, "ig_modal_dump.html"), "r", encoding="utf-8") as f:
+            html = f.read()
+    except OSError:
+        return ""
+    match = re.search(r"<body[^>]*>(.*)</body>", html, re.S)
+    body = match.group(1) if match else ""
+    body = re.sub(r"<script\b.*?</script>", "", body, flags=re.S)
+    body = re.sub(r"<style\b.*?</style>|<link\b[^>]*>", "", body, flags=re.S)
+    body = re.sub(r'\s(src|srcset|href)="[^"]*"', "", body)
+    # Only the fake sidebar may own the Create button
+    return body.replace('aria-label="New post"', 'aria-label="feed"')
+
+
+class FakeSites:
+    """Threaded localhost server for both fake sites, with the timings it observed in `events`."""
+
+    def __init__(self, generation_delay: float = 2.0, analyze_delay: float = 1.5, share_delay: float = 1.0,
+                 variations: int = 2, feed_filler: bool = True, reference_image: str = None):
+        self.generation_delay = generation_delay
+        self.analyze_delay = analyze_delay
+        self.share_delay = share_delay
+        self.variations = variations
+        with open(reference_image or os.path.join(REPO_DIR, "reference_image.jpg"), "rb") as f:
+            self.subject = f.read()
+        self.filler = _feed_filler() if feed_filler else ""
+        self.projects = set()
+        self.events = []  # (time.monotonic(), site, name)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def whisk_url(self) -> str:
+        return f"{self.base_url}/whisk/project"
+
+    @property
+    def instagram_url(self) -> str:
+        return f"{self.base_url}/instagram/"
+
+    def start(self):
+        sites = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                sites._get(self)
+
+            def do_POST(self):
+                sites._post(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def events_since(self, since: float) -> list:
+        with self._lock:
+            return [e for e in self.events if e[0] >= since]
+
+    # ── Handlers ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _send(handler, body: bytes, content_type: str, status: int = 200):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _get(self, handler):
+        path = handler.path.split("?", 1)[0]
+        if path.startswith("/whisk/project"):
+            project = path[len("/whisk/project"):].strip("/")
+            thumb = '<img src="/whisk/subject.jpg" width="96">' if project in self.projects else ""
+            page = (WHISK_PAGE.replace("__EVENT_JS__", _EVENT_JS).replace("__THUMB__", thumb)
+                    .replace("__ANALYZE_MS__", str(int(self.analyze_delay * 1000))))
+            self._send(handler, page.encode("utf-8"), "text/html; charset=utf-8")
+        elif path == "/whisk/subject.jpg":
+            self._send(handler, self.subject, "image/jpeg")
+        elif path == "/instagram/":
+            page = (INSTAGRAM_PAGE.replace("__EVENT_JS__", _EVENT_JS).replace("__FILLER__", self.filler)
+                    .replace("__SHARE_MS__", str(int(self.share_delay * 1000))))
+            self._send(handler, page.encode("utf-8"), "text/html; charset=utf-8")
+        else:
+            self._send(handler, b"not found", "text/plain", 404)
+
+    def _post(self, handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        path = handler.path.split("?", 1)[0]
+        if path == "/__event":
+            site, _, name = body.decode("utf-8", "replace").partition(":")
+            with self._lock:
+                self.events.append((time.monotonic(), site, name))
+            self._send(handler, b"", "text/plain", 204)
+        elif path == "/whisk/api/project":
+            project = uuid.uuid4().hex[:12]
+            self.projects.add(project)
+            self._send(handler, json.dumps({"id": project}).encode(), "application/json")
+        elif path == "/whisk/api/generateImage":
+            time.sleep(self.generation_delay)
+            # Distinct bytes per variation (trailing data after the JPEG end marker)
+            images = [{"encodedImage": base64.b64encode(self.subject + bytes([i]) * (i + 1)).decode(), "seed": i}
+                      for i in range(self.variations)]
+            payload = {"imagePanels": [{"prompt": json.loads(body or b"{}").get("prompt", ""), "generatedImages": images}]}
+            self._send(handler, json.dumps(payload).encode(), "application/json")
+        else:
+            self._send(handler, b"not found", "text/plain", 404)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the fake Whisk and Instagram pages for manual testing")
+    parser.add_argument("--generation-delay", type=float, default=2.0)
+    args = parser.parse_args()
+    sites = FakeSites(generation_delay=args.generation_delay).start()
+    print(f"Whisk:     {sites.whisk_url}\nInstagram: {sites.instagram_url}\nCtrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sites.stop()
@@ -0,0 +1,47 @@
+import base64
+
+# Reads a blob: URL inside the page and hands it back as base64. FileReader does
+# the encoding natively, so a multi-megabyte JPEG crosses the CDP channel as one
+# compact string instead of a JSON array with one number per byte.
+FETCH_BLOB_JS = """
+    async (blobUrl) => {
+        const res = await fetch(blobUrl);
+        const blob = await res.blob();
+        const dataUrl = await new Promise((resolve, reject) => {
+            const reader = new FileReader();
+            reader.onload = () => resolve(reader.result);
+            reader.onerror = () => reject(reader.error);
+            reader.readAsDataURL(blob);
+        });
+        return { type: blob.type, size: blob.size, data: dataUrl.slice(dataUrl.indexOf(',') + 1) };
+    }
+"""
+
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"RIFF": "image/webp",
+}
+
+
+def sniff_image_type(data: bytes) -> str:
+    """Returns the image MIME type implied by the leading magic bytes, or '' if unknown."""
+    for signature, mime in IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return mime
+    return ""
+
+
+def fetch_blob_bytes(page, blob_url: str) -> bytes:
+    """
+    Downloads a blob: URL from the page as raw bytes.
+    Raises ValueError if the payload is truncated or is not an image.
+    """
+    result = page.evaluate(FETCH_BLOB_JS, blob_url)
+    data = base64.b64decode(result["data"])
+    if len(data) != result["size"]:
+        raise ValueError(f"Blob truncated: got {len(data)} of {result['size']} bytes")
+    content_type = result["type"] or sniff_image_type(data)
+    if not content_type.startswith("image/"):
+        raise ValueError(f"Blob is not an image (content type: {content_type or 'unknown'})")
+    return data
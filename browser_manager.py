@@ -0,0 +1,203 @@
+import os
+import sys
+import time
+import shutil
+import subprocess
+import urllib.request
+from dotenv import load_dotenv
+import tracing
+
+load_dotenv()
+
+IS_HEADLESS = os.getenv("HEADLESS", "false").lower() == "true"
+# Explicit Chrome binary; otherwise the usual install locations are searched
+CHROME_PATH = os.getenv("CHROME_PATH")
+# First remote-debugging port handed out to warm profiles (one port per profile)
+CHROME_DEBUG_PORT = int(os.getenv("CHROME_DEBUG_PORT", "9222"))
+CHROME_ARGS = ["--disable-blink-features=AutomationControlled"]
+# Playwright channel for cold launches when no Chrome binary is found; empty uses Playwright's bundled Chromium
+CHROME_CHANNEL = os.getenv("CHROME_CHANNEL", "chrome")
+
+_CHROME_CANDIDATES = [
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+]
+_CHROME_COMMANDS = ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"]
+
+
+def find_chrome():
+    """Returns the Chrome executable to use, or None to let Playwright resolve channel='chrome' itself."""
+    if CHROME_PATH:
+        return CHROME_PATH
+    for path in _CHROME_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    for command in _CHROME_COMMANDS:
+        path = shutil.which(command)
+        if path:
+            return path
+    return None
+
+
+class ChromeDaemon:
+    """A long-lived Chrome process for one profile, reachable over CDP on a fixed port."""
+
+    def __init__(self, user_data_dir: str, port: int, headless: bool = IS_HEADLESS):
+        self.user_data_dir = user_data_dir
+        self.port = port
+        self.headless = headless
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30):
+        chrome_path = find_chrome()
+        if not chrome_path:
+            raise RuntimeError("Chrome not found. Set CHROME_PATH to the Chrome executable.")
+        args = [
+            chrome_path,
+            f"--user-data-dir={self.user_data_dir}",
+            f"--remote-debugging-port={self.port}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            *CHROME_ARGS,
+        ]
+        if self.headless:
+            args.append("--headless=new")
+        args.append("about:blank")
+
+        print(f"Starting warm Chrome for {os.path.basename(self.user_data_dir)} on port {self.port} (Headless: {self.headless})...")
+        started = time.monotonic()
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while time.monotonic() - started < timeout:
+            if self.is_healthy():
+                print(f"Warm Chrome ready in {time.monotonic() - started:.1f}s.")
+                return
+            if self.process.poll() is not None:
+                break
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Chrome for {self.user_data_dir} did not open its debugging port")
+
+    def is_healthy(self) -> bool:
+        """The process is alive and answers on its DevTools endpoint."""
+        if not self.process or self.process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"{self.endpoint}/json/version", timeout=2) as res:
+                return res.status == 200
+        except Exception:
+            return False
+
+    def ensure(self):
+        """Starts Chrome if it is not running, or restarts it if it crashed or hung."""
+        if self.is_healthy():
+            return
+        if self.process:
+            print(f"[WARNING] Warm Chrome for {os.path.basename(self.user_data_dir)} is unhealthy. Restarting...")
+            self.restarts += 1
+            self.stop()
+        self.start()
+
+    def stop(self):
+        if not self.process:
+            return
+        try:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+
+class BrowserManager:
+    """
+    Keeps one warm Chrome per profile alive across daily_job runs and hands out
+    contexts to each stage over CDP. Profile launch and load cost is paid once
+    per process instead of once per stage per run.
+    """
+
+    def __init__(self, headless: bool = IS_HEADLESS):
+        self.headless = headless
+        self._daemons = {}
+
+    def daemon(self, profile_dir: str) -> ChromeDaemon:
+        if profile_dir not in self._daemons:
+            port = CHROME_DEBUG_PORT + len(self._daemons)
+            self._daemons[profile_dir] = ChromeDaemon(os.path.join(os.getcwd(), profile_dir), port, self.headless)
+        return self._daemons[profile_dir]
+
+    def warm(self, *profile_dirs: str):
+        """Health-checks (and if needed starts or restarts) Chrome for each profile."""
+        for profile_dir in profile_dirs:
+            try:
+                self.daemon(profile_dir).ensure()
+            except Exception as e:
+                print(f"[WARNING] Could not warm Chrome for {profile_dir}: {e}")
+
+    def endpoint(self, profile_dir: str) -> str:
+        daemon = self.daemon(profile_dir)
+        daemon.ensure()
+        return daemon.endpoint
+
+    def close(self):
+        print("Stopping warm Chrome sessions...")
+        for daemon in self._daemons.values():
+            daemon.stop()
+        self._daemons.clear()
+
+
+def open_context(p, profile_dir: str, manager: BrowserManager = None):
+    """
+    Returns (context, release) for a Chrome profile.
+
+    With a manager, attaches to its warm Chrome over CDP; release() only closes
+    the pages this stage opened. Without one, launches a cold persistent context
+    as before; release() closes it.
+    """
+    if manager:
+        with tracing.span("chrome attach", profile=profile_dir) as trace:
+            try:
+                return _attach(p, manager, profile_dir)
+            except Exception as e:
+                # A crashed or wedged daemon: restart it once and try again
+                print(f"[WARNING] Could not attach to warm Chrome for {profile_dir}: {e}")
+                trace.set(restarted=True)
+                manager.daemon(profile_dir).stop()
+                return _attach(p, manager, profile_dir)
+
+    chrome_path = find_chrome()
+    print(f"Launching Chrome from {chrome_path or 'Playwright channel'} (Headless: {IS_HEADLESS})...")
+    with tracing.span("chrome launch", profile=profile_dir, headless=IS_HEADLESS):
+        context = p.chromium.launch_persistent_context(
+            user_data_dir=os.path.join(os.getcwd(), profile_dir),
+            executable_path=chrome_path,
+            headless=IS_HEADLESS,
+            channel=CHROME_CHANNEL or None,
+            args=CHROME_ARGS
+        )
+    return context, context.close
+
+
+def _attach(p, manager: BrowserManager, profile_dir: str):
+    endpoint = manager.endpoint(profile_dir)
+    print(f"Attaching to warm Chrome for {profile_dir} at {endpoint}...")
+    browser = p.chromium.connect_over_cdp(endpoint)
+    context = browser.contexts[0]
+    existing = set(context.pages)
+
+    def release():
+        for page in context.pages:
+            if page not in existing:
+                page.close()
+
+    return context, release
+
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding='utf-8')
+    print("Chrome executable:", find_chrome())
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import hashlib
+from contextlib import closing
+from datetime import datetime, timedelta
+from blob_transfer import sniff_image_type
+
+BACKLOG_DIR = os.getenv("BACKLOG_DIR", "backlog")
+# Keep every Whisk variation, not just the one posted (0 disables harvesting)
+BACKLOG_HARVEST = os.getenv("BACKLOG_HARVEST", "1") != "0"
+# Images older than this, or beyond this many (oldest and already used first), are deleted
+BACKLOG_MAX_AGE_DAYS = float(os.getenv("BACKLOG_MAX_AGE_DAYS", "30"))
+BACKLOG_MAX_IMAGES = int(os.getenv("BACKLOG_MAX_IMAGES", "500"))
+
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS variations (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256      TEXT NOT NULL UNIQUE,
+    file        TEXT NOT NULL,
+    theme       TEXT,
+    prompt      TEXT NOT NULL,
+    prompt_idx  INTEGER NOT NULL,
+    pass_no     INTEGER NOT NULL,
+    seq         INTEGER NOT NULL,
+    batch       TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    used_run    TEXT,
+    used_at     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_variations_unused ON variations (theme, used_run, batch);
+"""
+
+
+class ContentBacklog:
+    """
+    Every image Whisk produced, posted or not: raw files under backlog/images
+    (named by content hash) plus a SQLite index of prompt, theme, pass and date.
+
+    A batch is one generate_images run, so all images in it share the outfit
+    and location of that day's prompts and can make up a carousel together.
+
+    Every add() prunes the backlog to `max_age_days` and `max_images`.
+    """
+
+    def __init__(self, directory: str = BACKLOG_DIR, max_age_days: float = BACKLOG_MAX_AGE_DAYS, max_images: int = BACKLOG_MAX_IMAGES):
+        self.directory = directory
+        self.images_dir = os.path.join(directory, "images")
+        self.db_path = os.path.join(directory, "backlog.db")
+        self.max_age = timedelta(days=max_age_days)
+        self.max_images = max_images
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.images_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def add(self, variations: list, prompt: str, theme: str, batch: str, used_run: str = None) -> int:
+        """
+        Stores CapturedImage variations of one prompt. Duplicates (same bytes) are
+        ignored. Pass `used_run` for variations that are being posted right now.
+        Returns how many new images were stored.
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        stored = 0
+        with closing(self._connect()) as conn, conn:
+            for v in variations:
+                digest = hashlib.sha256(v.data).hexdigest()
+                name = f"{digest}{_EXTENSIONS.get(sniff_image_type(v.data), '.img')}"
+                path = os.path.join(self.images_dir, name)
+                if not os.path.exists(path):
+                    with open(path, "wb") as f:
+                        f.write(v.data)
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO variations (sha256, file, theme, prompt, prompt_idx, pass_no, seq, batch, created_at, used_run, used_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (digest, name, theme, prompt, v.prompt_idx, v.pass_no, v.seq, batch, now, used_run, now if used_run else None),
+                )
+                stored += cursor.rowcount
+        if stored:
+            self.prune()
+        return stored
+
+    def prune(self) -> int:
+        """
+        Deletes images older than the age limit, then the oldest beyond the size
+        limit (already used ones before unused ones). Returns how many went.
+        """
+        cutoff = (datetime.now() - self.max_age).isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            expired = conn.execute("SELECT id, file FROM variations WHERE created_at < ?", (cutoff,)).fetchall()
+            excess = conn.execute(
+                "SELECT id, file FROM variations WHERE created_at >= ?"
+                " ORDER BY used_run IS NULL, created_at, id LIMIT max(0, (SELECT COUNT(*) FROM variations WHERE created_at >= ?) - ?)",
+                (cutoff, cutoff, self.max_images),
+            ).fetchall()
+            doomed = expired + excess
+            conn.executemany("DELETE FROM variations WHERE id = ?", [(row["id"],) for row in doomed])
+        for row in doomed:
+            try:
+                os.remove(os.path.join(self.images_dir, row["file"]))
+            except OSError:
+                pass
+        if doomed:
+            print(f"Pruned {len(doomed)} images from the content backlog.")
+        return len(doomed)
+
+    def take(self, theme: str, count: int, run_id: str) -> list:
+        """
+        Claims `count` unused images of `theme` from a single batch (oldest batch
+        first, one image per prompt before doubling up) and marks them used by
+        `run_id`. Returns [{"path", "prompt"}, ...] in prompt order, or [] if no
+        batch has enough unused images.
+        """
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                "SELECT * FROM variations WHERE theme = ? AND used_run IS NULL ORDER BY batch, prompt_idx, pass_no DESC, seq",
+                (theme,),
+            ).fetchall()
+            batches = {}
+            for row in rows:
+                if os.path.exists(os.path.join(self.images_dir, row["file"])):
+                    batches.setdefault(row["batch"], []).append(row)
+
+            for batch_rows in batches.values():
+                if len(batch_rows) < count:
+                    continue
+                picked, seen_prompts = [], set()
+                for row in batch_rows:
+                    if row["prompt_idx"] not in seen_prompts and len(picked) < count:
+                        picked.append(row)
+                        seen_prompts.add(row["prompt_idx"])
+                picked_ids = {row["id"] for row in picked}
+                for row in batch_rows:
+                    if row["id"] not in picked_ids and len(picked) < count:
+                        picked.append(row)
+                picked.sort(key=lambda r: (r["prompt_idx"], r["pass_no"], r["seq"]))
+
+                now = datetime.now().isoformat(timespec="seconds")
+                conn.executemany(
+                    "UPDATE variations SET used_run = ?, used_at = ? WHERE id = ?",
+                    [(run_id, now, row["id"]) for row in picked],
+                )
+                return [{"path": os.path.abspath(os.path.join(self.images_dir, r["file"])), "prompt": r["prompt"]} for r in picked]
+        return []
+
+    def unused_count(self, theme: str = None) -> int:
+        with closing(self._connect()) as conn, conn:
+            if theme is None:
+                return conn.execute("SELECT COUNT(*) FROM variations WHERE used_run IS NULL").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM variations WHERE used_run IS NULL AND theme = ?", (theme,)).fetchone()[0]
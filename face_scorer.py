@@ -0,0 +1,225 @@
+import os
+import io
+import sys
+import json
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # scoring is optional; without it every prompt gets both passes
+    np = None
+
+# Best first-pass score needed to skip the second Generate click. Unset (the
+# default) always runs the second pass: the score is an uncalibrated heuristic,
+# so only set this from `python face_scorer.py --calibrate` on your own images.
+# 0 never runs the second pass, anything above 1 always runs it.
+_threshold = os.getenv("FACE_MATCH_THRESHOLD", "").strip()
+FACE_MATCH_THRESHOLD = float(_threshold) if _threshold else None
+# Calibration wants at least this gap between the two groups before suggesting a threshold
+CALIBRATION_MARGIN = 0.05
+FACE_METRICS_FILE = os.getenv("FACE_METRICS_FILE", "face_metrics.jsonl")
+# Images are scored at this size; plenty for colour and gradient statistics
+ANALYSIS_SIZE = 256
+FACE_CROP_SIZE = 64
+# Minimum share of skin-coloured pixels before a region is treated as a face
+MIN_SKIN_FRACTION = 0.01
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _load(data: bytes):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("RGB", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+    img = img.convert("YCbCr")
+    img.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    return np.asarray(img, dtype=np.float32)
+
+
+def _face_crop(ycc):
+    """
+    Locates the face as the bulk of the skin-coloured pixels (classic Cb/Cr box)
+    and returns that crop, or None when there is too little skin in frame.
+    """
+    cb, cr = ycc[..., 1], ycc[..., 2]
+    skin = (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+    if skin.mean() < MIN_SKIN_FRACTION:
+        return None
+    rows, cols = np.nonzero(skin)
+    # Percentiles rather than min/max so stray skin-toned background does not stretch the box
+    top, bottom = np.percentile(rows, [5, 60]).astype(int)
+    left, right = np.percentile(cols, [10, 90]).astype(int)
+    if bottom - top < 8 or right - left < 8:
+        return None
+    return ycc[top:bottom + 1, left:right + 1], skin[top:bottom + 1, left:right + 1]
+
+
+def _features(data: bytes):
+    """Feature vectors (skin chroma histogram, gradient orientation histogram) of the face region, or None."""
+    from PIL import Image
+
+    found = _face_crop(_load(data))
+    if found is None:
+        return None
+    crop, skin = found
+
+    # Chroma of the skin pixels: tone and lighting of the face
+    cb, cr = crop[..., 1][skin], crop[..., 2][skin]
+    chroma, _, _ = np.histogram2d(cb, cr, bins=16, range=[[77, 128], [133, 174]])
+    chroma = chroma.ravel() / max(chroma.sum(), 1)
+
+    # Gradient orientations over a 4x4 grid of the luma: rough facial layout
+    luma = np.asarray(Image.fromarray(crop[..., 0].astype(np.uint8)).resize((FACE_CROP_SIZE, FACE_CROP_SIZE)), dtype=np.float32)
+    gy, gx = np.gradient(luma)
+    magnitude = np.hypot(gx, gy)
+    orientation = ((np.arctan2(gy, gx) % np.pi) / np.pi * 8).astype(int).clip(0, 7)
+    cell = FACE_CROP_SIZE // 4
+    cells = (np.arange(FACE_CROP_SIZE) // cell)
+    bin_index = (cells[:, None] * 4 + cells[None, :]) * 8 + orientation
+    layout = np.bincount(bin_index.ravel(), weights=magnitude.ravel(), minlength=128)
+    layout /= max(np.linalg.norm(layout), 1e-6)
+    return chroma, layout
+
+
+@lru_cache(maxsize=4)
+def _reference_features(path: str, mtime: float):
+    with open(path, "rb") as f:
+        return _features(f.read())
+
+
+def score(data: bytes, reference_path: str) -> float:
+    """
+    Similarity (0..1) between the face region of generated image bytes and the
+    reference photo. A lightweight heuristic, not face recognition: it only
+    ranks candidates and decides whether a refinement pass is worth it.
+    Images with no detectable face score 0.
+    """
+    reference = _reference_features(reference_path, os.path.getmtime(reference_path))
+    candidate = _features(data)
+    if reference is None or candidate is None:
+        return 0.0
+    chroma = np.minimum(reference[0], candidate[0]).sum()  # histogram intersection
+    layout = float(np.dot(reference[1], candidate[1]))  # cosine, both are unit vectors
+    return round(float(0.5 * chroma + 0.5 * layout), 4)
+
+
+def skip_second_pass(first_pass_score) -> bool:
+    """True when the best first-pass score clears FACE_MATCH_THRESHOLD; never while it is unset."""
+    if FACE_MATCH_THRESHOLD is None or first_pass_score is None:
+        return False
+    return first_pass_score >= FACE_MATCH_THRESHOLD
+
+
+def best(candidates: list, reference_path: str):
+    """
+    Scores CapturedImage candidates and returns (best_candidate, best_score).
+    (None, None) when there are no candidates; the first candidate with score
+    None if scoring is unavailable or fails.
+    """
+    if not candidates:
+        return None, None
+    if not available():
+        return candidates[0], None
+    try:
+        scored = [(score(c.data, reference_path), c) for c in candidates]
+    except Exception as e:
+        print(f"[WARNING] Face scoring failed, keeping Whisk's first variation: {e}")
+        return candidates[0], None
+    top_score, top = max(scored, key=lambda sc: sc[0])
+    return top, top_score
+
+
+class RunStats:
+    """How often the second Generate pass was skipped during one generate_images run."""
+
+    def __init__(self):
+        self.prompts = 0
+        self.skipped = 0
+        self.scores = []
+
+    def record(self, second_pass_skipped: bool, final_score):
+        self.prompts += 1
+        self.skipped += int(second_pass_skipped)
+        if final_score is not None:
+            self.scores.append(final_score)
+
+    def report(self):
+        if not self.prompts:
+            return
+        average = sum(self.scores) / len(self.scores) if self.scores else None
+        threshold = "off" if FACE_MATCH_THRESHOLD is None else FACE_MATCH_THRESHOLD
+        print(f"[FACE] Second pass skipped for {self.skipped}/{self.prompts} prompts"
+              + (f" (average face score {average:.2f}, threshold {threshold})" if average is not None else ""))
+        record = {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "prompts": self.prompts,
+            "second_pass_skipped": self.skipped,
+            "threshold": FACE_MATCH_THRESHOLD,
+            "scores": self.scores,
+        }
+        try:
+            with open(FACE_METRICS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"[WARNING] Could not write face metrics: {e}")
+
+
+# ── Calibration ─────────────────────────────────────────────────────────────
+def _score_dir(directory: str, reference_path: str) -> list:
+    scores = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            scores.append((score(f.read(), reference_path), name))
+    return scores
+
+
+def calibrate(reference_path: str, same_dir: str, other_dir: str) -> dict:
+    """
+    Scores images of the reference person (`same_dir`, e.g. past Whisk outputs
+    that matched well) and of other people (`other_dir`) against the reference,
+    and suggests the lowest threshold no other-person image reaches. There is no
+    suggestion when the groups are closer than CALIBRATION_MARGIN: the second
+    pass should then stay on for every prompt.
+    """
+    same = _score_dir(same_dir, reference_path)
+    other = _score_dir(other_dir, reference_path)
+    result = {"same": same, "other": other, "threshold": None, "skip_rate": 0.0}
+    if not same or not other:
+        return result
+    highest_other = max(s for s, _ in other)
+    passing = [s for s, _ in same if s >= highest_other + CALIBRATION_MARGIN]
+    if passing:
+        result["threshold"] = round(highest_other + CALIBRATION_MARGIN, 2)
+        result["skip_rate"] = len(passing) / len(same)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    parser = argparse.ArgumentParser(description="Calibrate FACE_MATCH_THRESHOLD on your own images")
+    parser.add_argument("--calibrate", nargs=2, metavar=("SAME_DIR", "OTHER_DIR"), required=True,
+                        help="Folders of images of the reference person and of other people")
+    parser.add_argument("--reference", default=os.getenv("REFERENCE_IMAGE_PATH", "reference_image.jpg"))
+    args = parser.parse_args()
+    if not available():
+        sys.exit("numpy and Pillow are needed for face scoring.")
+
+    result = calibrate(args.reference, *args.calibrate)
+    for group in ("same", "other"):
+        print(f"\n{group} person ({len(result[group])} images)")
+        for value, name in sorted(result[group], reverse=True):
+            print(f"  {value:.3f}  {name}")
+    if result["threshold"] is None:
+        print(f"\n[WARNING] The groups are not separated by {CALIBRATION_MARGIN}; leave FACE_MATCH_THRESHOLD unset.")
+    else:
+        print(f"\nSuggested FACE_MATCH_THRESHOLD={result['threshold']} "
+              f"(second pass skipped for {result['skip_rate']:.0%} of the same-person images)")
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import base64
+import itertools
+from collections import deque
+from datetime import datetime
+
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+# Snapshots kept in memory; only the last few steps before a failure matter
+TRACE_RING_SIZE = int(os.getenv("TRACE_RING_SIZE", "8"))
+# Write the ring to disk even when nothing failed
+DEBUG_TRACE = os.getenv("DEBUG_TRACE", "0") == "1"
+# Also record a Playwright trace archive (trace.zip, open with `playwright show-trace`)
+PLAYWRIGHT_TRACE = os.getenv("PLAYWRIGHT_TRACE", "0") == "1"
+SNAPSHOT_SCALE = 0.4
+SNAPSHOT_QUALITY = 40
+
+# Numbers the dumps of this process, so two in the same second get their own directories
+_dump_ids = itertools.count(1)
+
+_DIALOG_TEXT_JS = """
+() => [...document.querySelectorAll('[role="dialog"]')].map(d => d.textContent).join('\\n----\\n')
+"""
+
+
+class FlightRecorder:
+    """
+    Keeps the last TRACE_RING_SIZE steps of one page (step name, URL, time and a
+    small JPEG screenshot) in memory. Nothing touches the disk unless a step
+    fails or DEBUG_TRACE is set; then the ring, the page HTML and the dialog
+    text are written to traces/<time>_<pid>-<n>_<name>/, one directory per dump.
+    With PLAYWRIGHT_TRACE each dump also gets the trace.zip of the steps since
+    the previous one, as tracing restarts after every failure dump.
+    """
+
+    def __init__(self, page, name: str, capacity: int = TRACE_RING_SIZE, debug: bool = DEBUG_TRACE):
+        self.page = page
+        self.name = name
+        self.debug = debug
+        self.ring = deque(maxlen=capacity)
+        self.started = time.monotonic()
+        self._cdp = None
+        self._tracing = False
+        if PLAYWRIGHT_TRACE:
+            self._start_tracing()
+
+    def _screenshot(self) -> bytes:
+        # Scaled down by the browser itself over CDP; plain JPEG screenshot otherwise
+        try:
+            if self._cdp is None:
+                self._cdp = self.page.context.new_cdp_session(self.page)
+            metrics = self._cdp.send("Page.getLayoutMetrics")["cssLayoutViewport"]
+            shot = self._cdp.send("Page.captureScreenshot", {
+                "format": "jpeg",
+                "quality": SNAPSHOT_QUALITY,
+                "clip": {"x": 0, "y": 0, "width": metrics["clientWidth"], "height": metrics["clientHeight"], "scale": SNAPSHOT_SCALE},
+            })
+            return base64.b64decode(shot["data"])
+        except Exception:
+            return self.page.screenshot(type="jpeg", quality=SNAPSHOT_QUALITY)
+
+    def step(self, name: str):
+        """Records a snapshot after a step (in memory only)."""
+        try:
+            image = self._screenshot()
+        except Exception:
+            image = None
+        self.ring.append({
+            "step": name,
+            "url": self.page.url,
+            "t": round(time.monotonic() - self.started, 2),
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "image": image,
+        })
+
+    def fail(self, step: str, error=None) -> str:
+        """Records the failing step and writes everything to disk. Returns the dump directory."""
+        self.step(f"FAILED: {step}")
+        directory = self._dump(step, error)
+        # A later failure on this page gets a trace of its own
+        if PLAYWRIGHT_TRACE:
+            self._start_tracing()
+        return directory
+
+    def finish(self, success: bool = True):
+        """Ends the recording; the ring is only written in debug mode."""
+        if self.debug:
+            self._dump("debug" if success else "failed", None)
+        elif self._tracing:
+            self._stop_tracing(None)
+
+    def _start_tracing(self):
+        try:
+            self.page.context.tracing.start(screenshots=True, snapshots=True)
+            self._tracing = True
+        except Exception as e:
+            print(f"[WARNING] Could not start Playwright tracing: {e}")
+
+    def _stop_tracing(self, path):
+        if not self._tracing:
+            return
+        self._tracing = False
+        try:
+            if path:
+                self.page.context.tracing.stop(path=path)
+            else:
+                self.page.context.tracing.stop()
+        except Exception as e:
+            print(f"[WARNING] Could not stop Playwright tracing: {e}")
+
+    def _dump(self, reason: str, error) -> str:
+        directory = os.path.join(TRACE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{os.getpid()}-{next(_dump_ids)}_{self.name}")
+        os.makedirs(directory, exist_ok=True)
+        steps = []
+        for i, snap in enumerate(self.ring, 1):
+            entry = {k: v for k, v in snap.items() if k != "image"}
+            if snap["image"]:
+                entry["screenshot"] = f"{i:02d}_{_slug(snap['step'])}.jpg"
+                with open(os.path.join(directory, entry["screenshot"]), "wb") as f:
+                    f.write(snap["image"])
+            steps.append(entry)
+        with open(os.path.join(directory, "trace.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, "reason": reason, "error": str(error) if error else None, "steps": steps},
+                      f, indent=2, ensure_ascii=False)
+        try:
+            with open(os.path.join(directory, "page.html"), "w", encoding="utf-8") as f:
+                f.write(self.page.content())
+            with open(os.path.join(directory, "dialog_text.txt"), "w", encoding="utf-8") as f:
+                f.write(self.page.evaluate(_DIALOG_TEXT_JS))
+        except Exception as e:
+            print(f"[WARNING] Could not capture page content for the trace: {e}")
+        self._stop_tracing(os.path.join(directory, "trace.zip"))
+        print(f"Trace for {self.name} ({reason}) written to {directory}")
+        return directory
+
+
+def _slug(text: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in text.lower()).strip("_")[:40]
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import random
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from google import genai
+from google.genai import errors, types
+from dotenv import load_dotenv
+import tracing
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Hard wall-clock budget for one generate_json call, retries included
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "90"))
+# Per-HTTP-request timeout handed to the SDK, so abandoned attempts also end
+GEMINI_REQUEST_TIMEOUT = float(os.getenv("GEMINI_REQUEST_TIMEOUT", "60"))
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 8.0
+# Client errors worth another attempt (request timeout, rate limit); other 4xx fail at once
+RETRYABLE_CLIENT_CODES = {408, 429}
+# Streamed responses larger than this are abandoned as runaway output
+MAX_RESPONSE_CHARS = 200_000
+METRICS_FILE = os.getenv("GEMINI_METRICS_FILE", "gemini_metrics.jsonl")
+
+api_key = os.getenv("GEMINI_API_KEY")
+client = None
+if api_key:
+    client = genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(GEMINI_REQUEST_TIMEOUT * 1000)))
+
+# Streams run here so the deadline holds even if the network read hangs
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gemini")
+
+
+class GeminiError(Exception):
+    """Raised when no attempt produced a valid response within the deadline."""
+
+
+def available() -> bool:
+    return client is not None
+
+
+def generate_json(prompt: str, schema: dict, label: str = "gemini", deadline: float = GEMINI_DEADLINE,
+                  max_attempts: int = GEMINI_MAX_ATTEMPTS, model: str = GEMINI_MODEL) -> dict:
+    """
+    Asks Gemini for a JSON object matching `schema` (JSON-schema response mode),
+    streams and checks it as it arrives, and validates the result.
+
+    Each failed attempt is retried with full-jitter exponential backoff until
+    `max_attempts` or the overall `deadline` runs out, then GeminiError is raised.
+    Errors no retry can fix (see _retryable) raise GeminiError straight away.
+    Latency and token counts of every attempt are appended to METRICS_FILE.
+    """
+    if not client:
+        raise GeminiError("GEMINI_API_KEY not set")
+
+    with tracing.span("gemini", label=label, model=model) as trace:
+        return _generate_json(prompt, schema, label, deadline, max_attempts, model, trace)
+
+
+def _generate_json(prompt: str, schema: dict, label: str, deadline: float, max_attempts: int, model: str, trace) -> dict:
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+    started = time.monotonic()
+    last_error = None
+    attempt = 0
+    for attempt in range(1, max_attempts + 1):
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        attempt_started = time.monotonic()
+        future = _executor.submit(_stream, model, prompt, config, time.monotonic() + remaining)
+        try:
+            text, usage = future.result(timeout=remaining)
+            data = json.loads(text)
+            _validate(data, schema)
+        except FutureTimeoutError:
+            last_error = GeminiError(f"deadline of {deadline:.0f}s exceeded")
+            _record(label, model, attempt, attempt_started, None, "timeout")
+            break
+        except Exception as e:
+            last_error = e
+            _record(label, model, attempt, attempt_started, None, f"error: {e}")
+            print(f"[WARNING] Gemini attempt {attempt}/{max_attempts} for {label} failed: {e}")
+            if not _retryable(e):
+                break
+            if attempt < max_attempts:
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+                time.sleep(min(delay, max(0.0, deadline - (time.monotonic() - started))))
+            continue
+        _record(label, model, attempt, attempt_started, usage, "ok")
+        trace.set(attempts=attempt)
+        return data
+
+    trace.set(attempts=attempt)
+    raise GeminiError(f"{label}: no valid response after {time.monotonic() - started:.1f}s ({last_error})")
+
+
+def _stream(model: str, prompt: str, config, stop_at: float):
+    """Collects a streamed response, failing fast on output that cannot be the requested JSON."""
+    parts = []
+    size = 0
+    usage = None
+    for chunk in client.models.generate_content_stream(model=model, contents=prompt, config=config):
+        if chunk.usage_metadata:
+            usage = chunk.usage_metadata
+        text = chunk.text or ""
+        if not text:
+            continue
+        if not parts and not text.lstrip().startswith(("{", "[")) and text.strip():
+            raise ValueError(f"response is not JSON (starts with {text.strip()[:20]!r})")
+        parts.append(text)
+        size += len(text)
+        if size > MAX_RESPONSE_CHARS:
+            raise ValueError(f"response exceeded {MAX_RESPONSE_CHARS} characters")
+        if time.monotonic() > stop_at:
+            raise TimeoutError("deadline passed while streaming")
+    return "".join(parts), usage
+
+
+def _retryable(error: Exception) -> bool:
+    """
+    Whether another attempt can succeed after `error`. Malformed or invalid
+    output, timeouts, network and server errors can; a rejected request
+    (bad key, permission, invalid argument) fails the same way every time.
+    """
+    if isinstance(error, errors.ClientError):
+        return error.code in RETRYABLE_CLIENT_CODES
+    return True
+
+
+def _validate(data, schema: dict, path: str = "$"):
+    """Checks `data` against the subset of OpenAPI schema used in this project (type, required, items, minItems)."""
+    kind = schema.get("type", "").upper()
+    if kind == "OBJECT":
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: expected object")
+        for key in schema.get("required", []):
+            if key not in data:
+                raise ValueError(f"{path}: missing '{key}'")
+        for key, sub in schema.get("properties", {}).items():
+            if key in data:
+                _validate(data[key], sub, f"{path}.{key}")
+    elif kind == "ARRAY":
+        if not isinstance(data, list):
+            raise ValueError(f"{path}: expected array")
+        if len(data) < schema.get("minItems", 0):
+            raise ValueError(f"{path}: expected at least {schema['minItems']} items, got {len(data)}")
+        for i, item in enumerate(data):
+            _validate(item, schema.get("items", {}), f"{path}[{i}]")
+    elif kind == "STRING":
+        if not isinstance(data, str) or not data.strip():
+            raise ValueError(f"{path}: expected non-empty string")
+
+
+def _record(label: str, model: str, attempt: int, started: float, usage, status: str):
+    latency = time.monotonic() - started
+    record = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "label": label,
+        "model": model,
+        "attempt": attempt,
+        "latency_s": round(latency, 3),
+        "status": status,
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+        "total_tokens": getattr(usage, "total_token_count", None),
+    }
+    if status == "ok":
+        print(f"[GEMINI] {label}: {latency:.1f}s, {record['total_tokens']} tokens (attempt {attempt})")
+    try:
+        with open(METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"[WARNING] Could not write Gemini metrics: {e}")
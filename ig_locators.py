@@ -0,0 +1,133 @@
+import os
+import json
+import time
+from typing import NamedTuple
+import run_metrics
+
+# Which strategy last found each step, so the next run tries it first
+LOCATOR_CACHE_FILE = os.getenv("IG_LOCATOR_CACHE_FILE", "ig_locator_cache.json")
+SCAN_RETRY_MS = 250
+
+
+class Step(NamedTuple):
+    """A control in the post flow: the visible text it shows and the ways to find it."""
+    text: str
+    strategies: tuple  # ("role", role) matches the accessible name (text or aria-label); ("text",) the exact text
+    in_dialog: bool = True
+
+
+STEPS = {
+    "post_menu": Step("Post", (("role", "link"), ("role", "menuitem"), ("role", "button"), ("text",)), in_dialog=False),
+    "original": Step("Original", (("role", "button"), ("text",))),
+    "ratio_4_5": Step("4:5", (("role", "button"), ("text",))),
+    "next": Step("Next", (("role", "button"), ("text",))),
+    "share": Step("Share", (("role", "button"), ("text",))),
+}
+
+# Layout-free fallback: exact textContent match inside the newest dialog (or the
+# whole body), innermost match first, clicked through its clickable ancestor
+_SCAN_JS = """
+([text, inDialog]) => {
+    const dialogs = inDialog ? document.querySelectorAll('[role="dialog"]') : [];
+    const root = dialogs.length ? dialogs[dialogs.length - 1] : document.body;
+    const matches = [];
+    for (const el of root.querySelectorAll('button, a, [role="button"], [role="link"], [role="menuitem"], span, div')) {
+        if (el.textContent && el.textContent.trim() === text) matches.push(el);
+    }
+    const innermost = matches.find(m => !matches.some(o => o !== m && m.contains(o)));
+    if (!innermost) return false;
+    (innermost.closest('button, a, [role="button"], [role="link"], [role="menuitem"]') || innermost).click();
+    return true;
+}
+"""
+
+_cache = None
+
+
+def _load_cache() -> dict:
+    global _cache
+    if _cache is None:
+        try:
+            with open(LOCATOR_CACHE_FILE, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _remember(step: str, strategy):
+    cache = _load_cache()
+    if cache.get(step) == list(strategy):
+        return
+    cache[step] = list(strategy)
+    try:
+        with open(LOCATOR_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"[WARNING] Could not save the locator cache: {e}")
+
+
+def _forget(step: str):
+    if _load_cache().pop(step, None) is not None:
+        try:
+            with open(LOCATOR_CACHE_FILE, "w", encoding="utf-8") as f:
+                json.dump(_cache, f, indent=2)
+        except OSError:
+            pass
+
+
+def _locator(page, step: Step, strategy):
+    root = page.get_by_role("dialog").last if step.in_dialog else page
+    kind = strategy[0]
+    if kind == "role":
+        return root.get_by_role(strategy[1], name=step.text, exact=True)
+    return root.get_by_text(step.text, exact=True)
+
+
+def _describe(strategy) -> str:
+    return "text" if strategy[0] == "text" else f"{strategy[0]}={strategy[1]}"
+
+
+def click(page, name: str, timeout: float = 5) -> bool:
+    """
+    Clicks the control for step `name` (see STEPS). Tries the strategy cached
+    from the last run first, then the other role/text strategies, then a
+    textContent scan of the open dialog, until `timeout` seconds pass (or the
+    deadline run_metrics has learned for this step).
+    Logs whether the cache hit and how long the lookup took. Returns True if clicked.
+    """
+    step = STEPS[name]
+    metric = f"ig.locator.{name}"
+    timeout = run_metrics.deadline(metric, timeout)
+    started = time.monotonic()
+    cached = _load_cache().get(name)
+    if cached:
+        try:
+            _locator(page, step, cached).first.click(timeout=min(timeout, 3) * 1000)
+            print(f"[LOCATOR] {name}: cache hit ({_describe(cached)}) in {(time.monotonic() - started) * 1000:.0f} ms")
+            run_metrics.record(metric, time.monotonic() - started, True, timeout)
+            return True
+        except Exception:
+            _forget(name)
+
+    while True:
+        for strategy in step.strategies:
+            try:
+                locator = _locator(page, step, strategy)
+                if locator.count():
+                    locator.first.click(timeout=2000)
+                    _remember(name, strategy)
+                    print(f"[LOCATOR] {name}: cache miss, found by {_describe(strategy)} in {(time.monotonic() - started) * 1000:.0f} ms")
+                    run_metrics.record(metric, time.monotonic() - started, True, timeout)
+                    return True
+            except Exception:
+                continue
+        if page.evaluate(_SCAN_JS, [step.text, step.in_dialog]):
+            print(f"[LOCATOR] {name}: cache miss, found by dialog scan in {(time.monotonic() - started) * 1000:.0f} ms")
+            run_metrics.record(metric, time.monotonic() - started, True, timeout)
+            return True
+        if time.monotonic() - started >= timeout:
+            print(f"[LOCATOR] {name}: '{step.text}' not found after {time.monotonic() - started:.1f}s")
+            run_metrics.record(metric, time.monotonic() - started, False, timeout)
+            return False
+        page.wait_for_timeout(SCAN_RETRY_MS)
@@ -3,62 +3,72 @@ import sys
 import time
 from playwright.sync_api import sync_playwright
 from dotenv import load_dotenv
+from browser_manager import BrowserManager, open_context
+from jpeg_encoder import optimize_for_upload
+import ig_locators
+from text_input import enter_text
+import resource_policy
+from flight_recorder import FlightRecorder
+import tracing
+import run_metrics
+import personas
 
 load_dotenv()
 sys.stdout.reconfigure(encoding='utf-8')
 
-IS_HEADLESS = os.getenv("HEADLESS", "false").lower() == "true"
+IG_PROFILE_DIR = os.getenv("IG_PROFILE_DIR", "chrome_profile_ig")
+INSTAGRAM_URL = os.getenv("INSTAGRAM_URL", "https://www.instagram.com/")
+# Multiplier for the fixed settle pauses between dialog steps (the offline benchmark lowers it)
+IG_SETTLE_SCALE = float(os.getenv("IG_SETTLE_SCALE", "1"))
 
 
-def post_to_instagram(image_paths: list[str], caption: str):
+def post_to_instagram(image_paths: list[str], caption: str, browser: BrowserManager = None):
     """
     Logs into Instagram via browser automation and posts multiple images as a carousel.
+    Pass a BrowserManager to reuse its warm Chrome instead of launching one.
+
+    `image_paths` and `caption` may also be zero-argument callables. They are only
+    called once the create-post dialog is open, so login and dialog navigation can
+    overlap with image generation.
     """
-    abs_image_paths = []
-    for path in isinstance(image_paths, str) and [image_paths] or image_paths:
-        if os.path.exists(path):
-            abs_image_paths.append(os.path.abspath(path))
-        else:
-            print(f"[WARNING] Image path {path} does not exist.")
-            
-    if not abs_image_paths:
-        print("[ERROR] No valid image paths provided.")
-        return False
+    deferred = callable(image_paths)
+    if not deferred:
+        abs_image_paths = _resolve_image_paths(image_paths)
+        if not abs_image_paths:
+            return False
 
     print(f"Starting Instagram Browser Automation...")
-    print(f"Image paths: {abs_image_paths}")
-
-    with sync_playwright() as p:
-        chrome_path = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
-        if not os.path.exists(chrome_path):
-            chrome_path = r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe"
-        user_data_dir = os.path.join(os.getcwd(), "chrome_profile_ig")
+    if not deferred:
+        print(f"Image paths: {abs_image_paths}")
 
+    with personas.slot("instagram"), sync_playwright() as p, tracing.span("instagram", deferred=deferred) as trace:
         try:
-            print(f"Launching Chrome from {chrome_path} (Headless: {IS_HEADLESS})...")
-            context = p.chromium.launch_persistent_context(
-                user_data_dir=user_data_dir,
-                executable_path=chrome_path,
-                headless=IS_HEADLESS,
-                channel="chrome",
-                args=["--disable-blink-features=AutomationControlled"]
-            )
+            context, release = open_context(p, IG_PROFILE_DIR, browser)
         except Exception as e:
             print(f"[ERROR] Failed to launch Chrome: {e}")
             return False
 
         page = context.new_page()
+        routes = resource_policy.install(page, resource_policy.INSTAGRAM)
+        recorder = FlightRecorder(page, "instagram")
+        posted = False
 
         try:
             print("Navigating to Instagram...")
-            page.goto("https://www.instagram.com/", timeout=60000)
-            time.sleep(5)
+            trace.step("navigate")
+            nav_started = time.monotonic()
+            page.goto(INSTAGRAM_URL, timeout=60000)
+            _settle(page, 5)
 
             # ── Login check ──────────────────────────────────────────────────────
+            login_timeout = run_metrics.deadline("ig.logged_in", 8)
+            login_started = time.monotonic()
             try:
-                page.wait_for_selector("svg[aria-label='New post']", timeout=8000)
-                print("Already logged in!")
+                page.wait_for_selector("svg[aria-label='New post']", timeout=login_timeout * 1000)
+                run_metrics.record("ig.logged_in", time.monotonic() - login_started, True, login_timeout)
+                print(f"Already logged in! (interactive {time.monotonic() - nav_started:.1f}s after navigation)")
             except Exception:
+                run_metrics.record("ig.logged_in", time.monotonic() - login_started, False, login_timeout)
                 print("[WARNING] Not logged in. Please log in manually in the browser window.")
                 print("Waiting until New Post button appears on the sidebar...")
                 while True:
@@ -67,11 +77,14 @@ def post_to_instagram(image_paths: list[str], caption: str):
                         break
                     except Exception:
                         pass
+                trace.set(manual_login=True)
                 print("Login detected! Continuing...")
-                time.sleep(3)
+                _settle(page, 3)
+            recorder.step("logged in")
 
             # ── Click Create button ──────────────────────────────────────────────
             print("Clicking 'Create' sidebar button...")
+            trace.step("create dialog")
             # The sidebar 'Create' button houses the svg with aria-label='New post'
             # We click its parent <a> or <div> wrapper via JS to avoid strict-mode issues
             page.evaluate("""
@@ -90,47 +103,60 @@ def post_to_instagram(image_paths: list[str], caption: str):
                     }
                 }
             """)
-            time.sleep(2)
+            _settle(page, 2)
 
             # ── Click "Post" from dropdown ────────────────────────────────────────
             print("Looking for 'Post' in the dropdown...")
-            # Use JS to click the element whose text is exactly "Post"
-            clicked = page.evaluate("""
-                () => {
-                    const all = document.querySelectorAll('span, div, a');
-                    for (const el of all) {
-                        if (el.innerText && el.innerText.trim() === 'Post') {
-                            el.click();
-                            return true;
-                        }
-                    }
-                    return false;
-                }
-            """)
-            if clicked:
-                print("Clicked 'Post' from dropdown via JS!")
+            if ig_locators.click(page, "post_menu"):
+                print("Clicked 'Post' from dropdown!")
             else:
-                print("[WARNING] Could not find 'Post' dropdown item via JS.")
-            time.sleep(4)
+                print("[WARNING] Could not find 'Post' dropdown item.")
+            _settle(page, 4)
+            recorder.step("create dialog")
+
+            if deferred:
+                print("Create dialog is open. Waiting for images...")
+                trace.step("wait for images")
+                try:
+                    ready = image_paths()
+                except Exception as e:
+                    # Image generation failed or timed out upstream; nothing on this page to dump
+                    reason = str(e) or type(e).__name__
+                    print(f"[ERROR] Images never arrived, not posting: {reason}")
+                    trace.set(upstream_error=reason)
+                    return False
+                abs_image_paths = _resolve_image_paths(ready)
+                if not abs_image_paths:
+                    return False
+                print(f"Image paths: {abs_image_paths}")
+            if callable(caption):
+                caption = caption()
 
             # ── Upload images ───────────────────────────────────────────────────
             print(f"Uploading {len(abs_image_paths)} images...")
+            trace.step("upload", images=len(abs_image_paths))
+            chooser_timeout = run_metrics.deadline("ig.file_chooser", 12)
+            chooser_started = time.monotonic()
             try:
-                with page.expect_file_chooser(timeout=12000) as fc_info:
+                with page.expect_file_chooser(timeout=chooser_timeout * 1000) as fc_info:
                     # Direct Playwright click — must be inside the context manager
                     # Use .first to avoid strict-mode violations from multiple matches
                     page.locator("button:has-text('Select from computer')").first.click()
                 file_chooser = fc_info.value
+                run_metrics.record("ig.file_chooser", time.monotonic() - chooser_started, True, chooser_timeout)
                 file_chooser.set_files(abs_image_paths)
                 print(f"Successfully uploaded {len(abs_image_paths)} images to file chooser!")
             except Exception as e:
+                run_metrics.record("ig.file_chooser", time.monotonic() - chooser_started, False, chooser_timeout)
                 print(f"File chooser failed: {e}")
+                recorder.fail("upload images", e)
                 return False
 
-            time.sleep(4)
+            _settle(page, 4)
 
             # ── Adjust Aspect Ratio to Original (prevent cropping) ──────────────
             print("Setting Aspect Ratio to Original...")
+            trace.step("aspect ratio")
             page.evaluate("""
                 () => {
                     const svgs = document.querySelectorAll("svg[aria-label='Select crop']");
@@ -143,93 +169,57 @@ def post_to_instagram(image_paths: list[str], caption: str):
                     }
                 }
             """)
-            time.sleep(2)
-            page.evaluate("""
-                () => {
-                    const spans = document.querySelectorAll("span, div");
-                    for (const s of spans) {
-                        if (s.innerText && s.innerText.trim() === 'Original') {
-                            s.click();
-                            let el = s;
-                            for (let i = 0; i < 5; i++) {
-                                el = el.parentElement;
-                                if (el && (el.tagName === 'BUTTON' || el.tagName === 'A')) { el.click(); break; }
-                            }
-                            return;
-                        }
-                    }
-                    // Fallback to 4:5 if Original isn't found
-                    for (const s of spans) {
-                        if (s.innerText && s.innerText.trim() === '4:5') {
-                            s.click();
-                            let el = s;
-                            for (let i = 0; i < 5; i++) {
-                                el = el.parentElement;
-                                if (el && el.tagName === 'BUTTON') { el.click(); break; }
-                            }
-                            return;
-                        }
-                    }
-                }
-            """)
-            time.sleep(2)
+            _settle(page, 2)
+            # Fallback to 4:5 if Original isn't found
+            if not ig_locators.click(page, "original", timeout=3):
+                ig_locators.click(page, "ratio_4_5", timeout=3)
+            _settle(page, 2)
 
             # ── Click Next (Crop screen) ──────────────────────────────────────────
             print("Clicking Next (Crop Screen)...")
-            page.evaluate("""
-                () => {
-                    const btns = document.querySelectorAll('button, div[role=\"button\"]');
-                    for (const b of btns) {
-                        if (b.innerText && b.innerText.trim() === 'Next') { b.click(); return; }
-                    }
-                }
-            """)
-            time.sleep(3)
-            page.screenshot(path="ig_debug_2_after_crop_next.png")
-            print("Screenshot saved: ig_debug_2_after_crop_next.png")
+            trace.step("next (crop screen)")
+            if not ig_locators.click(page, "next"):
+                print("[ERROR] Could not click Next on the crop screen.")
+                recorder.fail("next (crop screen)")
+                return False
+            _settle(page, 3)
+            recorder.step("after crop next")
 
             # ── Click Next (Filter screen) ────────────────────────────────────────
             print("Clicking Next (Filter Screen)...")
-            page.evaluate("""
-                () => {
-                    const btns = document.querySelectorAll('button, div[role=\"button\"]');
-                    for (const b of btns) {
-                        if (b.innerText && b.innerText.trim() === 'Next') { b.click(); return; }
-                    }
-                }
-            """)
-            time.sleep(3)
-            page.screenshot(path="ig_debug_3_after_filter_next.png")
-            print("Screenshot saved: ig_debug_3_after_filter_next.png")
+            trace.step("next (filter screen)")
+            if not ig_locators.click(page, "next"):
+                print("[ERROR] Could not click Next on the filter screen.")
+                recorder.fail("next (filter screen)")
+                return False
+            _settle(page, 3)
+            recorder.step("after filter next")
 
             # ── Enter caption ────────────────────────────────────────────────────
             print("Entering caption...")
-            # Click the caption box directly — use force=True to bypass any overlapping elements
+            trace.step("caption", chars=len(caption))
+            # enter_text clicks with force=True to bypass any overlapping elements
             caption_box = page.locator("div[aria-label='Write a caption...']")
-            caption_box.click(force=True)
-            time.sleep(1)
-            page.keyboard.type(caption)
-            time.sleep(2)
-            page.screenshot(path="ig_debug_4_after_caption.png")
-            print("Screenshot saved: ig_debug_4_after_caption.png")
+            if not enter_text(page, caption_box, caption, label="Caption"):
+                print("[WARNING] Caption may be incomplete.")
+                recorder.fail("caption")
+            recorder.step("after caption")
 
             # ── Click Share ──────────────────────────────────────────────────────
             print("Clicking Share...")
-            page.evaluate("""
-                () => {
-                    const btns = document.querySelectorAll('button, div[role=\"button\"]');
-                    for (const b of btns) {
-                        if (b.innerText && b.innerText.trim() === 'Share') { b.click(); return; }
-                    }
-                }
-            """)
+            trace.step("share")
+            if not ig_locators.click(page, "share"):
+                # Nothing was shared, so the run must not be recorded as posted
+                print("[ERROR] Could not click Share. The post was not shared.")
+                recorder.fail("share")
+                return False
 
-            time.sleep(3)
-            page.screenshot(path="ig_debug_5_after_share_click.png")
-            print("Screenshot saved: ig_debug_5_after_share_click.png")
+            _settle(page, 3)
+            recorder.step("after share click")
 
             # ── Wait for success ─────────────────────────────────────────────────
             print("Waiting for post to be shared...")
+            confirmation = trace.step("share confirmation")
             # Instagram may show different text depending on the language/UI version
             success_texts = [
                 "text=Your post has been shared.",
@@ -238,36 +228,71 @@ def post_to_instagram(image_paths: list[str], caption: str):
                 "svg[aria-label='Post']",
             ]
             shared = False
+            share_timeout = run_metrics.deadline("ig.share_confirmation", 15)
+            share_started = time.monotonic()
             for selector in success_texts:
                 try:
-                    page.wait_for_selector(selector, timeout=15000)
+                    page.wait_for_selector(selector, timeout=share_timeout * 1000)
                     shared = True
                     break
                 except Exception:
                     pass
+            run_metrics.record("ig.share_confirmation", time.monotonic() - share_started, shared, share_timeout)
 
+            confirmation.set(confirmed=shared)
             if shared:
                 print("[SUCCESS] Post shared successfully!")
             else:
                 # Share was clicked — wait a bit for Instagram to process then consider it done
                 print("Success text not found, but Share was clicked. Waiting 10s and assuming success...")
-                time.sleep(10)
+                _settle(page, 10)
                 print("[SUCCESS] Share button was clicked. Post likely live!")
 
+            posted = True
             return True
 
         except Exception as e:
             print(f"[ERROR] Error during Instagram automation: {e}")
+            recorder.fail("instagram automation", e)
             return False
 
         finally:
+            trace.end("ok" if posted else "error")
+            recorder.finish(posted)
+            routes.report()
             print("Closing browser...")
             try:
-                context.close()
+                release()
             except Exception:
                 pass
 
 
+def _settle(page, seconds: float):
+    """Fixed pause for Instagram's animations. Waits through Playwright, so route handlers and events keep being served."""
+    page.wait_for_timeout(seconds * IG_SETTLE_SCALE * 1000)
+
+
+def _resolve_image_paths(image_paths) -> list[str]:
+    """
+    Returns absolute paths of the images that exist, warning about the rest.
+    Files over the JPEG byte budget are swapped for a re-encoded upload copy.
+    """
+    abs_image_paths = []
+    for path in isinstance(image_paths, str) and [image_paths] or image_paths:
+        if os.path.exists(path):
+            try:
+                path = optimize_for_upload(path)
+            except Exception as e:
+                print(f"[WARNING] Could not re-encode {path} for upload, using it as is: {e}")
+            abs_image_paths.append(os.path.abspath(path))
+        else:
+            print(f"[WARNING] Image path {path} does not exist.")
+
+    if not abs_image_paths:
+        print("[ERROR] No valid image paths provided.")
+    return abs_image_paths
+
+
 if __name__ == "__main__":
     test_img = ["reference_image.jpg"]
     result = post_to_instagram(test_img, "Test multi-post from bot #automation")
@@ -0,0 +1,99 @@
+import os
+import io
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from jpeg_encoder import encode_jpeg, JPEG_TARGET_KB
+
+TARGET_SIZE = (1080, 1920)  # exactly 9:16 portrait
+# Worker processes for post-processing; 0 runs it inline on the calling thread
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_image(data: bytes, size: tuple = TARGET_SIZE, target_kb: int = JPEG_TARGET_KB) -> tuple:
+    """
+    Center-crops image bytes to the target aspect ratio, resizes with LANCZOS and
+    returns (jpeg_bytes, encoder_stats). The source is decoded once (JPEG draft
+    mode lets libjpeg decode at a reduced scale when it is much larger than
+    needed); the output is sized for upload by jpeg_encoder.encode_jpeg.
+    """
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    target_w, target_h = size
+    target_ratio = target_w / target_h
+    w, h = img.size
+    # Smallest source size that still covers the target after the crop
+    if w / h > target_ratio:
+        needed = (max(1, round(w * target_h / h)), target_h)
+    else:
+        needed = (target_w, max(1, round(h * target_w / w)))
+    if img.format == "JPEG":
+        img.draft("RGB", needed)
+    w, h = img.size
+
+    current_ratio = w / h
+    if abs(current_ratio - target_ratio) > 0.02:
+        if current_ratio > target_ratio:
+            new_w = int(h * target_ratio)
+            left = (w - new_w) // 2
+            img = img.crop((left, 0, left + new_w, h))
+        else:
+            new_h = int(w / target_ratio)
+            top = (h - new_h) // 2
+            img = img.crop((0, top, w, top + new_h))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img = img.resize(size, Image.LANCZOS)
+
+    return encode_jpeg(img, target_kb)
+
+
+def process_to_file(data: bytes, output_path: str) -> dict:
+    """
+    Post-processes image bytes and writes the result to `output_path` (one write).
+    If the bytes cannot be processed they are written unchanged, as before.
+    Runs inside a worker process, so it only returns plain data.
+    """
+    try:
+        result, stats = process_image(data)
+        error = None
+    except Exception as e:
+        result, stats = data, {}
+        error = str(e)
+    with open(output_path, "wb") as f:
+        f.write(result)
+    return {"path": output_path, "bytes_in": len(data), "bytes_out": len(result), "error": error,
+            "quality": stats.get("quality"), "saved_bytes": stats.get("saved_bytes", 0)}
+
+
+def submit(data: bytes, output_path: str) -> Future:
+    """Queues post-processing on the shared process pool and returns a Future of process_to_file's result."""
+    if IMAGE_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(process_to_file(data, output_path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_pool().submit(process_to_file, data, output_path)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # One pool for the whole process, so scheduler runs don't pay worker start-up each day
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return _pool
+
+
+def shutdown():
+    """Waits for queued post-processing and stops the worker processes (main.py calls it on exit)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
@@ -0,0 +1,123 @@
+import os
+import io
+import math
+
+# Byte budget per carousel image. Instagram recompresses uploads anyway, so
+# anything much above this only slows set_files and Instagram's processing.
+JPEG_TARGET_KB = int(os.getenv("JPEG_TARGET_KB", "500"))
+# Optional perceptual target instead of a byte budget: smallest file with at least this PSNR (dB)
+JPEG_TARGET_PSNR = float(os.getenv("JPEG_TARGET_PSNR", "0"))
+JPEG_MIN_QUALITY = int(os.getenv("JPEG_MIN_QUALITY", "70"))
+JPEG_MAX_QUALITY = int(os.getenv("JPEG_MAX_QUALITY", "95"))
+# Chroma subsampling modes tried, as Pillow values: 0 = 4:4:4, 2 = 4:2:0
+SUBSAMPLING_MODES = (0, 2)
+# What images were saved with before this encoder, used to report the bytes saved
+BASELINE_QUALITY = 95
+
+
+def _encode(img, quality: int, subsampling: int) -> bytes:
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=quality, subsampling=subsampling, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def psnr(original, data: bytes) -> float:
+    """Peak signal-to-noise ratio (dB) of encoded `data` against the original RGB image."""
+    from PIL import Image, ImageChops, ImageStat
+
+    decoded = Image.open(io.BytesIO(data)).convert("RGB")
+    rms = ImageStat.Stat(ImageChops.difference(original, decoded)).rms
+    mse = sum(r * r for r in rms) / len(rms)
+    return float("inf") if mse == 0 else 10 * math.log10(255 * 255 / mse)
+
+
+def _search(img, subsampling: int, fits) -> tuple:
+    """Binary search for the best quality in [min, max] that `fits`; falls back to min quality."""
+    lo, hi = JPEG_MIN_QUALITY, JPEG_MAX_QUALITY
+    best = None
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        data = _encode(img, quality, subsampling)
+        if fits(quality, data):
+            best = (quality, data)
+            lo = quality + 1
+        else:
+            hi = quality - 1
+    return best or (JPEG_MIN_QUALITY, _encode(img, JPEG_MIN_QUALITY, subsampling))
+
+
+def encode_jpeg(img, target_kb: int = JPEG_TARGET_KB, target_psnr: float = JPEG_TARGET_PSNR) -> tuple:
+    """
+    Encodes a PIL image as an optimized progressive JPEG sized for upload.
+
+    Byte-budget mode (default): the highest quality that fits in `target_kb`.
+    Perceptual mode (target_psnr > 0): the smallest file whose PSNR meets the target.
+    Both chroma subsampling modes are searched and the better result kept.
+    Returns (jpeg_bytes, stats) where stats records the bytes saved versus the
+    old quality-95 default encode.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    budget = target_kb * 1024
+
+    candidates = []
+    for subsampling in SUBSAMPLING_MODES:
+        if target_psnr > 0:
+            # Quality is searched downwards: "fits" means still good enough
+            lo, hi, best = JPEG_MIN_QUALITY, JPEG_MAX_QUALITY, None
+            while lo <= hi:
+                quality = (lo + hi) // 2
+                data = _encode(img, quality, subsampling)
+                if psnr(img, data) >= target_psnr:
+                    best = (quality, data)
+                    hi = quality - 1
+                else:
+                    lo = quality + 1
+            quality, data = best or (JPEG_MAX_QUALITY, _encode(img, JPEG_MAX_QUALITY, subsampling))
+        else:
+            quality, data = _search(img, subsampling, lambda q, d: len(d) <= budget)
+        candidates.append((quality, subsampling, data))
+
+    if target_psnr > 0:
+        quality, subsampling, data = min(candidates, key=lambda c: len(c[2]))
+    else:
+        # Highest quality inside the budget; 4:4:4 only wins if it is at least as good
+        quality, subsampling, data = max(candidates, key=lambda c: (len(c[2]) <= budget, c[0], -len(c[2])))
+
+    baseline = len(_encode_baseline(img))
+    stats = {
+        "quality": quality,
+        "subsampling": {0: "4:4:4", 1: "4:2:2", 2: "4:2:0"}[subsampling],
+        "bytes": len(data),
+        "baseline_bytes": baseline,
+        "saved_bytes": baseline - len(data),
+        "within_budget": target_psnr > 0 or len(data) <= budget,
+    }
+    return data, stats
+
+
+def _encode_baseline(img) -> bytes:
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=BASELINE_QUALITY)
+    return out.getvalue()
+
+
+def optimize_for_upload(path: str, target_kb: int = JPEG_TARGET_KB) -> str:
+    """
+    Returns a path to upload for `path`: the file itself if it already fits the
+    budget, otherwise a re-encoded copy next to it (e.g. fallback images copied
+    straight from the multi-megabyte reference photo).
+    """
+    if os.path.getsize(path) <= target_kb * 1024:
+        return path
+    from PIL import Image
+
+    with Image.open(path) as img:
+        data, stats = encode_jpeg(img, target_kb)
+    if len(data) >= os.path.getsize(path):
+        return path
+    upload_path = f"{os.path.splitext(path)[0]}_upload.jpg"
+    with open(upload_path, "wb") as f:
+        f.write(data)
+    print(f"Re-encoded {os.path.basename(path)} for upload: {os.path.getsize(path) // 1024} KB -> {len(data) // 1024} KB (q{stats['quality']}, {stats['subsampling']})")
+    return upload_path
@@ -1,36 +1,195 @@
-import time
-import schedule
-from datetime import datetime
-from prompt_generator import generate_prompt_and_caption
-from whisk_automator import generate_images
-from ig_poster import post_to_instagram
-
-def daily_job():
+import os
+import asyncio
+from datetime import datetime, timedelta
+from whisk_automator import WHISK_PROFILE_DIR, generate_images
+from ig_poster import IG_PROFILE_DIR, post_to_instagram
+from browser_manager import BrowserManager
+from pipeline import run_pipeline
+from prompt_generator import plan_week, generate_prompt_and_caption, get_todays_theme, get_theme_for
+from post_queue import PostQueue
+from scheduler import Scheduler, Slot, load_slots, run_locked
+from run_manifest import RunManifest
+from content_backlog import ContentBacklog
+import image_pipeline
+import tracing
+from personas import EXIT_SKIPPED, fan_out
+
+# Total posting attempts per run before giving up (retries reuse the run's saved images)
+MAX_POST_ATTEMPTS = int(os.getenv("MAX_POST_ATTEMPTS", "2"))
+# Fill the carousel from unused backlog images of today's theme before generating new ones
+BACKLOG_FIRST = os.getenv("BACKLOG_FIRST", "0") == "1"
+CAROUSEL_SIZE = int(os.getenv("CAROUSEL_SIZE", "3"))
+
+def fill_from_backlog(manifest: RunManifest, output_prefix: str = "generated_daily_post") -> bool:
+    """
+    Records a whole carousel of unused backlog images (one generation batch, so
+    the outfit and location match) as this run's images. Returns False, leaving
+    the run untouched, if the backlog has no such batch for today's theme.
+    """
+    theme = get_todays_theme()
+    picks = ContentBacklog().take(theme, CAROUSEL_SIZE, manifest.run_id)
+    if not picks:
+        print(f"No complete backlog batch for '{theme}'. Generating new images.")
+        return False
+
+    print(f"Filling today's carousel from the content backlog ({len(picks)} images, theme '{theme}').")
+    _, caption = generate_prompt_and_caption()
+    manifest.record_prompts([pick["prompt"] for pick in picks], caption)
+    for idx, pick in enumerate(picks):
+        with open(pick["path"], "rb") as f:
+            result = image_pipeline.submit(f.read(), os.path.abspath(f"{output_prefix}_{idx+1}.jpg")).result()
+        manifest.record_image(idx, result["path"])
+    return True
+
+def daily_job(browser: BrowserManager = None, resume: str = None, backlog_first: bool = BACKLOG_FIRST) -> bool:
     print(f"\n=== Starting Daily AI Instagram Post Automation at {datetime.now()} ===")
+
+    if resume:
+        try:
+            manifest = RunManifest.load(resume)
+        except FileNotFoundError as e:
+            print(f"[ERROR] Cannot resume run '{resume}': {e}")
+            return False
+        if manifest.first_incomplete_stage() is None:
+            # Running the pipeline again would post the same carousel a second time
+            print(f"Run {manifest.run_id} already posted. Nothing to resume.")
+            return True
+        print(f"Resuming run {manifest.run_id} at stage: {manifest.first_incomplete_stage()}")
+    else:
+        manifest = RunManifest.create()
+        if backlog_first:
+            try:
+                fill_from_backlog(manifest)
+            except Exception as e:
+                print(f"[WARNING] Could not use the content backlog, generating instead: {e}")
+
+    with tracing.run("daily_job", run_id=manifest.run_id, resumed=bool(resume)) as trace:
+        if browser:
+            # Health check before every run; restarts Chrome if it crashed overnight
+            with tracing.span("chrome warm"):
+                browser.warm(WHISK_PROFILE_DIR, IG_PROFILE_DIR)
     
-    # Step 1: Generate Prompts and Caption
-    print("\n--- Step 1: Generating Prompts & Caption ---")
-    prompts, caption = generate_prompt_and_caption()
-    print(f"Generated Caption Preview:\n{caption[:100]}...")
-    print(f"Generated {len(prompts)} unique prompts for today's carousel.")
-    
-    # Step 2: Generate Images via Whisk AI
-    print("\n--- Step 2: Generating Images ---")
-    output_prefix = "generated_daily_post"
-    saved_images = generate_images(prompts, output_prefix)
-    
-    if not saved_images:
-        print("Failed to generate images. Aborting today's post.")
-        return
-        
-    # Step 3: Post to Instagram
-    print("\n--- Step 3: Posting to Instagram ---")
-    post_success = post_to_instagram(saved_images, caption)
-    
-    if post_success:
-        print("\n[SUCCESS] Daily job completed successfully!")
+        post_success = asyncio.run(run_pipeline(browser, manifest=manifest))
+
+        # A failed post keeps its prompts and images, so retrying only redoes the Instagram step
+        while not post_success and manifest.first_incomplete_stage() == "post" and manifest.post_attempts() < MAX_POST_ATTEMPTS:
+            print(f"\n[RETRY] Posting failed. Retrying run {manifest.run_id} from the post stage...")
+            post_success = asyncio.run(run_pipeline(browser, manifest=manifest))
+        trace.set(posted=post_success, post_attempts=manifest.post_attempts())
+
+        if post_success:
+            print("\n[SUCCESS] Daily job completed successfully!")
+        else:
+            print("\n[ERROR] Failed to post to Instagram. Please check the logs.")
+            print(f"Resume later with: python main.py --resume {manifest.run_id}")
+
+        # Off the critical path: fill the prompt cache so upcoming runs skip Gemini.
+        # From tomorrow: this run just took today's entry, and nothing else posts today
+        print("\n--- Planning upcoming posts ---")
+        with tracing.span("plan week"):
+            plan_week(start=datetime.now().date() + timedelta(days=1))
+    return post_success
+
+def prepare_bundles(browser: BrowserManager = None) -> int:
+    """
+    Off-peak half of split mode: generates complete posts (images + caption) for
+    the next days without one and queues them, up to the queue depth.
+    Returns how many bundles were added.
+    """
+    queue = PostQueue()
+    queue.purge_expired()
+    days = queue.upcoming_dates()
+    if not days:
+        print(f"Post queue is full ({queue.depth()} bundles ready). Nothing to prepare.")
+        return 0
+
+    if browser:
+        browser.warm(WHISK_PROFILE_DIR)
+    added = 0
+    for day in days:
+        theme = get_theme_for(day)
+        print(f"\n=== Preparing post bundle for {day.isoformat()} ({theme}) ===")
+        with tracing.run("prepare", day=day.isoformat(), theme=theme):
+            prompts, caption = generate_prompt_and_caption(day)
+            images = generate_images(prompts, "prepared_post", browser=browser, theme=theme)
+        # Only real generations are queued; a fallback bundle is worse than generating at the slot
+        if len(images.real) < len(prompts):
+            print(f"[WARNING] Only {len(images.real)} of {len(prompts)} images generated for {day.isoformat()}. Not queuing it.")
+            continue
+        bundle_id = queue.enqueue(images.real, caption, day, theme)
+        print(f"[SUCCESS] Queued post bundle {bundle_id}.")
+        added += 1
+    print(f"Post queue depth: {queue.depth()}/{queue.max_depth}")
+    return added
+
+def publish_job(browser: BrowserManager = None) -> bool:
+    """
+    Posting-slot half of split mode: posts today's prepared bundle, so only the
+    Instagram step runs at the slot. Falls back to the full inline pipeline when
+    the queue has nothing for today.
+    """
+    print(f"\n=== Publishing at {datetime.now()} ===")
+    queue = PostQueue()
+    bundle = queue.dequeue(datetime.now().date(), get_todays_theme())
+    if not bundle:
+        print("[FALLBACK] No prepared bundle for today. Running the full pipeline inline.")
+        return daily_job(browser)
+
+    print(f"Publishing prepared bundle {bundle.id} ({bundle.age_hours():.1f}h old).")
+    posted = False
+    with tracing.run("publish", run_id=bundle.id, age_hours=round(bundle.age_hours(), 1)) as trace:
+        if browser:
+            with tracing.span("chrome warm"):
+                browser.warm(IG_PROFILE_DIR)
+        for attempt in range(1, MAX_POST_ATTEMPTS + 1):
+            try:
+                posted = post_to_instagram(bundle.image_paths, bundle.caption, browser=browser)
+            except Exception as e:
+                print(f"[ERROR] Posting bundle {bundle.id} failed: {e}")
+            if posted:
+                break
+            if attempt < MAX_POST_ATTEMPTS:
+                print(f"\n[RETRY] Posting failed. Retrying bundle {bundle.id}...")
+        trace.set(posted=posted, post_attempts=attempt)
+
+    if posted:
+        queue.ack(bundle)
+        print("\n[SUCCESS] Prepared post published!")
     else:
-        print("\n[ERROR] Failed to post to Instagram. Please check the logs.")
+        queue.nack(bundle)
+        print(f"\n[ERROR] Failed to publish bundle {bundle.id}; it stays queued.")
+    return posted
+
+def run_scheduler(post_time: str = None, prepare_time: str = None):
+    """
+    Runs the daily jobs at their slots, keeping both Chrome profiles warm between runs.
+    Slots come from the "slots" list in schedule.json, or from post_time (and, for
+    split mode, prepare_time: bundles are prepared then and post_time only publishes).
+    """
+    if post_time:
+        slots = [Slot(prepare_time, "prepare"), Slot(post_time, "publish")] if prepare_time else [Slot(post_time, "post")]
+    else:
+        slots = load_slots()
+    if not slots:
+        print("[ERROR] No posting time given and no \"slots\" in schedule.json.")
+        return
+
+    print(f"\nScheduler started with {len(slots)} daily slot(s).")
+    browser = BrowserManager()
+    browser.warm(WHISK_PROFILE_DIR, IG_PROFILE_DIR)
+    jobs = {
+        "post": lambda: daily_job(browser),
+        "prepare": lambda: prepare_bundles(browser),
+        "publish": lambda: publish_job(browser),
+        # Every persona in personas/, each in its own process with its own browsers
+        "personas": lambda: fan_out("post"),
+        "personas_prepare": lambda: fan_out("prepare"),
+        "personas_publish": lambda: fan_out("publish"),
+    }
+    try:
+        Scheduler(slots, jobs).run_forever()
+    finally:
+        browser.close()
 
 import sys
 import argparse
@@ -38,33 +197,55 @@ import argparse
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="AI Influencer Auto-Posting System")
     parser.add_argument("--now", action="store_true", help="Run the job immediately")
-    parser.add_argument("--schedule", type=str, help="Schedule the job daily at HH:MM (e.g. 11:30)")
+    parser.add_argument("--schedule", type=str, nargs="?", const="", metavar="HH:MM",
+                        help="Schedule the job daily at HH:MM (e.g. 11:30); without a time, use the slots in schedule.json")
+    parser.add_argument("--plan-week", action="store_true", help="Plan the next 7 days of prompts & captions into the cache")
+    parser.add_argument("--prepare", action="store_true", help="Split mode: generate post bundles into the post queue")
+    parser.add_argument("--publish", action="store_true", help="Split mode: post today's queued bundle (full pipeline if none)")
+    parser.add_argument("--prepare-at", type=str, metavar="HH:MM", help="With --schedule, prepare bundles daily at this time and only publish at the slot")
+    parser.add_argument("--backlog-first", action="store_true", help="Build the post from unused backlog images when possible")
+    parser.add_argument("--resume", type=str, metavar="RUN_ID", help="Resume a failed run at its first incomplete stage ('latest' for the newest)")
+    parser.add_argument("--personas", type=str, nargs="*", metavar="NAME",
+                        help="Run the job (post, or --prepare/--publish) for every persona in personas/, or only the named ones")
     args = parser.parse_args()
 
-    if args.now:
-        print("\nExecuting immediately via command line...")
-        daily_job()
-    elif args.schedule:
-        print(f"\nScheduler started. Will post every day at {args.schedule}")
-        schedule.every().day.at(args.schedule).do(daily_job)
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
-    else:
-        print("Welcome to the AI Influencer Auto-Posting System!")
-        print("Do you want to run the job NOW or SCHEDULE it for daily execution?")
-        choice = input("Enter '1' for NOW, '2' for SCHEDULE: ").strip()
-        
-        if choice == '1':
-            print("\nExecuting immediately...")
-            daily_job()
-        elif choice == '2':
-            post_time = input("Enter time to post daily (e.g., 11:30): ").strip()
-            print(f"\nScheduler started. Will post every day at {post_time}")
-            schedule.every().day.at(post_time).do(daily_job)
-            
-            while True:
-                schedule.run_pending()
-                time.sleep(60)
+    try:
+        if args.plan_week:
+            plan_week()
+        elif args.personas is not None:
+            job = "prepare" if args.prepare else "publish" if args.publish else "post"
+            results = run_locked(f"personas_{job}" if job != "post" else "personas", fan_out, job, args.personas or None)
+            if results is None:
+                sys.exit(EXIT_SKIPPED)
+            sys.exit(0 if results and all(r["status"] != "failed" for r in results) else 1)
+        elif args.prepare:
+            if run_locked("prepare", prepare_bundles) is None:
+                sys.exit(EXIT_SKIPPED)
+        elif args.publish:
+            posted = run_locked("publish", publish_job)
+            sys.exit(EXIT_SKIPPED if posted is None else 0 if posted else 1)
+        elif args.resume:
+            posted = run_locked("resume", daily_job, resume=args.resume)
+            sys.exit(EXIT_SKIPPED if posted is None else 0 if posted else 1)
+        elif args.now:
+            print("\nExecuting immediately via command line...")
+            posted = run_locked("post", daily_job, backlog_first=args.backlog_first or BACKLOG_FIRST)
+            sys.exit(EXIT_SKIPPED if posted is None else 0 if posted else 1)
+        elif args.schedule is not None:
+            run_scheduler(args.schedule, args.prepare_at)
         else:
-            print("Invalid choice. Exiting.")
+            print("Welcome to the AI Influencer Auto-Posting System!")
+            print("Do you want to run the job NOW or SCHEDULE it for daily execution?")
+            choice = input("Enter '1' for NOW, '2' for SCHEDULE: ").strip()
+        
+            if choice == '1':
+                print("\nExecuting immediately...")
+                run_locked("post", daily_job)
+            elif choice == '2':
+                post_time = input("Enter time to post daily (e.g., 11:30): ").strip()
+                run_scheduler(post_time)
+            else:
+                print("Invalid choice. Exiting.")
+    finally:
+        # Worker processes for image post-processing live as long as this process; end them cleanly
+        image_pipeline.shutdown()
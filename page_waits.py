@@ -0,0 +1,144 @@
+import time
+from typing import Callable, NamedTuple, Optional
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+import run_metrics
+
+# Every wait here resolves on a real page signal (DOM mutation or a short
+# in-page poll) instead of a fixed sleep, has a hard deadline, and logs how
+# long it actually took so run logs reflect Whisk's real latency.
+#
+# Waits are plain `Wait` values so the same condition can either block on one
+# page (wait_for) or be checked cooperatively across several tabs (poll).
+# A Wait with `check` set is evaluated in Python instead of in the page, for
+# state that arrives through Playwright events (e.g. captured network responses).
+#
+# A Wait with `metric` set records its outcome in run_metrics, and the helpers
+# below take their default deadlines from that history (run_metrics.deadline).
+
+# How often a Python-side `check` is re-run while Playwright dispatches events
+CHECK_TICK_MS = 100
+
+WHISK_READY_JS = """
+    () => {
+        if (location.host.includes('accounts.google.com')) return true;
+        const text = document.body ? document.body.textContent : '';
+        return text.includes('ADD IMAGES') || text.includes('arrow_forward');
+    }
+"""
+
+ANALYZING_JS = """
+    (expected) => {
+        const text = (document.body ? document.body.textContent : '').toLowerCase();
+        return text.includes('analyzing image') === expected;
+    }
+"""
+
+IMAGES_LOADED_JS = """
+    () => Array.from(document.images).every(i => !i.src || (i.complete && i.naturalWidth > 0))
+"""
+
+
+# A reused project is only trusted if the page stayed on it (no redirect to a new
+# project), nothing is still being analysed, and the subject thumbnail rendered.
+PROJECT_READY_JS = """
+    (projectUrl) => {
+        if (!location.href.startsWith(projectUrl)) return false;
+        const text = (document.body ? document.body.textContent : '').toLowerCase();
+        if (text.includes('analyzing image')) return false;
+        return Array.from(document.images).some(i => i.complete && i.naturalWidth >= 64);
+    }
+"""
+
+
+class Wait(NamedTuple):
+    """A deadline-bound page condition. Built by the helpers below, resolved by wait_for or poll."""
+    expression: str
+    arg: object = None
+    timeout: float = 30
+    label: str = "condition"
+    polling: object = "mutation"
+    check: Optional[Callable[[], object]] = None
+    metric: Optional[str] = None
+
+
+def wait_for(page, wait: Wait):
+    """
+    Blocks until the wait's condition is truthy and returns its value.
+    Returns None if the deadline passes. The elapsed time is logged either way.
+    """
+    start = time.monotonic()
+    if wait.check:
+        while True:
+            finished, value = poll(page, wait, start)
+            if finished:
+                return value
+            page.wait_for_timeout(CHECK_TICK_MS)
+    try:
+        handle = page.wait_for_function(wait.expression, arg=wait.arg, polling=wait.polling, timeout=wait.timeout * 1000)
+        value = handle.json_value()
+    except PlaywrightTimeoutError:
+        print(f"[WAIT] {wait.label}: timed out after {time.monotonic() - start:.1f}s (deadline {wait.timeout}s)")
+        _record(wait, start, False)
+        return None
+    print(f"[WAIT] {wait.label}: {time.monotonic() - start:.1f}s")
+    _record(wait, start, True)
+    return value
+
+
+def poll(page, wait: Wait, start: float):
+    """
+    One non-blocking check of `wait`, for callers that multiplex several pages.
+    Returns (finished, value); value is None when the deadline has passed.
+    """
+    value = wait.check() if wait.check else page.evaluate(wait.expression, wait.arg)
+    elapsed = time.monotonic() - start
+    if value:
+        print(f"[WAIT] {wait.label}: {elapsed:.1f}s")
+        _record(wait, start, True)
+        return True, value
+    if elapsed >= wait.timeout:
+        print(f"[WAIT] {wait.label}: timed out after {elapsed:.1f}s (deadline {wait.timeout}s)")
+        _record(wait, start, False)
+        return True, None
+    return False, None
+
+
+def _record(wait: Wait, start: float, ok: bool):
+    if wait.metric:
+        run_metrics.record(wait.metric, time.monotonic() - start, ok, wait.timeout)
+
+
+def whisk_ready(timeout: float = None) -> Wait:
+    """The Whisk editor (or the Google sign-in redirect) is interactive."""
+    return Wait(WHISK_READY_JS, timeout=timeout or run_metrics.deadline("whisk.ready", 30), label="Whisk editor ready",
+                metric="whisk.ready")
+
+
+def analyzing(expected: bool, timeout: float = None) -> Wait:
+    """Whisk's "analyzing image" banner is shown (expected=True) or gone (expected=False)."""
+    label = "Face analysis started" if expected else "Face analysis finished"
+    metric = "whisk.analysis_started" if expected else "whisk.analysis"
+    return Wait(ANALYZING_JS, arg=expected, timeout=timeout or run_metrics.deadline(metric, 8 if expected else 30), label=label,
+                metric=metric)
+
+
+def project_ready(project_url: str, timeout: float = None) -> Wait:
+    """A previously prepared Whisk project loaded with its subject image in place."""
+    return Wait(PROJECT_READY_JS, arg=project_url, timeout=timeout or run_metrics.deadline("whisk.project_ready", 15),
+                label="Saved project ready", polling=250, metric="whisk.project_ready")
+
+
+def images_loaded(timeout: float = None) -> Wait:
+    """Every image on the page (including the subject thumbnail) has finished loading."""
+    return Wait(IMAGES_LOADED_JS, timeout=timeout or run_metrics.deadline("whisk.images_loaded", 10), label="Subject image loaded",
+                polling=250, metric="whisk.images_loaded")
+
+
+def wait_for_whisk_ready(page, timeout: float = None):
+    """Waits for the Whisk editor (or the Google sign-in redirect) to become interactive."""
+    return wait_for(page, whisk_ready(timeout)) is not None
+
+
+def current_blobs(page) -> list:
+    """Returns every blob: image src on the page in a single round trip."""
+    return page.evaluate("() => Array.from(document.querySelectorAll(\"img[src^='blob:']\")).map(i => i.src)")
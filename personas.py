@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import random
+import subprocess
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import NamedTuple
+import tracing
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PERSONAS_DIR = os.getenv("PERSONAS_DIR", "personas")
+# Personas running at once (one main.py process each)
+PERSONA_WORKERS = int(os.getenv("PERSONA_WORKERS", "3"))
+# Browser sessions allowed at once across all persona processes
+WHISK_SLOTS = int(os.getenv("PERSONA_WHISK_SLOTS", "2"))
+INSTAGRAM_SLOTS = int(os.getenv("PERSONA_INSTAGRAM_SLOTS", "1"))
+# Set by fan_out for its children; without it slot() is a no-op
+SLOT_DIR = os.getenv("PERSONA_SLOT_DIR")
+SLOT_POLL_SECONDS = 2.0
+# A held slot's file is touched this often, so one left untouched for
+# SLOT_STALE_SECONDS belongs to a process that died holding it
+SLOT_HEARTBEAT_SECONDS = 60.0
+SLOT_STALE_SECONDS = 600.0
+# main.py's exit status for a job skipped because another held the job lock.
+# Not 2: argparse exits with 2 on bad arguments, and that must count as failed
+EXIT_SKIPPED = 3
+FANOUT_STATE_FILE = "fanout_state.json"
+FANOUT_METRICS_FILE = "fanout_metrics.jsonl"
+
+_SLOT_LIMITS = {"whisk": WHISK_SLOTS, "instagram": INSTAGRAM_SLOTS}
+# Slots this process holds, by kind; a nested slot() of the same kind shares the outer one
+_held = {}
+_held_lock = threading.Lock()
+_JOB_ARGS = {"post": ["--now"], "prepare": ["--prepare"], "publish": ["--publish"]}
+
+
+class Persona(NamedTuple):
+    """
+    One account, living in personas/<name>/ with a persona.json such as
+
+        {"reference_image": "reference_image.jpg", "caption_style": "playful, 3 hashtags",
+         "whisk_profile": "chrome_profile", "instagram_profile": "chrome_profile_ig",
+         "env": {"CAROUSEL_SIZE": "3"}, "enabled": true}
+
+    next to its schedule.json. Everything the bot keeps on disk (runs, queue,
+    backlog, caches, Chrome profiles) ends up in that directory.
+    """
+    name: str
+    directory: str
+    reference_image: str
+    whisk_profile: str
+    instagram_profile: str
+    caption_style: str
+    env: dict
+
+    def environ(self) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "PERSONA": self.name,
+            "REFERENCE_IMAGE_PATH": self.reference_image,
+            "WHISK_PROFILE_DIR": self.whisk_profile,
+            "IG_PROFILE_DIR": self.instagram_profile,
+            "PYTHONIOENCODING": "utf-8",
+        })
+        if self.caption_style:
+            env["CAPTION_STYLE"] = self.caption_style
+        env.update({key: str(value) for key, value in self.env.items()})
+        return env
+
+
+def load_personas(names: list = None, directory: str = PERSONAS_DIR) -> list:
+    """Enabled personas under `directory` (or only `names`), skipping broken ones with a warning."""
+    personas = []
+    if not os.path.isdir(directory):
+        return personas
+    for name in sorted(os.listdir(directory)):
+        path = os.path.abspath(os.path.join(directory, name))
+        config_path = os.path.join(path, "persona.json")
+        if not os.path.isfile(config_path) or (names and name not in names):
+            continue
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Skipping persona '{name}': unreadable persona.json ({e})")
+            continue
+        if not config.get("enabled", True):
+            continue
+        reference = os.path.join(path, config.get("reference_image", "reference_image.jpg"))
+        if not os.path.isfile(reference):
+            print(f"[WARNING] Skipping persona '{name}': reference image {reference} not found")
+            continue
+        if not os.path.isfile(os.path.join(path, "schedule.json")):
+            print(f"[WARNING] Persona '{name}' has no schedule.json; it will use the default theme.")
+        personas.append(Persona(
+            name, path, reference,
+            config.get("whisk_profile", "chrome_profile"),
+            config.get("instagram_profile", "chrome_profile_ig"),
+            config.get("caption_style"),
+            config.get("env", {}),
+        ))
+    missing = set(names or []) - {p.name for p in personas}
+    if missing:
+        print(f"[WARNING] Unknown or disabled persona(s): {', '.join(sorted(missing))}")
+    return personas
+
+
+# ── Cross-process browser slots ────────────────────────────────────────────
+def slots_enabled() -> bool:
+    """True inside a persona process started by fan_out."""
+    return bool(SLOT_DIR)
+
+
+def _try_slot(kind: str):
+    for i in range(max(1, _SLOT_LIMITS[kind])):
+        path = os.path.join(SLOT_DIR, f"{kind}-{i}.lock")
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) >= SLOT_STALE_SECONDS:
+                    print(f"[WARNING] Removing stale {kind} slot {path}.")
+                    os.remove(path)
+            except OSError:
+                pass
+            continue
+        with os.fdopen(fd, "w") as f:
+            json.dump({"persona": os.getenv("PERSONA"), "pid": os.getpid(), "since": datetime.now().isoformat(timespec="seconds")}, f)
+        return path
+    return None
+
+
+@contextmanager
+def slot(kind: str, cancelled: threading.Event = None):
+    """
+    Holds one of the `kind` ("whisk" or "instagram") browser slots shared by all
+    persona processes of a fan-out, waiting for a free one first. Raises
+    TimeoutError if `cancelled` is set while still waiting, so an abandoned
+    stage never takes a slot late. Re-entrant within a process. The wait and
+    hold times are logged for the fan-out's throughput report.
+    """
+    with _held_lock:
+        nested = _held.get(kind, 0) > 0
+        if nested:
+            _held[kind] += 1
+    if nested or not slots_enabled():
+        try:
+            yield
+        finally:
+            if nested:
+                with _held_lock:
+                    _held[kind] -= 1
+        return
+    started = time.monotonic()
+    with tracing.span(f"{kind} slot wait"):
+        path = _try_slot(kind)
+        if not path:
+            print(f"[PERSONAS] Waiting for a free {kind} slot ({_SLOT_LIMITS[kind]} shared)...")
+        while not path:
+            # Jittered so waiting personas do not retry in lockstep
+            delay = SLOT_POLL_SECONDS * random.uniform(0.5, 1.5)
+            if cancelled is not None and cancelled.wait(delay):
+                raise TimeoutError(f"Gave up waiting for a {kind} slot: the stage was abandoned")
+            elif cancelled is None:
+                time.sleep(delay)
+            path = _try_slot(kind)
+    acquired = time.monotonic()
+    with _held_lock:
+        _held[kind] = 1
+    released = threading.Event()
+    threading.Thread(target=_heartbeat, args=(path, released), name=f"{kind}-slot-heartbeat", daemon=True).start()
+    try:
+        yield
+    finally:
+        released.set()
+        with _held_lock:
+            _held[kind] = 0
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        record = {"persona": os.getenv("PERSONA"), "kind": kind, "waited_s": round(acquired - started, 2),
+                  "held_s": round(time.monotonic() - acquired, 2)}
+        try:
+            with open(os.path.join(SLOT_DIR, "slots.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+
+
+def _heartbeat(path: str, released: threading.Event):
+    """Keeps a held slot's file fresh, so a long run is never mistaken for a dead one."""
+    while not released.wait(SLOT_HEARTBEAT_SECONDS):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+# ── Fan-out ────────────────────────────────────────────────────────────────
+def _load_state(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, FANOUT_STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(directory: str, state: dict):
+    path = os.path.join(directory, FANOUT_STATE_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _run_persona(persona: Persona, job: str, slot_dir: str) -> dict:
+    """Runs `job` for one persona as its own main.py process, logging to personas/<name>/logs/."""
+    logs = os.path.join(persona.directory, "logs")
+    os.makedirs(logs, exist_ok=True)
+    log_path = os.path.join(logs, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{job}.log")
+    env = persona.environ()
+    env["PERSONA_SLOT_DIR"] = slot_dir
+    print(f"[PERSONAS] {persona.name}: starting {job} (log: {log_path})")
+    started = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log:
+        code = subprocess.run([sys.executable, os.path.join(REPO_DIR, "main.py"), *_JOB_ARGS[job]],
+                              cwd=persona.directory, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    seconds = time.monotonic() - started
+    status = {0: "ok", EXIT_SKIPPED: "skipped"}.get(code, "failed")
+    print(f"[PERSONAS] {persona.name}: {job} {status} after {seconds:.0f}s (exit {code})")
+    return {"persona": persona.name, "status": status, "exit_code": code, "seconds": round(seconds, 1), "log": log_path}
+
+
+def fan_out(job: str = "post", names: list = None, workers: int = PERSONA_WORKERS, directory: str = PERSONAS_DIR) -> list:
+    """
+    Runs `job` ("post", "prepare" or "publish") for every persona, `workers` at a
+    time. Personas whose last run is oldest go first, so none is starved when
+    the pool is smaller than the registry. Browser sessions are additionally
+    capped across all of them by PERSONA_WHISK_SLOTS / PERSONA_INSTAGRAM_SLOTS.
+    Prints and appends a throughput report; returns the per-persona results.
+    """
+    personas = load_personas(names, directory)
+    if not personas:
+        print(f"[ERROR] No personas found in {directory}/ (each needs a persona.json).")
+        return []
+
+    state = _load_state(directory)
+    personas.sort(key=lambda p: state.get(p.name, {}).get("last_run", ""))
+    slot_dir = os.path.abspath(os.path.join(directory, ".slots"))
+    os.makedirs(slot_dir, exist_ok=True)
+    # Every slot holder is a child of this fan-out, so anything left over is from a crash
+    for leftover in os.listdir(slot_dir):
+        os.remove(os.path.join(slot_dir, leftover))
+
+    workers = max(1, min(workers, len(personas)))
+    print(f"\n[PERSONAS] Running '{job}' for {len(personas)} personas, {workers} at a time "
+          f"(Whisk slots {WHISK_SLOTS}, Instagram slots {INSTAGRAM_SLOTS}).")
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="persona") as pool:
+        results = list(pool.map(lambda p: _run_persona(p, job, slot_dir), personas))
+    wall = time.monotonic() - started
+
+    now = datetime.now().isoformat(timespec="seconds")
+    for result in results:
+        entry = state.setdefault(result["persona"], {})
+        entry["last_run"] = now
+        entry["last_status"] = result["status"]
+    _save_state(directory, state)
+
+    _report(job, results, wall, workers, slot_dir, directory)
+    return results
+
+
+def _report(job: str, results: list, wall: float, workers: int, slot_dir: str, directory: str):
+    waits = {}
+    try:
+        with open(os.path.join(slot_dir, "slots.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                totals = waits.setdefault(record["persona"], {}).setdefault(record["kind"], [0.0, 0.0])
+                totals[0] += record["waited_s"]
+                totals[1] += record["held_s"]
+    except (OSError, ValueError):
+        pass
+
+    print(f"\n{'persona':<20} {'status':<8} {'time':>8} {'whisk wait':>11} {'ig wait':>8}")
+    for r in results:
+        persona_waits = waits.get(r["persona"], {})
+        r["whisk_wait_s"] = round(persona_waits.get("whisk", [0.0, 0.0])[0], 1)
+        r["instagram_wait_s"] = round(persona_waits.get("instagram", [0.0, 0.0])[0], 1)
+        print(f"{r['persona'][:20]:<20} {r['status']:<8} {r['seconds']:>7.0f}s {r['whisk_wait_s']:>10.0f}s {r['instagram_wait_s']:>7.0f}s")
+
+    succeeded = sum(r["status"] == "ok" for r in results)
+    busy = sum(r["seconds"] for r in results)
+    held = {kind: sum(w.get(kind, [0.0, 0.0])[1] for w in waits.values()) for kind in _SLOT_LIMITS}
+    utilisation = {kind: held[kind] / (wall * max(1, _SLOT_LIMITS[kind])) if wall else 0.0 for kind in _SLOT_LIMITS}
+    print(f"\n[PERSONAS] {succeeded}/{len(results)} succeeded in {wall:.0f}s wall: "
+          f"{succeeded / wall * 3600 if wall else 0:.1f} {job}s/hour, {busy / wall if wall else 0:.1f}x parallel, "
+          f"slot use Whisk {utilisation['whisk']:.0%} / Instagram {utilisation['instagram']:.0%}")
+
+    record = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "job": job,
+        "workers": workers,
+        "whisk_slots": WHISK_SLOTS,
+        "instagram_slots": INSTAGRAM_SLOTS,
+        "wall_s": round(wall, 1),
+        "succeeded": succeeded,
+        "personas": results,
+        "slot_utilisation": {kind: round(value, 3) for kind, value in utilisation.items()},
+    }
+    try:
+        with open(os.path.join(directory, FANOUT_METRICS_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"[WARNING] Could not write fan-out metrics: {e}")
@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from prompt_generator import generate_prompt_and_caption, get_todays_theme
+from whisk_automator import generate_images
+from ig_poster import post_to_instagram
+from browser_manager import BrowserManager
+from run_manifest import RunManifest
+import tracing
+import personas
+
+# Per-stage deadlines in seconds. The prompts and images clocks start with the pipeline,
+# since Whisk starts warming up immediately; the post clock starts at the image hand-off.
+STAGE_TIMEOUTS = {
+    "prompts": float(os.getenv("PROMPTS_STAGE_TIMEOUT", "180")),
+    "images": float(os.getenv("IMAGES_STAGE_TIMEOUT", "1200")),
+    "post": float(os.getenv("POST_STAGE_TIMEOUT", "600")),
+}
+
+
+async def run_pipeline(browser: BrowserManager = None, output_prefix: str = "generated_daily_post", manifest: RunManifest = None) -> bool:
+    """
+    Runs one daily post as three overlapping stages and returns True if it was shared.
+
+      prompts  Gemini writes the prompts and caption.
+      images   Whisk launches, navigates and analyses the face right away, then
+               waits for the prompts before generating.
+      post     Instagram launches, logs in and opens the create dialog right away,
+               then waits for the images before uploading.
+
+    The stages use the sync Playwright API, so each one runs on its own worker
+    thread with its own Playwright instance. Hand-offs between them are explicit
+    futures, and a failed or timed-out stage fails the stages waiting on it.
+
+    Progress is checkpointed to `manifest`. Stages it already records as done
+    (prompts, individual images) are skipped, so a resumed run starts at the
+    first incomplete stage.
+
+    Only real generations are posted, in prompt order. Slots Whisk could not
+    fill (reference-image copies) are left out, so a partial run posts a shorter
+    carousel, and a run with no real image at all aborts without posting; the
+    open slots stay in the manifest for --resume.
+
+    Inside a persona fan-out the images and post stages first queue for a
+    shared browser slot (personas.slot). Their deadlines start once they hold
+    it, and a stage abandoned while still queueing never takes one.
+    """
+    manifest = manifest or RunManifest.create()
+    loop = asyncio.get_running_loop()
+    trace = tracing.span("pipeline", attempt=manifest.post_attempts() + 1)
+    # Not the loop's default executor: a hung stage thread must not block shutdown
+    executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="stage")
+    prompts_ready, images_ready = Future(), Future()
+    # When the images and post stages got their browser slots; their deadlines count from there
+    images_clock, post_clock = Future(), Future()
+    abandoned = threading.Event()
+
+    def get_prompts():
+        return prompts_ready.result(timeout=STAGE_TIMEOUTS["prompts"])[0]
+
+    def get_caption():
+        return prompts_ready.result()[1]
+
+    def get_images():
+        return images_ready.result(timeout=STAGE_TIMEOUTS["images"])
+
+    def run_images():
+        missing = manifest.missing_images() if manifest.has_prompts() else None
+        if missing == []:
+            images_clock.set_result(time.monotonic())
+            print("All images already generated for this run. Skipping Whisk.")
+            return manifest.image_paths()
+        if missing is None:
+            prompt_source, slots = get_prompts, None
+        else:
+            print(f"Resuming Whisk for image slots {[i + 1 for i in missing]}...")
+            slots = missing
+            prompt_source = [manifest.prompts()[0][i] for i in missing]
+        with personas.slot("whisk", cancelled=abandoned):
+            images_clock.set_result(time.monotonic())
+            generated = generate_images(
+                prompt_source, output_prefix, browser=browser, theme=get_todays_theme(),
+                on_image_saved=lambda idx, path: manifest.record_image(slots[idx] if slots else idx, path),
+            )
+        # Every real image is checkpointed before generate_images returns, so the
+        # manifest holds them all in prompt order, including a resumed run's earlier ones
+        images = manifest.image_paths()
+        if generated.fallback and images:
+            print(f"[WARNING] Image slots {[i + 1 for i in manifest.missing_images()]} failed. "
+                  f"Posting the {len(images)} real images without them.")
+        return images
+
+    def run_post():
+        with personas.slot("instagram", cancelled=abandoned):
+            post_clock.set_result(time.monotonic())
+            return post_to_instagram(get_images, get_caption, browser=browser)
+
+    try:
+        print("\n--- Step 1: Generating Prompts & Caption (browsers warming up in parallel) ---")
+        started = time.monotonic()
+        if manifest.has_prompts():
+            print("Prompts already recorded for this run. Skipping Gemini.")
+            prompts_task = loop.create_future()
+            prompts_task.set_result(manifest.prompts())
+        else:
+            prompts_task = loop.run_in_executor(executor, _traced_stage("prompts", trace, generate_prompt_and_caption))
+        images_task = loop.run_in_executor(executor, _traced_stage("images", trace, run_images))
+        post_stage = _traced_stage("post", trace, run_post)
+        # With shared browser slots, opening Instagram early would hold a slot through the whole Whisk run
+        post_task = None if personas.slots_enabled() else loop.run_in_executor(executor, post_stage)
+
+        try:
+            prompts, caption = await _stage("prompts", prompts_task, started)
+        except Exception as e:
+            prompts_ready.set_exception(e)
+            images_ready.set_exception(e)
+            return False
+        if not manifest.has_prompts():
+            manifest.record_prompts(prompts, caption)
+        prompts_ready.set_result((prompts, caption))
+        print(f"Generated Caption Preview:\n{caption[:100]}...")
+        print(f"Generated {len(prompts)} unique prompts for today's carousel.")
+
+        print("\n--- Step 2: Generating Images ---")
+        try:
+            saved_images = await _stage("images", images_task, await _clock(images_clock, images_task, started))
+        except Exception as e:
+            images_ready.set_exception(e)
+            return False
+        images_ready.set_result(saved_images)
+        if not saved_images:
+            print("Failed to generate images. Aborting today's post.")
+            return False
+
+        print("\n--- Step 3: Posting to Instagram ---")
+        if post_task is None:
+            post_task = loop.run_in_executor(executor, post_stage)
+        try:
+            handoff = time.monotonic()
+            # Outside a fan-out the post stage started early, but its deadline still counts from the hand-off
+            posted = await _stage("post", post_task, max(handoff, await _clock(post_clock, post_task, handoff)))
+        except Exception as e:
+            manifest.record_post(False, str(e) or type(e).__name__)
+            return False
+        manifest.record_post(posted)
+        trace.set(posted=posted)
+        return posted
+    finally:
+        abandoned.set()
+        trace.end()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _traced_stage(name: str, parent, fn):
+    """Runs `fn` on a stage thread inside a span under the pipeline's, so the stage's own spans nest below it."""
+    def run():
+        with tracing.span(f"stage {name}", parent=parent):
+            return fn()
+    return run
+
+
+async def _clock(clock: Future, task, default: float) -> float:
+    """
+    When a stage's deadline starts: the time set on `clock` once the stage holds
+    its browser slot (waiting for one has no deadline), or `default` if the
+    stage finishes or fails before setting it.
+    """
+    waiter = asyncio.wrap_future(clock)
+    await asyncio.wait([waiter, task], return_when=asyncio.FIRST_COMPLETED)
+    return clock.result() if clock.done() else default
+
+
+async def _stage(name: str, task, since: float):
+    """Awaits a stage until its deadline (counted from `since`) and logs when it finished."""
+    remaining = max(0.0, STAGE_TIMEOUTS[name] - (time.monotonic() - since))
+    try:
+        result = await asyncio.wait_for(task, remaining)
+    except asyncio.TimeoutError:
+        print(f"[ERROR] Stage '{name}' exceeded its {STAGE_TIMEOUTS[name]:.0f}s deadline.")
+        raise
+    except Exception as e:
+        print(f"[ERROR] Stage '{name}' failed: {e}")
+        raise
+    print(f"[STAGE] {name} done in {time.monotonic() - since:.1f}s")
+    return result
@@ -0,0 +1,169 @@
+import os
+import json
+import shutil
+from datetime import datetime, date, timedelta
+
+QUEUE_DIR = os.getenv("POST_QUEUE_DIR", "post_queue")
+# Bundles kept ready at most; prepare stops once the queue is this deep
+QUEUE_MAX_DEPTH = int(os.getenv("POST_QUEUE_MAX_DEPTH", "3"))
+# Bundles older than this are dropped instead of posted
+BUNDLE_MAX_AGE_HOURS = float(os.getenv("POST_BUNDLE_MAX_AGE_HOURS", "72"))
+
+_CLAIMED_PREFIX = ".claimed-"
+_STAGING_PREFIX = ".staging-"
+
+
+class Bundle:
+    """One ready-to-publish post: its images and caption in post_queue/<bundle_id>/."""
+
+    def __init__(self, directory: str, meta: dict):
+        self.directory = directory
+        self.meta = meta
+
+    @property
+    def id(self) -> str:
+        return self.meta["id"]
+
+    @property
+    def caption(self) -> str:
+        return self.meta["caption"]
+
+    @property
+    def for_date(self) -> str:
+        return self.meta["for_date"]
+
+    @property
+    def image_paths(self) -> list:
+        return [os.path.abspath(os.path.join(self.directory, name)) for name in self.meta["images"]]
+
+    def age_hours(self) -> float:
+        return (datetime.now() - datetime.fromisoformat(self.meta["created_at"])).total_seconds() / 3600
+
+
+class PostQueue:
+    """
+    Durable on-disk queue of post bundles, filled off-peak by `prepare` and
+    drained at the posting slot by `publish`.
+
+    A bundle directory only appears under its final name once all its files are
+    written (staged, then renamed), so a crash mid-prepare never leaves a
+    half-built bundle in the queue. Dequeuing renames the directory to claim it;
+    ack() deletes it after a successful post, nack() puts it back.
+    """
+
+    def __init__(self, directory: str = QUEUE_DIR, max_depth: int = QUEUE_MAX_DEPTH, max_age_hours: float = BUNDLE_MAX_AGE_HOURS):
+        self.directory = directory
+        self.max_depth = max_depth
+        self.max_age_hours = max_age_hours
+
+    def _bundles(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        bundles = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("."):
+                continue
+            bundle = self._read(os.path.join(self.directory, name))
+            if bundle:
+                bundles.append(bundle)
+        return bundles
+
+    @staticmethod
+    def _read(directory: str):
+        try:
+            with open(os.path.join(directory, "bundle.json"), "r", encoding="utf-8") as f:
+                return Bundle(directory, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def depth(self) -> int:
+        return len(self._bundles())
+
+    def is_full(self) -> bool:
+        return self.depth() >= self.max_depth
+
+    def dates(self) -> set:
+        """Days that already have a bundle waiting."""
+        return {b.for_date for b in self._bundles()}
+
+    def enqueue(self, image_paths: list, caption: str, for_date: date, theme: str) -> str:
+        """Copies the images and caption into a new bundle. Returns its id."""
+        bundle_id = f"{for_date.isoformat()}-{datetime.now().strftime('%H%M%S')}"
+        staging = os.path.join(self.directory, f"{_STAGING_PREFIX}{bundle_id}")
+        os.makedirs(staging, exist_ok=True)
+        names = []
+        for i, path in enumerate(image_paths):
+            name = f"image_{i+1}{os.path.splitext(path)[1] or '.jpg'}"
+            shutil.copyfile(path, os.path.join(staging, name))
+            names.append(name)
+        meta = {
+            "id": bundle_id,
+            "for_date": for_date.isoformat(),
+            "theme": theme,
+            "caption": caption,
+            "images": names,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(staging, "bundle.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        os.replace(staging, os.path.join(self.directory, bundle_id))
+        return bundle_id
+
+    def dequeue(self, for_date: date, theme: str = None):
+        """
+        Claims the bundle prepared for `for_date`, or else the oldest bundle with
+        the same theme. Returns None if there is no usable bundle.
+        """
+        self.purge_expired()
+        bundles = self._bundles()
+        candidates = [b for b in bundles if b.for_date == for_date.isoformat()]
+        if not candidates and theme:
+            candidates = [b for b in bundles if b.meta.get("theme") == theme]
+        for bundle in candidates:
+            claimed = os.path.join(self.directory, f"{_CLAIMED_PREFIX}{bundle.id}")
+            try:
+                os.replace(bundle.directory, claimed)
+            except OSError:
+                continue  # another publisher got it first
+            return Bundle(claimed, bundle.meta)
+        return None
+
+    def ack(self, bundle: Bundle):
+        shutil.rmtree(bundle.directory, ignore_errors=True)
+
+    def nack(self, bundle: Bundle):
+        os.replace(bundle.directory, os.path.join(self.directory, bundle.id))
+
+    def purge_expired(self) -> int:
+        """Deletes bundles past their max age or for days already gone. Returns how many were removed."""
+        today = date.today().isoformat()
+        removed = 0
+        for bundle in self._bundles():
+            if bundle.age_hours() > self.max_age_hours or bundle.for_date < today:
+                print(f"[WARNING] Dropping stale post bundle {bundle.id}.")
+                shutil.rmtree(bundle.directory, ignore_errors=True)
+                removed += 1
+        # Leftovers from a crash mid-prepare or mid-publish. Claimed bundles are never
+        # put back automatically: the crash may have happened after the post went live.
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.startswith((_STAGING_PREFIX, _CLAIMED_PREFIX)) and _age_hours(path) > self.max_age_hours:
+                    shutil.rmtree(path, ignore_errors=True)
+        return removed
+
+    def upcoming_dates(self, start: date = None) -> list:
+        """The next days (from `start`, default today) without a bundle, up to the free queue depth."""
+        start = start or date.today()
+        taken = self.dates()
+        free = max(0, self.max_depth - len(taken))
+        days, day = [], start
+        while len(days) < free:
+            if day.isoformat() not in taken:
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+
+def _age_hours(path: str) -> float:
+    return (datetime.now().timestamp() - os.path.getmtime(path)) / 3600
@@ -0,0 +1,106 @@
+import os
+import json
+from datetime import datetime, date, timedelta
+
+CACHE_FILE = os.getenv("PROMPT_CACHE_FILE", "prompt_cache.json")
+# Planned entries older than this are regenerated even if their day hasn't come yet
+CACHE_TTL_DAYS = float(os.getenv("PROMPT_CACHE_TTL_DAYS", "7"))
+CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "60"))
+
+
+class PromptCache:
+    """
+    On-disk cache of planned prompts and captions, keyed by date and theme.
+
+    Keying on the theme as well as the date means editing schedule.json
+    invalidates the affected days automatically. Expired entries, days in the
+    past and anything beyond CACHE_MAX_ENTRIES (oldest first) are evicted on write.
+
+    Runs read their entry with take(), which removes it: a second slot on the
+    same day, a publish fallback or a fresh retry gets new content instead of
+    posting the same prompts and caption twice. A run that has taken its entry
+    keeps it in its own manifest, so resuming it does not need the cache.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttl_days: float = CACHE_TTL_DAYS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = timedelta(days=ttl_days)
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(day: date, theme: str) -> str:
+        return f"{day.isoformat()}|{theme}"
+
+    def get(self, day: date, theme: str):
+        """Returns (prompts, caption) for the day, or None if missing or expired."""
+        entry = self._load().get(self.key(day, theme))
+        if not entry or self._expired(entry):
+            return None
+        return entry["prompts"], entry["caption"]
+
+    def take(self, day: date, theme: str):
+        """Like get(), but removes the entry so no other run posts the same content."""
+        entries = self._load()
+        entry = entries.pop(self.key(day, theme), None)
+        if entry is None:
+            return None
+        self._save(entries)
+        if self._expired(entry):
+            return None
+        return entry["prompts"], entry["caption"]
+
+    def put(self, day: date, theme: str, prompts: list, caption: str):
+        self.put_many([(day, theme, prompts, caption)])
+
+    def put_many(self, items: list):
+        """Stores several (day, theme, prompts, caption) tuples with a single write."""
+        entries = self._load()
+        now = datetime.now().isoformat(timespec="seconds")
+        for day, theme, prompts, caption in items:
+            entries[self.key(day, theme)] = {
+                "date": day.isoformat(),
+                "theme": theme,
+                "prompts": prompts,
+                "caption": caption,
+                "created_at": now,
+            }
+        self._save(self._evict(entries))
+
+    def invalidate(self, day: date) -> int:
+        """Drops every entry for `day`, whatever its theme. Returns how many were removed."""
+        entries = self._load()
+        kept = {k: v for k, v in entries.items() if v.get("date") != day.isoformat()}
+        removed = len(entries) - len(kept)
+        if removed:
+            self._save(kept)
+        return removed
+
+    def _expired(self, entry: dict) -> bool:
+        try:
+            return datetime.now() - datetime.fromisoformat(entry["created_at"]) > self.ttl
+        except (KeyError, ValueError):
+            return True
+
+    def _evict(self, entries: dict) -> dict:
+        today = date.today().isoformat()
+        kept = {k: v for k, v in entries.items() if not self._expired(v) and v.get("date", "") >= today}
+        if len(kept) > self.max_entries:
+            newest = sorted(kept.items(), key=lambda kv: kv[1]["created_at"], reverse=True)[:self.max_entries]
+            kept = dict(newest)
+        return kept
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[WARNING] Ignoring unreadable prompt cache {self.path}: {e}")
+            return {}
+
+    def _save(self, entries: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
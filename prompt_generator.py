@@ -1,51 +1,48 @@
 import os
 import json
-from datetime import datetime
-from google import genai
+from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
+from prompt_cache import PromptCache
+import gemini_client
 
 load_dotenv()
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-client = None
-if api_key:
-    client = genai.Client(api_key=api_key)
+cache = PromptCache()
 
-def get_todays_theme():
-    """Reads schedule.json and returns today's theme."""
-    try:
-        with open("schedule.json", "r") as f:
-            schedule = json.load(f)
-        today = datetime.now().strftime("%A")
-        return schedule.get(today, "Casual Lifestyle Photo")
-    except Exception as e:
-        print(f"Error reading schedule: {e}")
-        return "Casual Lifestyle Photo"
+# How captions are written; each persona can set its own
+CAPTION_STYLE = os.getenv("CAPTION_STYLE", "a catchy Instagram caption with 5-10 trending hashtags, no emojis")
 
-def generate_prompt_and_caption():
-    """Generates an image generation prompt and an Instagram caption based on today's theme."""
-    theme = get_todays_theme()
-    print(f"Today's Theme: {theme}")
-    
-    if not client:
-         return [
-             f"Hyper realistic photo of a person, full face portrait, {theme}, 4k, detailed.",
-             f"Hyper realistic photo of a person side profile looking away, {theme}, 4k.",
-             f"Hyper realistic photo of a person's hands holding coffee or doing an activity, {theme}, 4k."
-         ], f"Living my best life #{theme.replace(' ', '').replace('/', '')}"
+POST_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "prompts": {"type": "ARRAY", "items": {"type": "STRING"}, "minItems": 3},
+        "caption": {"type": "STRING"},
+    },
+    "required": ["prompts", "caption"],
+}
 
-    system_prompt = f"""
-You are a creative director for a top AI Influencer on Instagram. 
-Today's post theme is: "{theme}".
+WEEK_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "days": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"date": {"type": "STRING"}, **POST_SCHEMA["properties"]},
+                "required": ["date", "prompts", "caption"],
+            },
+        },
+    },
+    "required": ["days"],
+}
 
-Your job is to design a "Photo Dump" style carousel post consisting of 3 distinct image generation prompts and 1 caption.
+PROMPT_RULES = """
 The 3 images must look like they were taken on the EXACT same day, in the EXACT same place, wearing the EXACT same outfit.
 
-Step 1: Invent a highly specific Outfit and a highly specific Location matching today's theme.
+Step 1: Invent a highly specific Outfit and a highly specific Location matching the theme.
 Step 2: Write 3 prompts using that exact same Outfit and Location, just changing the camera angle and the subject's pose/action.
 
-1. **IMAGE PROMPT 1 (The Main Portrait):** A very detailed portrait or mirror selfie showing the subject's face clearly. 
+1. **IMAGE PROMPT 1 (The Main Portrait):** A very detailed portrait or mirror selfie showing the subject's face clearly.
 2. **IMAGE PROMPT 2 (The Detail/Vibe Shot):** A lifestyle shot (e.g., holding a coffee cup, sitting with a book, or side angle). The face can be partially visible or side profile.
 3. **IMAGE PROMPT 3 (The Candid/Action Shot):** Another distinct lifestyle shot (e.g., walking, laughing looking away, interacting with the environment).
 
@@ -53,44 +50,126 @@ CRITICAL RULES FOR ALL 3 PROMPTS:
 - **CONSISTENCY:** You MUST describe the EXACT same outfit and exactly the same background location in all 3 prompts. Do not change the colors or environment.
 - **REALISM (ANTI-AI LOOK):** The user's reference face is very soft. You MUST add these exact phrases to every prompt to force realism: "Raw candid photography, shot on 35mm lens, unapologetically natural unfiltered skin texture, visible pores, realistic lighting shadows, highly authentic, NOT soft, NO AI smoothing, real life photography."
 - **NO PHYSICAL DESCRIPTORS:** NEVER use words like 'woman', 'girl', 'man', 'beautiful', 'young', or describe the subject's physical facial features in the prompt. Use neutral terms like 'the person' or 'the subject'. DO NOT mention the word 'AI'.
+"""
+
+def get_theme_for(day: date):
+    """Reads schedule.json and returns the theme for the given day."""
+    try:
+        with open("schedule.json", "r") as f:
+            schedule = json.load(f)
+        return schedule.get(day.strftime("%A"), "Casual Lifestyle Photo")
+    except Exception as e:
+        print(f"Error reading schedule: {e}")
+        return "Casual Lifestyle Photo"
+
+def get_todays_theme():
+    """Reads schedule.json and returns today's theme."""
+    return get_theme_for(datetime.now().date())
+
+def _fallback(theme: str):
+    return [
+         f"Hyper realistic photo of a person, full face portrait, {theme}, 4k, detailed.",
+         f"Hyper realistic photo of a person side profile looking away, {theme}, 4k.",
+         f"Hyper realistic photo of a person's hands holding coffee or doing an activity, {theme}, 4k."
+    ], f"Living my best life #{theme.replace(' ', '').replace('/', '')}"
+
+def generate_prompt_and_caption(day: date = None):
+    """
+    Returns the image prompts and Instagram caption for `day` (default today).
+    Served from the planned cache when possible, consuming the entry so the next
+    call for the same day gets new content; otherwise asks Gemini for that day only.
+    """
+    today = day or datetime.now().date()
+    theme = get_theme_for(today)
+    print(f"{'Today' if today == datetime.now().date() else today.strftime('%A')}'s Theme: {theme}")
+
+    cached = cache.take(today, theme)
+    if cached:
+        print("Using planned prompts from the prompt cache.")
+        return cached
 
-Output EXACTLY in this JSON format:
-{{
-  "prompts": [
-    "prompt 1 text here...",
-    "prompt 2 text here...",
-    "prompt 3 text here..."
-  ],
-  "caption": "Your catchy Instagram caption with 5-10 trending hashtags (no emojis)"
-}}
+    if not gemini_client.available():
+         return _fallback(theme)
+
+    system_prompt = f"""
+You are a creative director for a top AI Influencer on Instagram.
+The post theme is: "{theme}".
+
+Your job is to design a "Photo Dump" style carousel post consisting of 3 distinct image generation prompts and 1 caption.
+{PROMPT_RULES}
+Return "prompts" (the 3 prompts, in order) and "caption" ({CAPTION_STYLE}).
 """
     try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=system_prompt,
-        )
-        output = response.text.strip()
-        # Clean markdown formatting if present
-        if output.startswith("```json"):
-            output = output[7:-3].strip()
-        elif output.startswith("```"):
-            output = output[3:-3].strip()
-            
-        data = json.loads(output)
-        return data.get("prompts", []), data.get("caption", f"Living my best life #{theme.replace(' ', '')}")
-        
+        data = gemini_client.generate_json(system_prompt, POST_SCHEMA, label="daily prompts")
+        return data["prompts"], data["caption"]
+
     except Exception as e:
-        print(f"Error calling or parsing Gemini API: {e}")
-        return [
-             f"Hyper realistic photo of a person, full face portrait, {theme}, 4k, detailed.",
-             f"Hyper realistic photo of a person side profile looking away, {theme}, 4k.",
-             f"Hyper realistic photo of a person's hands holding coffee or doing an activity, {theme}, 4k."
-        ], f"Living my best life #{theme.replace(' ', '')}"
+        print(f"[WARNING] Gemini failed, using generic prompts: {e}")
+        return _fallback(theme)
+
+def plan_week(days: int = 7, start: date = None, force: bool = False) -> int:
+    """
+    Plans prompts and captions for the next `days` days (starting today) in a single
+    Gemini request and stores them in the prompt cache. Days that already have a
+    valid cache entry are skipped unless `force` is set. Returns the number of days planned.
+    """
+    start = start or datetime.now().date()
+    wanted = [(start + timedelta(days=i)) for i in range(days)]
+    missing = [(d, get_theme_for(d)) for d in wanted if force or cache.get(d, get_theme_for(d)) is None]
+    if not missing:
+        print(f"Prompt cache already covers the next {days} days.")
+        return 0
+    if not gemini_client.available():
+        print("[WARNING] GEMINI_API_KEY not set. Cannot plan ahead.")
+        return 0
+
+    schedule_lines = "\n".join(f'- {d.isoformat()} ({d.strftime("%A")}): "{theme}"' for d, theme in missing)
+    system_prompt = f"""
+You are a creative director for a top AI Influencer on Instagram.
+Plan one "Photo Dump" style carousel post for EACH of these days, using that day's theme:
+{schedule_lines}
+
+Each day's post consists of 3 distinct image generation prompts and 1 caption. Every day must have its own outfit and location.
+{PROMPT_RULES}
+Return "days" with one entry per day listed above: its "date" (YYYY-MM-DD), "prompts" (the 3 prompts, in order)
+and "caption" ({CAPTION_STYLE}).
+"""
+    print(f"Planning {len(missing)} days of posts in one Gemini request...")
+    try:
+        data = gemini_client.generate_json(system_prompt, WEEK_SCHEMA, label="week plan", deadline=gemini_client.GEMINI_DEADLINE * 2)
+        planned = {entry["date"]: entry for entry in data["days"]}
+    except Exception as e:
+        print(f"Error calling or parsing Gemini API while planning: {e}")
+        return 0
+
+    items = []
+    for d, theme in missing:
+        entry = planned.get(d.isoformat())
+        if entry and entry.get("prompts"):
+            items.append((d, theme, entry["prompts"], entry.get("caption") or _fallback(theme)[1]))
+        else:
+            print(f"[WARNING] Gemini returned no plan for {d.isoformat()}; it will be generated on the day.")
+    cache.put_many(items)
+    print(f"Planned {len(items)} of {len(missing)} days.")
+    return len(items)
 
 if __name__ == "__main__":
     import sys
+    import argparse
     # Forcing UTF-8 encoding for standard output
     sys.stdout.reconfigure(encoding='utf-8')
-    prompt, caption = generate_prompt_and_caption()
-    print("\n[PROMPT]\n", prompt)
-    print("\n[CAPTION]\n", caption)
+    parser = argparse.ArgumentParser(description="Prompt & caption generator")
+    parser.add_argument("--plan", type=int, nargs="?", const=7, metavar="DAYS", help="Plan the next DAYS days (default 7) into the cache")
+    parser.add_argument("--force", action="store_true", help="With --plan, regenerate days that are already cached")
+    parser.add_argument("--invalidate", type=str, metavar="YYYY-MM-DD", help="Drop the cached plan for a day")
+    args = parser.parse_args()
+
+    if args.invalidate:
+        removed = cache.invalidate(date.fromisoformat(args.invalidate))
+        print(f"Removed {removed} cached entries for {args.invalidate}.")
+    elif args.plan:
+        plan_week(args.plan, force=args.force)
+    else:
+        prompt, caption = generate_prompt_and_caption()
+        print("\n[PROMPT]\n", prompt)
+        print("\n[CAPTION]\n", caption)
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple
+
+# Extra URL regexes that are never blocked, comma-separated (escape hatch when a block breaks a page)
+ROUTE_ALLOW = [p for p in os.getenv("ROUTE_ALLOW", "").split(",") if p.strip()]
+ROUTE_METRICS_FILE = os.getenv("ROUTE_METRICS_FILE", "route_metrics.jsonl")
+
+# Only URLs that look blockable are routed at all: every routed request makes a
+# round trip through Python, and the sync API only services it during Playwright calls
+_ROUTED_URLS = (
+    r"\.(woff2?|ttf|otf|eot|mp4|m4a|webm|mp3|jpe?g|png|webp|gif|ico|avif)(\?|$)"
+    r"|//[^/]*(scontent[^/]*\.cdninstagram\.com|fbcdn\.net)/"
+    r"|//[^/]*(google-analytics\.com|googletagmanager\.com|doubleclick\.net|connect\.facebook\.net)/"
+    r"|/logging_client_events|/ajax/bz"
+)
+
+
+class RoutePolicy(NamedTuple):
+    """What to keep out of one site's page loads."""
+    name: str
+    block_types: frozenset      # Playwright resource types, e.g. "image", "font", "media"
+    block_urls: str             # regex of hosts/paths blocked whatever their type (trackers, beacons)
+    allow_urls: str = ""        # regex of URLs always let through
+    enabled: bool = True
+
+
+INSTAGRAM = RoutePolicy(
+    "instagram",
+    # Feed images, avatars, videos and web fonts: the create dialog previews uploads from blob: URLs
+    frozenset({"image", "media", "font"}),
+    r"google-analytics\.com|googletagmanager\.com|doubleclick\.net|connect\.facebook\.net|/logging_client_events|/ajax/bz",
+    enabled=os.getenv("ROUTE_POLICY_INSTAGRAM", "1") != "0",
+)
+
+WHISK = RoutePolicy(
+    "whisk",
+    # Images stay: page_waits.images_loaded and the DOM salvage path need them
+    frozenset({"media", "font"}),
+    r"google-analytics\.com|googletagmanager\.com|doubleclick\.net",
+    # Generation results must never be touched
+    allow_urls=os.getenv("WHISK_RESULT_URL_PATTERN", r"generateImage|runImageRecipe"),
+    # Opt-in: routing turns off the HTTP cache, and a warm profile would otherwise
+    # load Whisk's scripts and styles from it, which saves more than this blocks
+    enabled=os.getenv("ROUTE_POLICY_WHISK", "0") == "1",
+)
+
+
+class RouteStats:
+    """
+    Requests blocked and loaded for one page under a policy. Loaded bytes come
+    from content-length headers, so they are an estimate: chunked responses
+    have none and are only counted in unsized_requests.
+    """
+
+    def __init__(self, policy: RoutePolicy):
+        self.policy = policy
+        self.blocked = Counter()       # by resource type
+        self.blocked_hosts = Counter()
+        self.loaded_requests = 0
+        self.loaded_bytes = 0
+        self.unsized_requests = 0
+
+    def _on_response(self, response):
+        self.loaded_requests += 1
+        try:
+            self.loaded_bytes += int(response.headers["content-length"])
+        except (KeyError, ValueError):
+            self.unsized_requests += 1
+
+    def report(self):
+        total_blocked = sum(self.blocked.values())
+        by_type = ", ".join(f"{kind} {count}" for kind, count in self.blocked.most_common())
+        print(f"[ROUTE] {self.policy.name}: blocked {total_blocked} requests ({by_type or 'none'}); "
+              f"loaded {self.loaded_requests} requests, ~{self.loaded_bytes / 1048576:.1f} MB by content-length "
+              f"({self.unsized_requests} without one)")
+        record = {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "site": self.policy.name,
+            "policy": self.policy.enabled,
+            "blocked_requests": total_blocked,
+            "blocked_by_type": dict(self.blocked),
+            "top_blocked_hosts": dict(self.blocked_hosts.most_common(10)),
+            "loaded_requests": self.loaded_requests,
+            # Sum of content-length headers; unsized_requests had none
+            "loaded_bytes": self.loaded_bytes,
+            "unsized_requests": self.unsized_requests,
+        }
+        try:
+            with open(ROUTE_METRICS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"[WARNING] Could not write route metrics: {e}")
+
+
+def install(page, policy: RoutePolicy) -> RouteStats:
+    """
+    Applies `policy` to `page` and returns its RouteStats. With the policy
+    disabled nothing is routed, but loaded bytes are still counted, so
+    route_metrics.jsonl shows the bandwidth saved by comparing both modes.
+    Chromium skips its HTTP cache for pages with routes installed, so a policy
+    only pays off where it blocks more than the cache would have served.
+    """
+    stats = RouteStats(policy)
+    page.on("response", stats._on_response)
+    if not policy.enabled:
+        return stats
+
+    allow = re.compile("|".join(p for p in [policy.allow_urls, *ROUTE_ALLOW] if p)) if (policy.allow_urls or ROUTE_ALLOW) else None
+    block_urls = re.compile(policy.block_urls)
+
+    def handle(route):
+        request = route.request
+        url = request.url
+        if (allow and allow.search(url)) or not (request.resource_type in policy.block_types or block_urls.search(url)):
+            route.continue_()
+            return
+        stats.blocked[request.resource_type] += 1
+        stats.blocked_hosts[url.split("/")[2] if "//" in url else url] += 1
+        route.abort("blockedbyclient")
+
+    page.route(re.compile(_ROUTED_URLS), handle)
+    return stats
@@ -0,0 +1,166 @@
+import os
+import re
+import time
+import json
+import base64
+from collections import defaultdict
+from typing import NamedTuple
+from blob_transfer import fetch_blob_bytes, sniff_image_type
+from page_waits import Wait, current_blobs
+
+# Whisk backend calls that return generated images. Override if Google renames them.
+WHISK_RESULT_URL_PATTERN = os.getenv("WHISK_RESULT_URL_PATTERN", r"generateImage|runImageRecipe")
+# Variations a pass waits for until a finished pass has shown how many Whisk returns
+WHISK_VARIATIONS = int(os.getenv("WHISK_VARIATIONS", "2"))
+# A pass with fewer images than expected resolves once none has arrived for this long
+SETTLE_SECONDS = float(os.getenv("WHISK_RESULT_SETTLE", "3"))
+# How often the page is checked for result images the network capture missed
+DOM_CHECK_SECONDS = 1.0
+
+# base64 prefixes of the image signatures in blob_transfer.IMAGE_SIGNATURES
+_BASE64_IMAGE_PREFIXES = ("/9j/", "iVBORw0KGgo", "UklGR")
+
+
+class CapturedImage(NamedTuple):
+    """One generated image as it arrived from the Whisk backend."""
+    prompt_idx: int
+    pass_no: int
+    seq: int          # position within its pass, in arrival/response order
+    data: bytes
+    source_url: str
+
+
+class ResponseCapture:
+    """
+    Records Whisk generation results straight off the network for one page.
+
+    Call arm(prompt_idx, pass_no) right before clicking Generate. Every matching
+    request sent afterwards is tagged with that prompt/pass, and its response
+    keeps the tag of the request it answers, so a late answer to an earlier pass
+    is never counted as the current one. Bodies are read lazily from the
+    caller's side (never inside the event handler) and decoded once, so the
+    save stage gets raw bytes with no DOM round trips.
+    """
+
+    def __init__(self, page, url_pattern: str = WHISK_RESULT_URL_PATTERN):
+        self._page = page
+        self._pattern = re.compile(url_pattern)
+        self._tag = None
+        self._request_tags = {}
+        self._pending = []
+        self._results = defaultdict(list)
+        self._arrived = {}
+        self._blobs_before = []
+        # How many variations a pass returned, once one has finished
+        self.variations = None
+        page.on("request", self._on_request)
+        page.on("requestfailed", lambda request: self._request_tags.pop(request, None))
+        page.on("response", self._on_response)
+
+    def arm(self, prompt_idx: int, pass_no: int):
+        self._blobs_before = current_blobs(self._page)
+        self._tag = (prompt_idx, pass_no)
+
+    def _on_request(self, request):
+        if self._tag is not None and self._pattern.search(request.url):
+            self._request_tags[request] = self._tag
+
+    def _on_response(self, response):
+        tag = self._request_tags.pop(response.request, None)
+        if tag is not None and response.ok:
+            self._pending.append((tag, response))
+
+    def _collect(self):
+        pending, self._pending = self._pending, []
+        for tag, response in pending:
+            try:
+                images = _extract_images(response)
+            except Exception as e:
+                print(f"[WARNING] Could not read generation response {response.url[:80]}: {e}")
+                continue
+            results = self._results[tag]
+            for data in images:
+                results.append(CapturedImage(tag[0], tag[1], len(results), data, response.url))
+            if images:
+                self._arrived[tag] = time.monotonic()
+
+    def images(self, prompt_idx: int, pass_no: int) -> list:
+        """Every image captured so far for this prompt/pass, in arrival order."""
+        self._collect()
+        return list(self._results[(prompt_idx, pass_no)])
+
+    def wait(self, prompt_idx: int, pass_no: int, timeout: float = 90, label: str = "Generation results") -> Wait:
+        """
+        A page_waits.Wait that resolves to the pass's captured images once the
+        expected number of variations is in, or SETTLE_SECONDS after the last one
+        if fewer come. When no response matches WHISK_RESULT_URL_PATTERN but new
+        result images show up in the page, it resolves to those instead of
+        waiting out the deadline.
+        """
+        tag = (prompt_idx, pass_no)
+        expected = self.variations or WHISK_VARIATIONS
+        dom = {"checked": 0.0, "seen": None}
+
+        def check():
+            images = self.images(prompt_idx, pass_no)
+            now = time.monotonic()
+            if images:
+                if len(images) >= expected or now - self._arrived[tag] >= SETTLE_SECONDS:
+                    self.variations = max(self.variations or 0, len(images))
+                    return images
+                return None
+            if now - dom["checked"] < DOM_CHECK_SECONDS:
+                return None
+            dom["checked"] = now
+            new_blobs = [b for b in current_blobs(self._page) if b not in self._blobs_before]
+            if not new_blobs:
+                return None
+            # Results are on screen: give the network capture (and slower variations) a moment first
+            dom["seen"] = dom["seen"] or now
+            if now - dom["seen"] >= SETTLE_SECONDS:
+                return self._from_dom(tag, new_blobs)
+            return None
+
+        return Wait("", timeout=timeout, label=label, check=check, metric="whisk.generation")
+
+    def _from_dom(self, tag: tuple, blob_urls: list) -> list:
+        """Reads a pass's result images from the page, for when no generation response matched."""
+        print(f"[WARNING] No response matched WHISK_RESULT_URL_PATTERN; reading {len(blob_urls)} result images from the page.")
+        results = self._results[tag]
+        for url in blob_urls:
+            try:
+                data = fetch_blob_bytes(self._page, url)
+            except Exception as e:
+                print(f"Blob read failed for {url[:60]}: {e}")
+                continue
+            if data and sniff_image_type(data):
+                results.append(CapturedImage(tag[0], tag[1], len(results), data, url))
+        return list(results) or None
+
+
+def _extract_images(response) -> list:
+    """Pulls image bytes out of a generation response (raw image body or JSON with base64 fields)."""
+    content_type = (response.headers.get("content-type") or "").lower()
+    body = response.body()
+    if content_type.startswith("image/"):
+        return [body]
+    if "json" not in content_type and not body.lstrip().startswith((b"{", b"[")):
+        return []
+    found = []
+    _walk_json(json.loads(body), found)
+    return found
+
+
+def _walk_json(node, found: list):
+    if isinstance(node, dict):
+        for value in node.values():
+            _walk_json(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _walk_json(value, found)
+    elif isinstance(node, str) and len(node) > 256:
+        encoded = node.split("base64,", 1)[1] if node.startswith("data:image/") else node
+        if encoded.startswith(_BASE64_IMAGE_PREFIXES):
+            data = base64.b64decode(encoded)
+            if sniff_image_type(data):
+                found.append(data)
@@ -0,0 +1,135 @@
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+
+RUNS_DIR = os.getenv("RUNS_DIR", "runs")
+# Images are stored once by content hash and shared by every run that produced them
+ARTIFACTS_DIR = os.path.join(RUNS_DIR, "artifacts")
+
+
+class RunManifest:
+    """
+    Checkpoint file for one daily run (runs/<run_id>/manifest.json).
+
+    Records the prompts and caption, each generated image (as a content-addressed
+    artifact) and the post outcome, so a failed run can resume at the first
+    incomplete stage instead of starting over.
+    """
+
+    def __init__(self, run_id: str, data: dict = None):
+        self.run_id = run_id
+        self.data = data or {
+            "run_id": run_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "prompts": {"status": "pending"},
+            "images": {},
+            "post": {"status": "pending", "attempts": 0},
+        }
+
+    @property
+    def path(self) -> str:
+        return os.path.join(RUNS_DIR, self.run_id, "manifest.json")
+
+    @classmethod
+    def create(cls) -> "RunManifest":
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        manifest = cls(run_id)
+        manifest.save()
+        print(f"Run id: {run_id}")
+        return manifest
+
+    @classmethod
+    def load(cls, run_id: str) -> "RunManifest":
+        """Loads a run by id; 'latest' picks the newest run that has not posted yet."""
+        if run_id == "latest":
+            run_id = _latest_incomplete()
+            if not run_id:
+                raise FileNotFoundError(f"No incomplete runs in {RUNS_DIR}")
+        with open(os.path.join(RUNS_DIR, run_id, "manifest.json"), "r", encoding="utf-8") as f:
+            return cls(run_id, json.load(f))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # ── Prompts ────────────────────────────────────────────────────────────
+    def has_prompts(self) -> bool:
+        return self.data["prompts"]["status"] == "done"
+
+    def prompts(self):
+        return self.data["prompts"]["prompts"], self.data["prompts"]["caption"]
+
+    def record_prompts(self, prompts: list, caption: str):
+        self.data["prompts"] = {"status": "done", "prompts": list(prompts), "caption": caption}
+        self.data["images"] = {str(i): {"status": "pending"} for i in range(len(prompts))}
+        self.save()
+
+    # ── Images ─────────────────────────────────────────────────────────────
+    def record_image(self, idx: int, path: str):
+        """Copies a generated image into the artifact store and marks its slot done."""
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        artifact = os.path.join(ARTIFACTS_DIR, f"{digest}{os.path.splitext(path)[1] or '.jpg'}")
+        if not os.path.exists(artifact):
+            shutil.copyfile(path, artifact)
+        self.data["images"][str(idx)] = {"status": "done", "artifact": os.path.basename(artifact), "sha256": digest}
+        self.save()
+
+    def missing_images(self) -> list:
+        """Indices of prompts whose image has not been generated (or whose artifact vanished)."""
+        missing = []
+        for idx, slot in sorted(self.data["images"].items(), key=lambda kv: int(kv[0])):
+            if slot["status"] != "done" or not os.path.exists(os.path.join(ARTIFACTS_DIR, slot["artifact"])):
+                missing.append(int(idx))
+        return missing
+
+    def image_paths(self) -> list:
+        """Absolute artifact paths of the finished images, in prompt order."""
+        done = [
+            (int(idx), slot["artifact"]) for idx, slot in self.data["images"].items()
+            if slot["status"] == "done" and os.path.exists(os.path.join(ARTIFACTS_DIR, slot["artifact"]))
+        ]
+        return [os.path.abspath(os.path.join(ARTIFACTS_DIR, name)) for _, name in sorted(done)]
+
+    # ── Post ───────────────────────────────────────────────────────────────
+    def record_post(self, success: bool, error: str = None):
+        post = self.data["post"]
+        post["attempts"] = post.get("attempts", 0) + 1
+        post["status"] = "done" if success else "failed"
+        post["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        if error:
+            post["error"] = error
+        self.save()
+
+    def post_attempts(self) -> int:
+        return self.data["post"].get("attempts", 0)
+
+    def first_incomplete_stage(self):
+        """'prompts', 'images', 'post', or None once the post is live."""
+        if self.data["post"]["status"] == "done":
+            return None
+        if not self.has_prompts():
+            return "prompts"
+        if self.missing_images():
+            return "images"
+        return "post"
+
+
+def _latest_incomplete():
+    if not os.path.isdir(RUNS_DIR):
+        return None
+    for run_id in sorted(os.listdir(RUNS_DIR), reverse=True):
+        if run_id == os.path.basename(ARTIFACTS_DIR):
+            continue
+        try:
+            if RunManifest.load(run_id).first_incomplete_stage():
+                return run_id
+        except (OSError, ValueError, KeyError):
+            continue
+    return None
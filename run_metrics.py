@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+import tracing
+
+RUN_METRICS_DB = os.getenv("RUN_METRICS_DB", "run_metrics.db")
+# Take wait deadlines from past runs (p99 x margin) instead of the fixed defaults
+ADAPTIVE_TIMEOUTS = os.getenv("ADAPTIVE_TIMEOUTS", "1") != "0"
+TIMEOUT_MARGIN = float(os.getenv("ADAPTIVE_TIMEOUT_MARGIN", "1.5"))
+# Successful samples a step needs before its deadline is adapted
+MIN_SAMPLES = int(os.getenv("ADAPTIVE_MIN_SAMPLES", "20"))
+# Only this many recent days count, so the deadlines follow the sites as they change
+WINDOW_DAYS = int(os.getenv("RUN_METRICS_WINDOW_DAYS", "30"))
+# Adaptive deadlines stay within these multiples of the fixed default
+TIMEOUT_FLOOR = 0.5
+TIMEOUT_CAP = 3.0
+# Above this share of timed-out samples the successes are cut off by the deadline
+# itself, so their p99 says nothing and the deadline must not shrink
+MAX_CENSORED = 0.02
+# A long-running scheduler picks up new samples after this long
+DEADLINE_TTL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    step        TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    seconds     REAL NOT NULL,
+    ok          INTEGER NOT NULL,
+    deadline    REAL,
+    run_id      TEXT,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_durations_step ON durations (step, recorded_at);
+"""
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of `values` (not necessarily sorted)."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class MetricsStore:
+    """
+    Durations of every wait (kind "wait") and traced span (kind "span") from
+    past runs, with whether it succeeded, in a SQLite file. Safe to use from
+    several threads: every call opens its own connection.
+    """
+
+    def __init__(self, db_path: str = RUN_METRICS_DB):
+        self.db_path = db_path
+        self._deadlines = {}
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def record(self, step: str, seconds: float, ok: bool, deadline: float = None, kind: str = "wait", run_id: str = None):
+        self.record_many([(step, seconds, ok, deadline)], kind, run_id)
+
+    def record_many(self, rows: list, kind: str, run_id: str = None):
+        """Stores (step, seconds, ok, deadline) tuples in one transaction. Never raises."""
+        now = datetime.now().isoformat(timespec="seconds")
+        run_id = run_id or tracing.run_id()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT INTO durations (step, kind, seconds, ok, deadline, run_id, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(step, kind, round(seconds, 3), int(bool(ok)), deadline, run_id, now) for step, seconds, ok, deadline in rows],
+                )
+        except sqlite3.Error as e:
+            print(f"[WARNING] Could not record run metrics: {e}")
+
+    def samples(self, step: str, days: int = WINDOW_DAYS) -> list:
+        """(seconds, ok) of `step` over the last `days` days."""
+        since = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT seconds, ok FROM durations WHERE step = ? AND recorded_at >= ?", (step, since)).fetchall()
+
+    def deadline(self, step: str, default: float, margin: float = TIMEOUT_MARGIN) -> float:
+        """
+        The wait deadline for `step`: p99 of its recent successful durations times
+        `margin`, kept within TIMEOUT_FLOOR..TIMEOUT_CAP of `default`. Falls back to
+        `default` with too few samples, and never goes below it while too many
+        recent waits timed out. Cached for DEADLINE_TTL, so a run keeps its deadlines.
+        """
+        if not ADAPTIVE_TIMEOUTS:
+            return default
+        with self._lock:
+            cached = self._deadlines.get((step, default))
+            if cached and time.monotonic() - cached[1] < DEADLINE_TTL:
+                return cached[0]
+        try:
+            samples = self.samples(step)
+        except sqlite3.Error as e:
+            print(f"[WARNING] Could not read run metrics for {step}: {e}")
+            samples = []
+        successes = [seconds for seconds, ok in samples if ok]
+        if len(successes) < MIN_SAMPLES:
+            value = default
+        else:
+            value = percentile(successes, 99) * margin
+            if (len(samples) - len(successes)) / len(samples) > MAX_CENSORED:
+                value = max(value, default)
+            value = round(min(max(value, default * TIMEOUT_FLOOR), default * TIMEOUT_CAP), 1)
+            if abs(value - default) >= 0.1:
+                print(f"[METRICS] {step}: deadline {value:.1f}s from {len(successes)} runs (default {default:g}s)")
+        with self._lock:
+            self._deadlines[(step, default)] = (value, time.monotonic())
+        return value
+
+    def summary(self, days: int = WINDOW_DAYS, prefix: str = "") -> list:
+        """Per step: kind, count, success rate, p50/p95/p99 of successes and the last deadline used."""
+        since = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                "SELECT step, kind, seconds, ok, deadline FROM durations WHERE recorded_at >= ? AND step LIKE ? ORDER BY id",
+                (since, prefix + "%"),
+            ).fetchall()
+        steps = {}
+        for step, kind, seconds, ok, deadline in rows:
+            entry = steps.setdefault(step, {"step": step, "kind": kind, "count": 0, "ok": [], "deadline": None})
+            entry["count"] += 1
+            if ok:
+                entry["ok"].append(seconds)
+            if deadline:
+                entry["deadline"] = deadline
+        result = []
+        for entry in steps.values():
+            ok = entry.pop("ok")
+            entry["success_rate"] = len(ok) / entry["count"]
+            for pct in (50, 95, 99):
+                entry[f"p{pct}"] = percentile(ok, pct) if ok else None
+            result.append(entry)
+        return sorted(result, key=lambda e: (e["kind"], e["step"]))
+
+
+store = MetricsStore()
+
+
+def record(step: str, seconds: float, ok: bool, deadline: float = None):
+    """Records one wait of `step` in the shared store."""
+    store.record(step, seconds, ok, deadline)
+
+
+def deadline(step: str, default: float) -> float:
+    """The adaptive deadline for `step` from the shared store (see MetricsStore.deadline)."""
+    return store.deadline(step, default)
+
+
+def report(days: int = WINDOW_DAYS, prefix: str = ""):
+    rows = store.summary(days, prefix)
+    if not rows:
+        print(f"No run metrics in {store.db_path} for the last {days} days.")
+        return
+    print(f"Run metrics, last {days} days ({store.db_path})\n")
+    print(f"{'step':<34} {'kind':<5} {'n':>5} {'ok %':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'p99x' + format(TIMEOUT_MARGIN, 'g'):>7} {'deadline':>9}")
+
+    def fmt(value):
+        return f"{value:.1f}s" if value is not None else "-"
+
+    for r in rows:
+        adaptive = r["p99"] * TIMEOUT_MARGIN if r["p99"] is not None and r["count"] >= MIN_SAMPLES else None
+        print(f"{r['step'][:34]:<34} {r['kind']:<5} {r['count']:>5} {r['success_rate'] * 100:>5.0f}% {fmt(r['p50']):>7} "
+              f"{fmt(r['p95']):>7} {fmt(r['p99']):>7} {fmt(adaptive):>7} {fmt(r['deadline']):>9}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    parser = argparse.ArgumentParser(description="Percentiles and success rates of recorded run steps")
+    parser.add_argument("--days", type=int, default=WINDOW_DAYS, help="How many recent days to include")
+    parser.add_argument("--step", default="", help="Only steps starting with this prefix (e.g. whisk.)")
+    args = parser.parse_args()
+    report(args.days, args.step)
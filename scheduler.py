@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+SCHEDULE_FILE = "schedule.json"
+STATE_FILE = os.getenv("SCHEDULER_STATE_FILE", "scheduler_state.json")
+LOCK_FILE = os.getenv("JOB_LOCK_FILE", "job.lock")
+# A lock older than this belongs to a crashed run (longer than all stage deadlines together)
+LOCK_STALE_HOURS = float(os.getenv("JOB_LOCK_STALE_HOURS", "3"))
+# Posting jobs queue this long for the lock instead of skipping, so a long prepare
+# run delays the day's post rather than dropping it; other jobs skip straight away
+LOCK_WAIT_MINUTES = float(os.getenv("JOB_LOCK_WAIT_MINUTES", "90"))
+POSTING_JOBS = {"post", "publish", "personas", "personas_publish"}
+LOCK_POLL_SECONDS = 15
+# What to do with slots missed while the machine slept or the scheduler was down:
+#   none    only run slots that are (nearly) on time
+#   latest  run the most recent missed slot once, if within MAX_LATENESS
+#   all     run every missed slot within MAX_LATENESS, oldest first
+CATCH_UP = os.getenv("SCHEDULER_CATCH_UP", "latest")
+MAX_LATENESS = timedelta(hours=float(os.getenv("SCHEDULER_MAX_LATENESS_HOURS", "6")))
+# A slot fired within this of its time counts as on time under every policy
+ON_TIME_GRACE = timedelta(minutes=2)
+# Long sleeps are split so a suspend/resume (which pauses the sleep clock) is noticed
+MAX_SLEEP_CHUNK = 300
+
+
+class Slot(NamedTuple):
+    """A daily time at which a job runs, optionally shifted by up to ±jitter_minutes."""
+    time: str                  # "HH:MM"
+    job: str = "post"          # key into the scheduler's job table
+    jitter_minutes: float = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.job}@{self.time}"
+
+    def occurrence(self, day) -> datetime:
+        """When this slot fires on `day`. Jitter is fixed per day, so restarts don't re-roll it."""
+        hour, minute = (int(part) for part in self.time.split(":"))
+        at = datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+        if self.jitter_minutes:
+            rng = random.Random(f"{self.key}|{day.isoformat()}")
+            at += timedelta(minutes=rng.uniform(-self.jitter_minutes, self.jitter_minutes))
+        return at
+
+
+def load_slots(path: str = SCHEDULE_FILE) -> list:
+    """
+    Reads the optional "slots" list from schedule.json, e.g.
+    "slots": [{"time": "04:00", "job": "prepare"}, {"time": "11:30", "job": "publish", "jitter_minutes": 10}]
+    The weekday themes in the same file are untouched.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("slots", [])
+    except (OSError, ValueError) as e:
+        print(f"Error reading slots from {path}: {e}")
+        return []
+    return [Slot(str(e["time"]), e.get("job", "post"), float(e.get("jitter_minutes", 0))) for e in entries]
+
+
+# ── Job lock ───────────────────────────────────────────────────────────────
+def _acquire_lock(name: str) -> bool:
+    try:
+        fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            age_hours = (time.time() - os.path.getmtime(LOCK_FILE)) / 3600
+        except FileNotFoundError:
+            return _acquire_lock(name)  # released in the meantime
+        if age_hours < LOCK_STALE_HOURS:
+            return False
+        print(f"[WARNING] Removing stale job lock ({age_hours:.1f}h old).")
+        os.remove(LOCK_FILE)
+        return _acquire_lock(name)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"job": name, "pid": os.getpid(), "started_at": datetime.now().isoformat(timespec="seconds")}, f)
+    return True
+
+
+def _wait_for_lock(name: str, wait_seconds: float) -> bool:
+    """Acquires the lock, polling for up to `wait_seconds` while another job holds it."""
+    deadline = time.monotonic() + wait_seconds
+    announced = False
+    while not _acquire_lock(name):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if not announced:
+            print(f"Another job holds {LOCK_FILE}. '{name}' waits up to {wait_seconds / 60:.0f} min for it...")
+            announced = True
+        time.sleep(min(LOCK_POLL_SECONDS, remaining))
+    return True
+
+
+def run_locked(name: str, job, *args, **kwargs):
+    """
+    Runs job(*args, **kwargs) unless another job (from this or any other
+    process, e.g. a Task Scheduler run) holds the lock file. Posting jobs wait
+    up to LOCK_WAIT_MINUTES for it first. Returns the job's result, or None if
+    it was skipped.
+    """
+    wait_seconds = LOCK_WAIT_MINUTES * 60 if name in POSTING_JOBS else 0
+    if not _wait_for_lock(name, wait_seconds):
+        try:
+            with open(LOCK_FILE, "r", encoding="utf-8") as f:
+                holder = json.load(f)
+            print(f"[WARNING] Skipping '{name}': '{holder.get('job')}' is still running (pid {holder.get('pid')}, since {holder.get('started_at')}).")
+        except (OSError, ValueError):
+            print(f"[WARNING] Skipping '{name}': another job holds {LOCK_FILE}.")
+        return None
+    try:
+        return job(*args, **kwargs)
+    finally:
+        try:
+            os.remove(LOCK_FILE)
+        except OSError:
+            pass
+
+
+# ── Scheduler ──────────────────────────────────────────────────────────────
+class Scheduler:
+    """
+    Runs jobs at daily slots. Between slots it sleeps until the next one is due
+    instead of polling, so it fires on time and idles at ~0% CPU. The last
+    handled occurrence of each slot is saved in STATE_FILE, so slots missed
+    while asleep or stopped are caught up according to `catch_up`.
+    """
+
+    def __init__(self, slots: list, jobs: dict, catch_up: str = CATCH_UP, max_lateness: timedelta = MAX_LATENESS,
+                 state_path: str = STATE_FILE):
+        unknown = {slot.job for slot in slots} - set(jobs)
+        if unknown:
+            raise ValueError(f"Unknown job(s) in schedule: {', '.join(sorted(unknown))}")
+        if catch_up not in ("none", "latest", "all"):
+            raise ValueError(f"Unknown catch-up policy: {catch_up}")
+        self.slots = slots
+        self.jobs = jobs
+        self.catch_up = catch_up
+        self.max_lateness = max_lateness
+        self.state_path = state_path
+        self._stop = threading.Event()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return {k: datetime.fromisoformat(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: dict):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({k: v.isoformat() for k, v in state.items()}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def _occurrences(slot: Slot, after: datetime, until: datetime) -> list:
+        """Occurrences of `slot` in (after, until], oldest first."""
+        found = []
+        day = after.date() - timedelta(days=1)  # jitter can pull a slot back across midnight
+        while day <= until.date() + timedelta(days=1):
+            at = slot.occurrence(day)
+            if after < at <= until:
+                found.append(at)
+            day += timedelta(days=1)
+        return found
+
+    def _to_run(self, missed: list, now: datetime) -> list:
+        """Applies the catch-up policy to a slot's missed occurrences."""
+        on_time = [at for at in missed if now - at <= ON_TIME_GRACE]
+        recent = [at for at in missed if now - at <= self.max_lateness]
+        if self.catch_up == "all":
+            return recent
+        if self.catch_up == "latest":
+            return recent[-1:]
+        return on_time[-1:]
+
+    def next_due(self, state: dict, now: datetime) -> datetime:
+        upcoming = [self._occurrences(slot, max(state[slot.key], now), now + timedelta(days=2))[:1] for slot in self.slots]
+        return min(at for found in upcoming for at in found)
+
+    def run_forever(self):
+        state = self._load_state()
+        now = datetime.now()
+        for slot in self.slots:
+            # A new slot starts counting from now rather than replaying its history
+            state.setdefault(slot.key, now)
+        self._save_state(state)
+
+        for slot in self.slots:
+            print(f"Slot {slot.time} -> {slot.job}" + (f" (±{slot.jitter_minutes:g} min jitter)" if slot.jitter_minutes else ""))
+
+        while not self._stop.is_set():
+            now = datetime.now()
+            due = []
+            changed = False
+            for slot in self.slots:
+                missed = self._occurrences(slot, state[slot.key], now)
+                if not missed:
+                    continue
+                run = self._to_run(missed, now)
+                skipped = len(missed) - len(run)
+                if skipped:
+                    print(f"[WARNING] Skipping {skipped} missed '{slot.job}' run(s) of the {slot.time} slot (catch-up policy: {self.catch_up}).")
+                due.extend((at, slot) for at in run)
+                state[slot.key] = missed[-1]
+                changed = True
+            if changed:
+                # Saved before running, so a crash mid-job is not replayed as a missed slot
+                self._save_state(state)
+
+            for at, slot in sorted(due):
+                late = (datetime.now() - at).total_seconds()
+                print(f"\n[SCHEDULER] Running '{slot.job}' for the {at:%Y-%m-%d %H:%M:%S} slot ({late:.1f}s late).")
+                try:
+                    run_locked(slot.job, self.jobs[slot.job])
+                except Exception as e:
+                    print(f"[ERROR] Scheduled job '{slot.job}' failed: {e}")
+
+            next_at = self.next_due(state, datetime.now())
+            print(f"[SCHEDULER] Next run at {next_at:%Y-%m-%d %H:%M:%S}.")
+            self._sleep_until(next_at)
+
+    def _sleep_until(self, at: datetime):
+        # Recomputed from the wall clock after every chunk: time spent suspended counts
+        while not self._stop.is_set():
+            remaining = (at - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return
+            self._stop.wait(min(remaining, MAX_SLEEP_CHUNK))
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+from content_backlog import ContentBacklog
+
+Variation = namedtuple("Variation", "prompt_idx pass_no seq data")
+
+
+def _jpeg(tag: str) -> bytes:
+    return b"\xff\xd8\xff\xe0" + tag.encode() * 50
+
+
+def _batch(backlog, batch: str, theme: str = "Beach", prompts: int = 3, per_prompt: int = 2) -> int:
+    stored = 0
+    for idx in range(prompts):
+        variations = [Variation(idx, 1, seq, _jpeg(f"{batch}-{idx}-{seq}")) for seq in range(per_prompt)]
+        stored += backlog.add(variations, f"prompt {idx}", theme, batch)
+    return stored
+
+
+def _age(backlog, days: float):
+    old = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+    conn = sqlite3.connect(backlog.db_path)
+    with conn:
+        conn.execute("UPDATE variations SET created_at = ?", (old,))
+    conn.close()
+
+
+@pytest.fixture
+def backlog(tmp_path):
+    return ContentBacklog(str(tmp_path / "backlog"), max_age_days=30, max_images=100)
+
+
+def test_add_ignores_duplicate_bytes(backlog):
+    assert _batch(backlog, "b1") == 6
+    assert _batch(backlog, "b1") == 0
+    assert backlog.unused_count("Beach") == 6
+
+
+def test_take_claims_one_image_per_prompt_from_one_batch(backlog):
+    _batch(backlog, "b1")
+    picks = backlog.take("Beach", 3, "run-1")
+    assert [p["prompt"] for p in picks] == ["prompt 0", "prompt 1", "prompt 2"]
+    assert all(os.path.isfile(p["path"]) for p in picks)
+    assert backlog.unused_count("Beach") == 3
+    assert backlog.take("Beach", 4, "run-2") == []
+    assert backlog.take("City", 1, "run-2") == []
+
+
+def test_prune_drops_images_past_the_age_limit(backlog):
+    _batch(backlog, "b1")
+    _age(backlog, 31)
+    assert backlog.prune() == 6
+    assert backlog.unused_count() == 0
+    assert os.listdir(backlog.images_dir) == []
+
+
+def test_prune_keeps_the_size_cap_dropping_used_images_first(tmp_path):
+    backlog = ContentBacklog(str(tmp_path / "backlog"), max_images=4)
+    _batch(backlog, "b1", prompts=2)
+    picks = backlog.take("Beach", 2, "run-1")
+    _batch(backlog, "b2", prompts=1)
+    assert backlog.unused_count() == 4
+    assert not any(os.path.exists(p["path"]) for p in picks)
+    assert len(os.listdir(backlog.images_dir)) == 4
@@ -0,0 +1,74 @@
+
+import pytest
+
+import face_scorer
+
+@pytest.mark.parametrize("threshold, score, skip", [
+    (None, 0.99, False),
+    (None, None, False),
+    (0.8, None, False),
+    (0.8, 0.79, False),
+    (0.8, 0.8, True),
+    (0.0, 0.0, True),
+    (1.01, 1.0, False),
+])
+def test_second_pass_is_only_skipped_above_a_configured_threshold(monkeypatch, threshold, score, skip):
+    monkeypatch.setattr(face_scorer, "FACE_MATCH_THRESHOLD", threshold)
+    assert face_scorer.skip_second_pass(score) is skip
+
+def test_best_without_candidates():
+    assert face_scorer.best([], "reference.jpg") == (None, None)
+
+# ── Scoring (needs numpy and Pillow) ─────────────────────────────────────
+def _face(tmp_path, name: str, tone=(224, 172, 140), background=(40, 60, 120), stripes: bool = True) -> str:
+    Image = pytest.importorskip("PIL.Image")
+    ImageDraw = pytest.importorskip("PIL.ImageDraw")
+    img = Image.new("RGB", (256, 256), background)
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((64, 40, 192, 216), fill=tone)
+    if stripes:
+        draw.rectangle((96, 100, 116, 110), fill=(30, 30, 30))
+        draw.rectangle((140, 100, 160, 110), fill=(30, 30, 30))
+        draw.rectangle((112, 170, 144, 178), fill=(120, 40, 40))
+    path = tmp_path / name
+    img.save(path, "JPEG", quality=95)
+    return str(path)
+
+@pytest.fixture
+def scoring():
+    pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+    face_scorer._reference_features.cache_clear()
+
+def test_reference_scores_highest_against_itself(tmp_path, scoring):
+    reference = _face(tmp_path, "reference.jpg")
+    with open(reference, "rb") as f:
+        assert face_scorer.score(f.read(), reference) >= 0.99
+
+def test_image_without_skin_scores_zero(tmp_path, scoring):
+    reference = _face(tmp_path, "reference.jpg")
+    with open(_face(tmp_path, "none.jpg", tone=(40, 60, 120), stripes=False), "rb") as f:
+        assert face_scorer.score(f.read(), reference) == 0.0
+
+def test_calibration_suggests_nothing_when_the_groups_overlap(tmp_path, scoring):
+    reference = _face(tmp_path, "reference.jpg")
+    same, other = tmp_path / "same", tmp_path / "other"
+    same.mkdir()
+    other.mkdir()
+    _face(same, "a.jpg")
+    _face(other, "b.jpg")
+    result = face_scorer.calibrate(reference, str(same), str(other))
+    assert len(result["same"]) == len(result["other"]) == 1
+    assert result["threshold"] is None
+
+def test_calibration_threshold_clears_every_other_person(tmp_path, scoring):
+    reference = _face(tmp_path, "reference.jpg")
+    same, other = tmp_path / "same", tmp_path / "other"
+    same.mkdir()
+    other.mkdir()
+    _face(same, "a.jpg")
+    _face(other, "b.jpg", tone=(150, 100, 80), stripes=False)
+    result = face_scorer.calibrate(reference, str(same), str(other))
+    assert result["threshold"] is not None
+    assert all(score < result["threshold"] for score, _ in result["other"])
+    assert result["skip_rate"] == 1.0
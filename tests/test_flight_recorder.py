@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import flight_recorder
+
+
+class _Tracing:
+    def __init__(self):
+        self.calls = []
+
+    def start(self, **kwargs):
+        self.calls.append("start")
+
+    def stop(self, path=None):
+        self.calls.append(("stop", os.path.basename(os.path.dirname(path)) if path else None))
+        if path:
+            open(path, "wb").close()
+
+
+class _Context:
+    def __init__(self):
+        self.tracing = _Tracing()
+
+    def new_cdp_session(self, page):
+        raise RuntimeError("no CDP here")
+
+
+class _Page:
+    url = "https://example.test/"
+
+    def __init__(self):
+        self.context = _Context()
+
+    def screenshot(self, **kwargs):
+        return b"jpeg"
+
+    def content(self):
+        return "<html></html>"
+
+    def evaluate(self, expression):
+        return ""
+
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(flight_recorder, "TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(flight_recorder, "PLAYWRIGHT_TRACE", True)
+    return tmp_path
+
+
+def test_every_failure_gets_its_own_dump_with_a_trace(trace_dir):
+    page = _Page()
+    recorder = flight_recorder.FlightRecorder(page, "instagram", debug=False)
+    first = recorder.fail("next")
+    second = recorder.fail("share")
+
+    assert first != second
+    assert sorted(os.listdir(trace_dir)) == sorted([os.path.basename(first), os.path.basename(second)])
+    for directory in (first, second):
+        assert os.path.isfile(os.path.join(directory, "trace.zip"))
+        assert os.path.isfile(os.path.join(directory, "trace.json"))
+    assert page.context.tracing.calls == ["start", ("stop", os.path.basename(first)), "start",
+                                          ("stop", os.path.basename(second)), "start"]
+
+    recorder.finish(success=False)
+    assert page.context.tracing.calls[-1] == ("stop", None)
+
+
+def test_nothing_is_written_without_a_failure(trace_dir):
+    recorder = flight_recorder.FlightRecorder(_Page(), "whisk", debug=False)
+    recorder.step("navigate")
+    recorder.finish()
+    assert os.listdir(trace_dir) == []
@@ -0,0 +1,99 @@
+import json
+import re
+
+import pytest
+from google.genai import errors
+
+import gemini_client
+import tracing
+from gemini_client import GeminiError, _retryable, _validate
+from prompt_generator import POST_SCHEMA, WEEK_SCHEMA
+
+POST = {"prompts": ["a", "b", "c"], "caption": "hello"}
+
+
+def _api_error(cls, code):
+    return cls(code, {"error": {"code": code, "message": "nope", "status": "ERROR"}})
+
+
+# ── Validation ───────────────────────────────────────────────────────────
+def test_a_complete_post_is_valid():
+    _validate(POST, POST_SCHEMA)
+    _validate({"days": [dict(POST, date="2026-03-02")]}, WEEK_SCHEMA)
+
+
+@pytest.mark.parametrize("data, message", [
+    ([], "$: expected object"),
+    ({"prompts": ["a", "b", "c"]}, "missing 'caption'"),
+    ({"prompts": ["a", "b"], "caption": "x"}, "$.prompts: expected at least 3 items, got 2"),
+    ({"prompts": "a b c", "caption": "x"}, "$.prompts: expected array"),
+    ({"prompts": ["a", " ", "c"], "caption": "x"}, "$.prompts[1]: expected non-empty string"),
+    ({"prompts": ["a", "b", "c"], "caption": 3}, "$.caption: expected non-empty string"),
+])
+def test_partial_or_malformed_posts_are_rejected(data, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        _validate(data, POST_SCHEMA)
+
+
+def test_errors_point_into_nested_days():
+    with pytest.raises(ValueError, match=r"\$\.days\[0\]: missing 'date'"):
+        _validate({"days": [POST]}, WEEK_SCHEMA)
+
+
+# ── Retries ──────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("error, retried", [
+    (ValueError("response is not JSON"), True),
+    (json.JSONDecodeError("Expecting value", "", 0), True),
+    (TimeoutError("deadline passed while streaming"), True),
+    (ConnectionError("reset"), True),
+    (_api_error(errors.ServerError, 503), True),
+    (_api_error(errors.ClientError, 429), True),
+    (_api_error(errors.ClientError, 408), True),
+    (_api_error(errors.ClientError, 400), False),
+    (_api_error(errors.ClientError, 401), False),
+    (_api_error(errors.ClientError, 403), False),
+    (_api_error(errors.ClientError, 404), False),
+])
+def test_which_errors_are_retried(error, retried):
+    assert _retryable(error) is retried
+
+
+@pytest.fixture
+def stream(tmp_path, monkeypatch):
+    """Replaces the Gemini stream with a scripted sequence of responses or errors."""
+    monkeypatch.setattr(gemini_client, "METRICS_FILE", str(tmp_path / "metrics.jsonl"))
+    monkeypatch.setattr(gemini_client, "BACKOFF_BASE", 0.0)
+    script = []
+
+    def fake_stream(model, prompt, config, stop_at):
+        outcome = script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, None
+
+    monkeypatch.setattr(gemini_client, "_stream", fake_stream)
+    return script
+
+
+def _generate(max_attempts=3):
+    return gemini_client._generate_json("prompt", POST_SCHEMA, "test", 10, max_attempts, "model", tracing.NULL_SPAN)
+
+
+def test_malformed_and_partial_responses_are_retried(stream):
+    stream.extend(['{"prompts": ["a", "b"', json.dumps({"prompts": ["a"], "caption": "x"}), json.dumps(POST)])
+    assert _generate() == POST
+    assert stream == []
+
+
+def test_retries_stop_after_the_last_attempt(stream):
+    stream.extend([_api_error(errors.ServerError, 503)] * 2)
+    with pytest.raises(GeminiError, match="503"):
+        _generate(max_attempts=2)
+    assert stream == []
+
+
+def test_rejected_requests_are_not_retried(stream):
+    stream.extend([_api_error(errors.ClientError, 403), json.dumps(POST)])
+    with pytest.raises(GeminiError, match="403"):
+        _generate()
+    assert len(stream) == 1
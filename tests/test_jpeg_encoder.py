@@ -0,0 +1,86 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+import jpeg_encoder
+from jpeg_encoder import encode_jpeg, optimize_for_upload, psnr
+
+
+@pytest.fixture(autouse=True)
+def quality_range(monkeypatch):
+    monkeypatch.setattr(jpeg_encoder, "JPEG_MIN_QUALITY", 70)
+    monkeypatch.setattr(jpeg_encoder, "JPEG_MAX_QUALITY", 95)
+
+
+@pytest.fixture(scope="module")
+def image():
+    """A small photo-like image: colour gradients with noise, so quality changes the size."""
+    rng = random.Random(7)
+    img = Image.new("RGB", (160, 120))
+    img.putdata([(x + rng.randrange(40), y * 2 + rng.randrange(40), (x + y) % 256) for y in range(120) for x in range(160)])
+    return img
+
+
+def _size(img, quality, subsampling):
+    return len(jpeg_encoder._encode(img, quality, subsampling))
+
+
+def _budget_kb(img):
+    """A budget between the sizes at minimum and maximum quality."""
+    low, high = _size(img, 70, 2), _size(img, 95, 0)
+    return (low + high) // 2 // 1024
+
+
+def test_budget_is_met_with_the_highest_quality_that_fits(image):
+    target_kb = _budget_kb(image)
+    data, stats = encode_jpeg(image, target_kb=target_kb)
+    budget = target_kb * 1024
+    assert len(data) <= budget and stats["within_budget"]
+    assert stats["bytes"] == len(data)
+    subsampling = {"4:4:4": 0, "4:2:0": 2}[stats["subsampling"]]
+    assert stats["quality"] == 95 or _size(image, stats["quality"] + 1, subsampling) > budget
+
+
+def test_the_subsampling_with_the_higher_quality_wins(image):
+    target_kb = _budget_kb(image)
+    fits = lambda q, d: len(d) <= target_kb * 1024
+    best = max(jpeg_encoder._search(image, s, fits)[0] for s in jpeg_encoder.SUBSAMPLING_MODES)
+    assert encode_jpeg(image, target_kb=target_kb)[1]["quality"] == best
+
+
+def test_at_equal_quality_the_smaller_file_wins(image):
+    data, stats = encode_jpeg(image, target_kb=10_000)
+    assert stats["quality"] == 95
+    assert len(data) == min(_size(image, 95, s) for s in jpeg_encoder.SUBSAMPLING_MODES)
+
+
+def test_an_impossible_budget_falls_back_to_minimum_quality(image):
+    data, stats = encode_jpeg(image, target_kb=0)
+    assert stats["quality"] == 70
+    assert not stats["within_budget"]
+
+
+def test_psnr_target_gives_the_smallest_file_that_meets_it(image):
+    target = psnr(image, jpeg_encoder._encode(image, 85, 0))
+    data, stats = encode_jpeg(image, target_psnr=target)
+    assert psnr(image, data) >= target
+    assert len(data) <= _size(image, 85, 0)
+
+
+def test_small_files_are_uploaded_as_they_are(tmp_path, image):
+    path = str(tmp_path / "small.jpg")
+    image.save(path, "JPEG", quality=70)
+    assert optimize_for_upload(path, target_kb=10_000) == path
+
+
+def test_large_files_get_a_reencoded_upload_copy(tmp_path, image):
+    path = str(tmp_path / "large.png")
+    image.resize((640, 480)).save(path)
+    upload = optimize_for_upload(path, target_kb=40)
+    assert upload == str(tmp_path / "large_upload.jpg")
+    with open(upload, "rb") as f:
+        data = f.read()
+    assert len(data) <= 40 * 1024
+    assert Image.open(io.BytesIO(data)).size == (640, 480)
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+import personas
+
+
+@pytest.fixture
+def slots(tmp_path, monkeypatch):
+    monkeypatch.setattr(personas, "SLOT_DIR", str(tmp_path))
+    monkeypatch.setattr(personas, "SLOT_POLL_SECONDS", 0.01)
+    monkeypatch.setitem(personas._SLOT_LIMITS, "whisk", 1)
+    return tmp_path
+
+
+def _locks(directory) -> list:
+    return sorted(name for name in os.listdir(directory) if name.endswith(".lock"))
+
+
+def test_slot_is_a_no_op_outside_a_fan_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(personas, "SLOT_DIR", None)
+    with personas.slot("whisk"):
+        assert not personas.slots_enabled()
+
+
+def test_slot_holds_a_lock_file_and_releases_it(slots):
+    with personas.slot("whisk"):
+        assert _locks(slots) == ["whisk-0.lock"]
+    assert _locks(slots) == []
+
+
+def test_nested_slot_shares_the_outer_one(slots):
+    with personas.slot("whisk"):
+        with personas.slot("whisk"):
+            assert _locks(slots) == ["whisk-0.lock"]
+        assert _locks(slots) == ["whisk-0.lock"]
+    assert _locks(slots) == []
+
+
+def test_cancelled_wait_never_takes_the_slot(slots):
+    (slots / "whisk-0.lock").write_text("{}")
+    cancelled = threading.Event()
+    threading.Timer(0.05, cancelled.set).start()
+    with pytest.raises(TimeoutError):
+        with personas.slot("whisk", cancelled=cancelled):
+            pytest.fail("slot taken after the wait was cancelled")
+    assert _locks(slots) == ["whisk-0.lock"]
+
+
+def test_waiter_gets_the_slot_once_it_is_freed(slots):
+    (slots / "whisk-0.lock").write_text("{}")
+    threading.Timer(0.05, os.remove, [slots / "whisk-0.lock"]).start()
+    with personas.slot("whisk", cancelled=threading.Event()):
+        assert _locks(slots) == ["whisk-0.lock"]
+
+
+def test_held_slot_is_kept_fresh(slots, monkeypatch):
+    monkeypatch.setattr(personas, "SLOT_HEARTBEAT_SECONDS", 0.02)
+    with personas.slot("whisk"):
+        lock = slots / "whisk-0.lock"
+        old = time.time() - 3600
+        os.utime(lock, (old, old))
+        time.sleep(0.1)
+        assert time.time() - lock.stat().st_mtime < personas.SLOT_STALE_SECONDS
+
+
+def test_stale_slot_is_taken_over(slots):
+    lock = slots / "whisk-0.lock"
+    lock.write_text("{}")
+    old = time.time() - personas.SLOT_STALE_SECONDS - 1
+    os.utime(lock, (old, old))
+    with personas.slot("whisk", cancelled=threading.Event()):
+        assert _locks(slots) == ["whisk-0.lock"]
+
+
+@pytest.mark.parametrize("code, status", [(0, "ok"), (personas.EXIT_SKIPPED, "skipped"), (1, "failed"), (2, "failed")])
+def test_exit_codes_map_to_statuses(tmp_path, monkeypatch, code, status):
+    monkeypatch.setattr(personas.subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, code))
+    persona = personas.Persona("ana", str(tmp_path), "ref.jpg", "whisk", "ig", "", {})
+    assert personas._run_persona(persona, "post", str(tmp_path))["status"] == status
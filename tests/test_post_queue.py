@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from post_queue import PostQueue
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return PostQueue(str(tmp_path / "queue"), max_depth=3, max_age_hours=72)
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "image.jpg"
+    path.write_bytes(b"\xff\xd8\xff jpeg")
+    return str(path)
+
+
+def _backdate(queue, bundle_id, hours):
+    """Makes a queued bundle look `hours` old."""
+    meta_path = os.path.join(queue.directory, bundle_id, "bundle.json")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["created_at"] = (datetime.now() - timedelta(hours=hours)).isoformat(timespec="seconds")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def test_enqueue_copies_the_bundle(queue, image):
+    bundle_id = queue.enqueue([image, image], "Hello", TODAY, "Beach")
+    assert queue.depth() == 1
+    assert queue.dates() == {TODAY.isoformat()}
+    assert sorted(os.listdir(os.path.join(queue.directory, bundle_id))) == ["bundle.json", "image_1.jpg", "image_2.jpg"]
+
+
+def test_dequeue_prefers_the_bundle_for_the_day(queue, image):
+    queue.enqueue([image], "tomorrow", TODAY + timedelta(days=1), "Beach")
+    queue.enqueue([image], "today", TODAY, "City")
+    bundle = queue.dequeue(TODAY, "Beach")
+    assert bundle.caption == "today"
+    assert all(os.path.exists(p) for p in bundle.image_paths)
+    # A claimed bundle is no longer in the queue, so it can't be published twice
+    assert queue.depth() == 1
+    assert queue.dequeue(TODAY) is None
+
+
+def test_dequeue_falls_back_to_the_same_theme(queue, image):
+    queue.enqueue([image], "later", TODAY + timedelta(days=2), "Beach")
+    assert queue.dequeue(TODAY, "City") is None
+    assert queue.dequeue(TODAY, "Beach").caption == "later"
+
+
+def test_ack_deletes_and_nack_requeues(queue, image):
+    queue.enqueue([image], "today", TODAY, "Beach")
+    bundle = queue.dequeue(TODAY)
+    queue.nack(bundle)
+    assert queue.depth() == 1
+
+    bundle = queue.dequeue(TODAY)
+    queue.ack(bundle)
+    assert queue.depth() == 0
+    assert not os.path.exists(bundle.directory)
+
+
+def test_expired_bundles_are_purged_and_never_dequeued(queue, image):
+    old_id = queue.enqueue([image], "old", TODAY, "Beach")
+    _backdate(queue, old_id, 73)
+    assert queue.dequeue(TODAY, "Beach") is None
+    assert queue.depth() == 0
+
+
+def test_bundles_for_past_days_are_purged(queue, image):
+    queue.enqueue([image], "yesterday", TODAY - timedelta(days=1), "Beach")
+    queue.enqueue([image], "today", TODAY, "Beach")
+    assert queue.purge_expired() == 1
+    assert queue.dates() == {TODAY.isoformat()}
+
+
+def test_stale_claims_are_cleaned_up_but_fresh_ones_kept(queue, image):
+    queue.enqueue([image], "today", TODAY, "Beach")
+    bundle = queue.dequeue(TODAY)
+    queue.purge_expired()
+    assert os.path.isdir(bundle.directory)
+
+    old = time.time() - 73 * 3600
+    os.utime(bundle.directory, (old, old))
+    queue.purge_expired()
+    assert not os.path.exists(bundle.directory)
+
+
+def test_upcoming_dates_fill_the_free_depth(queue, image):
+    assert queue.upcoming_dates(TODAY) == [TODAY + timedelta(days=i) for i in range(3)]
+    queue.enqueue([image], "tomorrow", TODAY + timedelta(days=1), "Beach")
+    assert queue.upcoming_dates(TODAY) == [TODAY, TODAY + timedelta(days=2)]
+    queue.enqueue([image], "today", TODAY, "Beach")
+    queue.enqueue([image], "later", TODAY + timedelta(days=2), "Beach")
+    assert queue.is_full()
+    assert queue.upcoming_dates(TODAY) == []
@@ -0,0 +1,72 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from prompt_cache import PromptCache
+
+TODAY = date.today()
+TOMORROW = TODAY + timedelta(days=1)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PromptCache(str(tmp_path / "prompt_cache.json"), ttl_days=7, max_entries=60)
+
+
+def test_get_returns_what_was_put(cache):
+    cache.put(TODAY, "Beach", ["a", "b", "c"], "caption")
+    assert cache.get(TODAY, "Beach") == (["a", "b", "c"], "caption")
+    assert cache.get(TODAY, "Beach") is not None
+
+
+def test_entries_are_keyed_by_theme(cache):
+    cache.put(TODAY, "Beach", ["a"], "caption")
+    assert cache.get(TODAY, "City") is None
+
+
+def test_take_consumes_the_entry(cache):
+    cache.put_many([(TODAY, "Beach", ["a"], "one"), (TOMORROW, "City", ["b"], "two")])
+    assert cache.take(TODAY, "Beach") == (["a"], "one")
+    assert cache.take(TODAY, "Beach") is None
+    assert cache.get(TODAY, "Beach") is None
+    assert cache.get(TOMORROW, "City") == (["b"], "two")
+
+
+def test_expired_entries_are_not_served(cache, tmp_path):
+    cache.put(TODAY, "Beach", ["a"], "caption")
+    entries = json.loads((tmp_path / "prompt_cache.json").read_text(encoding="utf-8"))
+    old = (datetime.now() - timedelta(days=8)).isoformat(timespec="seconds")
+    for entry in entries.values():
+        entry["created_at"] = old
+    (tmp_path / "prompt_cache.json").write_text(json.dumps(entries), encoding="utf-8")
+    assert cache.get(TODAY, "Beach") is None
+    assert cache.take(TODAY, "Beach") is None
+
+
+def test_past_days_are_evicted_on_write(cache):
+    cache.put(TODAY - timedelta(days=1), "Beach", ["a"], "old")
+    cache.put(TODAY, "Beach", ["b"], "new")
+    assert cache.get(TODAY - timedelta(days=1), "Beach") is None
+    assert cache.get(TODAY, "Beach") == (["b"], "new")
+
+
+def test_oldest_entries_beyond_the_cap_are_evicted(tmp_path):
+    cache = PromptCache(str(tmp_path / "prompt_cache.json"), max_entries=2)
+    for i in range(3):
+        cache.put(TODAY + timedelta(days=i), "Beach", [str(i)], str(i))
+    kept = [cache.get(TODAY + timedelta(days=i), "Beach") for i in range(3)]
+    assert kept.count(None) == 1
+
+
+def test_invalidate_drops_every_theme_of_the_day(cache):
+    cache.put_many([(TODAY, "Beach", ["a"], "x"), (TODAY, "City", ["b"], "y"), (TOMORROW, "Beach", ["c"], "z")])
+    assert cache.invalidate(TODAY) == 2
+    assert cache.get(TOMORROW, "Beach") is not None
+
+
+def test_unreadable_file_is_treated_as_empty(cache, tmp_path):
+    (tmp_path / "prompt_cache.json").write_text("{not json", encoding="utf-8")
+    assert cache.get(TODAY, "Beach") is None
+    cache.put(TODAY, "Beach", ["a"], "caption")
+    assert cache.get(TODAY, "Beach") == (["a"], "caption")
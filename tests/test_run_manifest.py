@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+import main
+from run_manifest import ARTIFACTS_DIR, RunManifest
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _image(workdir, name, data=b"\xff\xd8\xff image"):
+    path = workdir / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_a_new_run_starts_at_the_prompts():
+    manifest = RunManifest.create()
+    assert os.path.exists(manifest.path)
+    assert manifest.first_incomplete_stage() == "prompts"
+
+
+def test_checkpoints_survive_a_reload(workdir):
+    manifest = RunManifest("r1")
+    manifest.record_prompts(["a", "b", "c"], "caption")
+    manifest.record_image(1, _image(workdir, "b.jpg"))
+
+    resumed = RunManifest.load("r1")
+    assert resumed.prompts() == (["a", "b", "c"], "caption")
+    assert resumed.missing_images() == [0, 2]
+    assert resumed.first_incomplete_stage() == "images"
+
+
+def test_images_are_stored_once_by_content(workdir):
+    first, second = RunManifest("r1"), RunManifest("r2")
+    for manifest in (first, second):
+        manifest.record_prompts(["a"], "caption")
+    first.record_image(0, _image(workdir, "one.jpg"))
+    second.record_image(0, _image(workdir, "two.jpg"))
+    assert len(os.listdir(ARTIFACTS_DIR)) == 1
+    assert first.image_paths() == second.image_paths()
+
+
+def test_image_paths_are_in_prompt_order(workdir):
+    manifest = RunManifest("r1")
+    manifest.record_prompts([str(i) for i in range(11)], "caption")
+    for idx in (10, 2, 0):
+        manifest.record_image(idx, _image(workdir, f"{idx}.jpg", bytes([idx])))
+    paths = manifest.image_paths()
+    assert [open(p, "rb").read() for p in paths] == [bytes([0]), bytes([2]), bytes([10])]
+
+
+def test_a_vanished_artifact_is_generated_again(workdir):
+    manifest = RunManifest("r1")
+    manifest.record_prompts(["a"], "caption")
+    manifest.record_image(0, _image(workdir, "a.jpg"))
+    os.remove(manifest.image_paths()[0])
+    assert manifest.missing_images() == [0]
+    assert manifest.image_paths() == []
+
+
+def test_post_stage_and_attempts(workdir):
+    manifest = RunManifest("r1")
+    manifest.record_prompts(["a"], "caption")
+    manifest.record_image(0, _image(workdir, "a.jpg"))
+    assert manifest.first_incomplete_stage() == "post"
+    manifest.record_post(False, "share failed")
+    assert manifest.first_incomplete_stage() == "post"
+    manifest.record_post(True)
+    assert manifest.post_attempts() == 2
+    assert RunManifest.load("r1").first_incomplete_stage() is None
+
+
+def test_latest_picks_the_newest_unposted_run(workdir):
+    for run_id, posted in (("20260301-090000", False), ("20260302-090000", False), ("20260303-090000", True)):
+        manifest = RunManifest(run_id)
+        manifest.record_post(posted)
+    assert RunManifest.load("latest").run_id == "20260302-090000"
+
+
+def test_latest_without_incomplete_runs_raises():
+    RunManifest("20260301-090000").record_post(True)
+    with pytest.raises(FileNotFoundError):
+        RunManifest.load("latest")
+
+
+# ── --resume ──────────────────────────────────────────────────────────────
+@pytest.fixture
+def no_pipeline(monkeypatch):
+    def run_pipeline(*args, **kwargs):
+        pytest.fail("the pipeline ran")
+    monkeypatch.setattr(main, "run_pipeline", run_pipeline)
+
+
+def test_resuming_a_posted_run_does_not_post_again(no_pipeline):
+    RunManifest("r1").record_post(True)
+    assert main.daily_job(resume="r1") is True
+
+
+def test_resuming_an_unknown_run_fails_cleanly(no_pipeline):
+    assert main.daily_job(resume="nope") is False
@@ -0,0 +1,85 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import run_metrics
+from run_metrics import MetricsStore, percentile
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_metrics, "ADAPTIVE_TIMEOUTS", True)
+    monkeypatch.setattr(run_metrics, "MIN_SAMPLES", 20)
+    return MetricsStore(str(tmp_path / "metrics.db"))
+
+
+def _fill(store, seconds: float, ok: int = 100, timed_out: int = 0, step: str = "step"):
+    rows = [(step, seconds, True, None)] * ok + [(step, 10.0, False, 10.0)] * timed_out
+    store.record_many(rows, kind="wait")
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(100, 0, -1))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7], 99) == 7
+
+
+def test_too_few_samples_keep_the_default(store):
+    _fill(store, 1.0, ok=19)
+    assert store.deadline("step", 10) == 10
+
+
+def test_deadline_is_p99_times_the_margin(store):
+    _fill(store, 4.0)
+    assert store.deadline("step", 10, margin=1.5) == 6.0
+
+
+@pytest.mark.parametrize("seconds, expected", [(0.1, 5.0), (100.0, 30.0)])
+def test_deadline_is_clamped_to_floor_and_cap(store, seconds, expected):
+    _fill(store, seconds)
+    assert store.deadline("step", 10) == expected
+
+
+def test_many_timeouts_never_shrink_the_deadline(store):
+    # 3% timed out: the fast successes are censored by the old deadline
+    _fill(store, 2.0, ok=97, timed_out=3)
+    assert store.deadline("step", 10) == 10
+
+
+def test_few_timeouts_still_adapt(store):
+    _fill(store, 2.0, ok=99, timed_out=1)
+    assert store.deadline("step", 10, margin=1.5) == 5.0
+
+
+def test_old_samples_are_ignored(store):
+    _fill(store, 2.0)
+    with closing(sqlite3.connect(store.db_path)) as conn, conn:
+        conn.execute("UPDATE durations SET recorded_at = '2000-01-01T00:00:00'")
+    assert store.deadline("step", 10) == 10
+
+
+def test_deadlines_are_cached_for_the_ttl(store, monkeypatch):
+    _fill(store, 4.0)
+    assert store.deadline("step", 10) == 6.0
+    _fill(store, 100.0, ok=1000)
+    assert store.deadline("step", 10) == 6.0
+    monkeypatch.setattr(run_metrics, "DEADLINE_TTL", 0)
+    assert store.deadline("step", 10) == 30.0
+
+
+def test_adaptive_timeouts_can_be_turned_off(store, monkeypatch):
+    _fill(store, 4.0)
+    monkeypatch.setattr(run_metrics, "ADAPTIVE_TIMEOUTS", False)
+    assert store.deadline("step", 10) == 10
+
+
+def test_summary_reports_success_rate_and_percentiles(store):
+    _fill(store, 2.0, ok=3, timed_out=1)
+    [row] = store.summary()
+    assert row["step"] == "step" and row["count"] == 4
+    assert row["success_rate"] == 0.75
+    assert row["p50"] == row["p99"] == 2.0
+    assert row["deadline"] == 10.0
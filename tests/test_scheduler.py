@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import scheduler
+from scheduler import Scheduler, Slot, load_slots, run_locked
+
+DAY = date(2026, 3, 2)
+
+
+def _at(day_offset: int, hhmm: str) -> datetime:
+    hour, minute = map(int, hhmm.split(":"))
+    return datetime.combine(DAY + timedelta(days=day_offset), datetime.min.time()).replace(hour=hour, minute=minute)
+
+
+def _scheduler(tmp_path, slots, catch_up="latest", hours=6) -> Scheduler:
+    jobs = {slot.job: lambda: None for slot in slots}
+    return Scheduler(slots, jobs, catch_up=catch_up, max_lateness=timedelta(hours=hours), state_path=str(tmp_path / "state.json"))
+
+
+# ── Slots ────────────────────────────────────────────────────────────────
+def test_occurrence_without_jitter_is_exact():
+    assert Slot("09:30").occurrence(DAY) == _at(0, "09:30")
+
+
+def test_jitter_is_bounded_and_fixed_per_day():
+    slot = Slot("12:00", "publish", jitter_minutes=10)
+    first = slot.occurrence(DAY)
+    assert abs(first - _at(0, "12:00")) <= timedelta(minutes=10)
+    assert slot.occurrence(DAY) == first
+
+
+def test_load_slots(tmp_path):
+    path = tmp_path / "schedule.json"
+    path.write_text(json.dumps({"Monday": "Beach", "slots": [{"time": "04:00", "job": "prepare"}, {"time": "11:30", "jitter_minutes": 5}]}))
+    assert load_slots(str(path)) == [Slot("04:00", "prepare", 0.0), Slot("11:30", "post", 5.0)]
+    assert load_slots(str(tmp_path / "missing.json")) == []
+
+
+def test_unknown_jobs_and_policies_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Scheduler([Slot("09:00", "nope")], {"post": lambda: None})
+    with pytest.raises(ValueError):
+        Scheduler([Slot("09:00")], {"post": lambda: None}, catch_up="sometimes")
+
+
+# ── Catch-up ─────────────────────────────────────────────────────────────
+def test_occurrences_between_two_times():
+    found = Scheduler._occurrences(Slot("09:00"), _at(0, "08:00"), _at(2, "08:59"))
+    assert found == [_at(0, "09:00"), _at(1, "09:00")]
+    assert Scheduler._occurrences(Slot("09:00"), _at(0, "09:00"), _at(0, "10:00")) == []
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("all", [_at(1, "06:00"), _at(1, "10:00")]),
+    ("latest", [_at(1, "10:00")]),
+    ("none", []),
+])
+def test_catch_up_policies(tmp_path, policy, expected):
+    sched = _scheduler(tmp_path, [Slot("09:00")], catch_up=policy)
+    missed = [_at(0, "10:00"), _at(1, "06:00"), _at(1, "10:00")]
+    assert sched._to_run(missed, now=_at(1, "11:00")) == expected
+
+
+def test_on_time_slot_runs_under_every_policy(tmp_path):
+    for policy in ("all", "latest", "none"):
+        sched = _scheduler(tmp_path, [Slot("09:00")], catch_up=policy)
+        assert sched._to_run([_at(0, "09:00")], now=_at(0, "09:01")) == [_at(0, "09:00")]
+
+
+def test_nothing_runs_beyond_the_maximum_lateness(tmp_path):
+    sched = _scheduler(tmp_path, [Slot("09:00")], catch_up="all", hours=1)
+    assert sched._to_run([_at(0, "09:00")], now=_at(0, "12:00")) == []
+
+
+def test_next_due_is_the_earliest_upcoming_slot(tmp_path):
+    slots = [Slot("04:00", "prepare"), Slot("11:30", "publish")]
+    sched = _scheduler(tmp_path, slots)
+    state = {slot.key: _at(0, "05:00") for slot in slots}
+    assert sched.next_due(state, _at(0, "05:00")) == _at(0, "11:30")
+    state["publish@11:30"] = _at(0, "11:30")
+    assert sched.next_due(state, _at(0, "11:31")) == _at(1, "04:00")
+
+
+# ── Job lock ─────────────────────────────────────────────────────────────
+@pytest.fixture
+def lock_file(tmp_path, monkeypatch):
+    path = tmp_path / "job.lock"
+    monkeypatch.setattr(scheduler, "LOCK_FILE", str(path))
+    return path
+
+
+def test_run_locked_returns_the_result_and_releases_the_lock(lock_file):
+    assert run_locked("post", lambda x: x * 2, 21) == 42
+    assert not lock_file.exists()
+
+
+def test_run_locked_releases_the_lock_when_the_job_raises(lock_file):
+    def fail():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        run_locked("post", fail)
+    assert not lock_file.exists()
+
+
+def test_run_locked_skips_while_another_job_holds_the_lock(lock_file):
+    ran = []
+    assert run_locked("outer", lambda: run_locked("inner", lambda: ran.append(1))) is None
+    assert ran == []
+
+
+def test_stale_lock_is_taken_over(lock_file):
+    lock_file.write_text(json.dumps({"job": "crashed", "pid": 1}))
+    old = time.time() - (scheduler.LOCK_STALE_HOURS + 1) * 3600
+    os.utime(lock_file, (old, old))
+    assert run_locked("post", lambda: "ran") == "ran"
+
+
+def test_posting_jobs_wait_for_the_lock(lock_file, monkeypatch):
+    monkeypatch.setattr(scheduler, "LOCK_POLL_SECONDS", 0.05)
+    lock_file.write_text(json.dumps({"job": "prepare", "pid": 1}))
+    threading.Timer(0.2, lock_file.unlink).start()
+    assert run_locked("publish", lambda: "posted") == "posted"
+    assert not lock_file.exists()
+
+
+def test_posting_jobs_give_up_after_the_wait(lock_file, monkeypatch):
+    monkeypatch.setattr(scheduler, "LOCK_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(scheduler, "LOCK_WAIT_MINUTES", 0.2 / 60)
+    lock_file.write_text(json.dumps({"job": "prepare", "pid": 1}))
+    assert run_locked("publish", lambda: "posted") is None
+    assert lock_file.exists()
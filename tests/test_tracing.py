@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_spans_nest_and_are_written(workdir):
+    with tracing.run("job", run_id="r1"):
+        with tracing.span("outer") as outer:
+            outer.step("first")
+            outer.step("second")
+    header, spans = tracing.load(tracing.find_trace("r1"))
+    by_name = {s["name"]: s for s in spans}
+    assert header["run_id"] == "r1"
+    assert by_name["first"]["parent"] == by_name["outer"]["id"] == by_name["second"]["parent"]
+    assert by_name["outer"]["parent"] == by_name["job"]["id"]
+    assert tracing.span("after the run") is tracing.NULL_SPAN
+
+
+def test_close_tolerates_spans_opened_and_ended_on_other_threads(workdir):
+    stop = threading.Event()
+
+    def churn():
+        while not stop.is_set():
+            tracing.span("churn").end()
+
+    with tracing.run("job", run_id="r2"):
+        threads = [threading.Thread(target=churn) for _ in range(4)]
+        for t in threads:
+            t.start()
+        hung = tracing.span("hung stage")
+    stop.set()
+    for t in threads:
+        t.join()
+    _, spans = tracing.load(tracing.find_trace("r2"))
+    assert [s["status"] for s in spans if s["name"] == "hung stage"] == ["abandoned"]
+    assert hung.ended
@@ -0,0 +1,130 @@
+from concurrent.futures import Future
+
+import pytest
+
+from whisk_results import GenerationResult, PromptQueue, salvage
+
+
+def _done(path=None, error=None) -> Future:
+    future = Future()
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result({"path": path})
+    return future
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "reference.jpg").write_bytes(b"reference")
+    return tmp_path
+
+
+def _image(workdir, name: str, data: bytes) -> str:
+    path = workdir / name
+    path.write_bytes(data)
+    return str(path)
+
+
+# ── PromptQueue ──────────────────────────────────────────────────────────
+def test_queue_hands_out_prompts_in_order():
+    queue = PromptQueue(["a", "b"])
+    assert [queue.take(), queue.take(), queue.take()] == [(0, "a"), (1, "b"), None]
+
+
+def test_queue_resolves_a_callable_source_once():
+    calls = []
+    queue = PromptQueue(lambda: calls.append(1) or ["a", "b"])
+    assert calls == []
+    queue.take()
+    queue.take()
+    assert calls == [1]
+    assert queue.count() == 2
+
+
+def test_queue_count_is_zero_when_the_source_fails():
+    def fail():
+        raise RuntimeError("no prompts")
+    assert PromptQueue(fail).count() == 0
+
+
+def test_retry_requeues_at_the_end_until_the_prompt_runs_out():
+    queue = PromptQueue(["a", "b"], retries=1, budget=5)
+    assert queue.take() == (0, "a")
+    assert queue.retry(0, "a")
+    assert queue.attempt(0) == 2
+    assert [queue.take(), queue.take()] == [(1, "b"), (0, "a")]
+    assert not queue.retry(0, "a")
+    assert queue.take() is None
+    assert queue.retries_used == 1
+
+
+def test_retry_budget_is_shared_by_all_prompts():
+    queue = PromptQueue(["a", "b", "c"], retries=3, budget=2)
+    for idx, prompt in [queue.take(), queue.take(), queue.take()]:
+        queue.retry(idx, prompt)
+    assert queue.retries_used == 2
+    assert [queue.take(), queue.take(), queue.take()] == [(0, "a"), (1, "b"), None]
+
+
+def test_no_retries_when_disabled():
+    queue = PromptQueue(["a"], retries=0)
+    queue.take()
+    assert not queue.retry(0, "a")
+    assert queue.take() is None
+
+
+# ── GenerationResult / salvage ───────────────────────────────────────────
+def test_generation_result_is_a_list_with_slot_flags():
+    result = GenerationResult(["1.jpg", "2.jpg", "3.jpg"], fallback=[2, 0])
+    assert result == ["1.jpg", "2.jpg", "3.jpg"]
+    assert result.fallback == [0, 2]
+    assert result.real == ["2.jpg"]
+    assert result.is_real(1) and not result.is_real(0)
+
+
+def test_salvage_keeps_real_images_and_fills_only_the_missing_slots(workdir):
+    real = _image(workdir, "real_2.jpg", b"real two")
+    saved = []
+    result = salvage({1: _done(real), 2: _done(error=OSError("disk full"))}, 3, "reference.jpg", str(workdir / "out"),
+                     on_image_saved=lambda idx, path: saved.append((idx, path)))
+
+    assert result == [str(workdir / "out_1.jpg"), real, str(workdir / "out_3.jpg")]
+    assert result.fallback == [0, 2]
+    assert result.real == [real]
+    assert (workdir / "out_1.jpg").read_bytes() == b"reference"
+    assert saved == [(1, real)]
+
+
+def test_salvage_with_no_prompts_is_empty(workdir):
+    result = salvage({}, 0, "reference.jpg", str(workdir / "out"))
+    assert result == [] and result.fallback == []
+
+
+# ── What the pipeline posts (manifest checkpoints fed by salvage) ─────────
+def test_partial_run_posts_only_the_real_images_in_prompt_order(workdir):
+    from run_manifest import RunManifest
+
+    manifest = RunManifest("partial")
+    manifest.record_prompts(["a", "b", "c"], "caption")
+    results = {0: _done(_image(workdir, "g1.jpg", b"one")), 2: _done(_image(workdir, "g3.jpg", b"three"))}
+    result = salvage(results, 3, "reference.jpg", str(workdir / "out"), on_image_saved=manifest.record_image)
+
+    assert result.fallback == [1]
+    posted = manifest.image_paths()
+    assert [open(p, "rb").read() for p in posted] == [b"one", b"three"]
+    assert manifest.missing_images() == [1]
+    assert manifest.first_incomplete_stage() == "images"
+
+
+def test_all_fallback_run_posts_nothing(workdir):
+    from run_manifest import RunManifest
+
+    manifest = RunManifest("fallback")
+    manifest.record_prompts(["a", "b"], "caption")
+    result = salvage({}, 2, "reference.jpg", str(workdir / "out"), on_image_saved=manifest.record_image)
+
+    assert result.fallback == [0, 1] and result.real == []
+    assert manifest.image_paths() == []
+    assert manifest.missing_images() == [0, 1]
@@ -0,0 +1,42 @@
+import re
+
+# What the field currently holds: value for inputs/textareas, rendered text for contenteditable
+_READ_JS = "el => (el.value !== undefined ? el.value : el.innerText) || ''"
+_IS_FORM_FIELD_JS = "el => el.tagName === 'TEXTAREA' || el.tagName === 'INPUT'"
+
+
+def _normalize(text: str) -> str:
+    # Editors may turn newlines into paragraphs; only the words must match
+    return re.sub(r"\s+", " ", text).strip()  # \s includes the nbsp editors insert
+
+
+def enter_text(page, locator, text: str, attempts: int = 3, label: str = "text") -> bool:
+    """
+    Replaces the content of a textarea/input or contenteditable field with `text`
+    in bulk: fill() for form fields, keyboard.insert_text() (one input event per
+    line) for contenteditable editors. The field is read back afterwards and the
+    entry retried only if it does not match. Returns True once it matches.
+    """
+    locator.click(force=True)
+    form_field = locator.evaluate(_IS_FORM_FIELD_JS)
+    actual = ""
+    for attempt in range(1, attempts + 1):
+        if form_field:
+            locator.fill(text)
+        else:
+            page.keyboard.press("ControlOrMeta+A")
+            page.keyboard.press("Backspace")
+            for i, line in enumerate(text.split("\n")):
+                if i:
+                    page.keyboard.press("Enter")
+                if line:
+                    page.keyboard.insert_text(line)
+        actual = locator.evaluate(_READ_JS)
+        if _normalize(actual) == _normalize(text):
+            if attempt > 1:
+                print(f"{label} matched on attempt {attempt}.")
+            return True
+        print(f"[WARNING] {label} mismatch after attempt {attempt}/{attempts}: got {len(actual)} chars, expected {len(text)}.")
+        locator.click(force=True)
+    print(f"[ERROR] Could not enter {label}; field holds: {actual[:80]!r}")
+    return False
@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# One JSONL file of spans per run (daily job, prepare or publish)
+RUN_TRACE_DIR = os.getenv("RUN_TRACE_DIR", "run_traces")
+RUN_TRACING = os.getenv("RUN_TRACING", "1") != "0"
+
+_ids = itertools.count(1)
+_local = threading.local()
+_lock = threading.Lock()
+_run = None
+
+
+class Span:
+    """
+    One timed piece of a run. Use as a context manager (the span becomes the
+    parent of spans opened on the same thread inside it), or keep it and call
+    end() yourself, e.g. across yields or when it finishes on another thread.
+    """
+
+    def __init__(self, tracer, name: str, parent, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.id = next(_ids)
+        self.parent = parent
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+        self.started = time.monotonic()
+        self.ended = False
+        self._step = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def step(self, name: str, **attrs):
+        """Starts child span `name`, ending the one the previous step() started."""
+        if self._step:
+            self._step.end()
+        self._step = span(name, parent=self, **attrs)
+        return self._step
+
+    def end(self, status: str = "ok", error=None, **attrs):
+        if self.ended:
+            return
+        self.ended = True
+        self.attrs.update(attrs)
+        if self._step:
+            self._step.end(status, error)
+        self.tracer._write(self, time.monotonic(), status, error)
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stack = _stack()
+        if self in stack:
+            stack.remove(self)
+        if exc is not None:
+            self.end("error", exc)
+        else:
+            self.end()
+        return False
+
+
+class _NullSpan:
+    """Returned while no run is being traced, so instrumented code needs no checks."""
+    id = None
+    ended = True
+
+    def set(self, **attrs):
+        return self
+
+    def step(self, name: str, **attrs):
+        return self
+
+    def end(self, status: str = "ok", error=None, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Tracer:
+    """Writes the spans of one run to RUN_TRACE_DIR/<time>_<name>.jsonl as they end."""
+
+    def __init__(self, name: str, run_id: str, attrs: dict):
+        os.makedirs(RUN_TRACE_DIR, exist_ok=True)
+        self.path = os.path.join(RUN_TRACE_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{name}.jsonl")
+        self.origin = time.monotonic()
+        self.run_id = run_id
+        self.open = {}
+        self.finished = []
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._emit({"type": "run", "name": name, "run_id": run_id, "started_at": datetime.now().isoformat(timespec="seconds"),
+                    "pid": os.getpid(), "attrs": attrs})
+        self.root = Span(self, name, None, dict(attrs, run_id=run_id))
+        self.open[self.root.id] = self.root
+
+    def start(self, name: str, parent, attrs: dict) -> Span:
+        s = Span(self, name, parent if isinstance(parent, Span) else self._current(), attrs)
+        with _lock:
+            self.open[s.id] = s
+        return s
+
+    def _current(self):
+        stack = _stack()
+        return stack[-1] if stack else self.root
+
+    def _write(self, s: Span, ended: float, status: str, error):
+        with _lock:
+            self.open.pop(s.id, None)
+            # Keyed with the parent's name: "navigate" alone could be Whisk's or Instagram's
+            self.finished.append((f"{s.parent.name}/{s.name}" if s.parent else s.name, ended - s.started, status == "ok", None))
+        self._emit({
+            "type": "span",
+            "id": s.id,
+            "parent": s.parent.id if s.parent else None,
+            "name": s.name,
+            "start": round(s.started - self.origin, 4),
+            "duration": round(ended - s.started, 4),
+            "thread": s.thread,
+            "status": status,
+            "error": str(error) if error else None,
+            "attrs": s.attrs,
+        })
+
+    def _emit(self, record: dict):
+        line = json.dumps(record, default=str, ensure_ascii=False)
+        with _lock:
+            if self._file:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def close(self, status: str, error=None):
+        # Spans still open (a hung stage thread, an abandoned tab) are written as such.
+        # Snapshot under the lock: stage threads may still be opening and ending spans.
+        with _lock:
+            still_open = sorted(self.open.values(), key=lambda s: -s.id)
+        for s in still_open:
+            if s is not self.root:
+                s.end("abandoned")
+        self.root.end(status, error)
+        with _lock:
+            self._file.close()
+            self._file = None
+            finished = list(self.finished)
+        # Span durations also go to the run-metrics store for percentile reports
+        import run_metrics
+        run_metrics.store.record_many(finished, "span", self.run_id)
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def span(name: str, parent=None, **attrs):
+    """
+    Starts a span named `name`. Its parent is `parent` if given, otherwise the
+    innermost `with` span on this thread, otherwise the run itself.
+    Returns NULL_SPAN when no run is active.
+    """
+    tracer = _run
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.start(name, parent, attrs)
+
+
+def run_id():
+    """Run id of the active run, if any."""
+    tracer = _run
+    return tracer.run_id if tracer else None
+
+
+def traced(name: str):
+    """Decorator: runs the function inside span `name`."""
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def run(name: str, run_id: str = None, **attrs):
+    """
+    Traces everything inside the block as one run. Nested inside an active run
+    (e.g. publish falling back to the daily job) it is just another span.
+    """
+    global _run
+    if _run is not None or not RUN_TRACING:
+        with span(name, run_id=run_id, **attrs) as s:
+            yield s
+        return
+
+    tracer = _Tracer(name, run_id, attrs)
+    _run = tracer
+    _stack().append(tracer.root)
+    try:
+        yield tracer.root
+    except BaseException as e:
+        tracer.close("error", e)
+        raise
+    else:
+        tracer.close("ok")
+    finally:
+        _stack().clear()
+        _run = None
+        print(f"Run trace written to {tracer.path}")
+
+
+# ── Flame-style report ─────────────────────────────────────────────────────
+def load(path: str) -> tuple:
+    """Returns (run header, spans) of a trace file."""
+    header, spans = {}, []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["type"] == "run":
+                header = record
+            else:
+                spans.append(record)
+    return header, spans
+
+
+def report(path: str, min_ms: float = 0, width: int = 40):
+    """
+    Prints the run as an indented span tree with a timeline bar per span
+    (where it sits in the run and how long it took), its self time, and a
+    table of where the time went by span name.
+    """
+    header, spans = load(path)
+    if not spans:
+        print(f"No spans in {path}.")
+        return
+    children = {}
+    for s in spans:
+        children.setdefault(s["parent"], []).append(s)
+    total = max(s["start"] + s["duration"] for s in spans) or 1.0
+
+    print(f"Run {header.get('name')} {header.get('run_id') or ''} started {header.get('started_at')}, {total:.1f}s\n")
+    print(f"{'span':<44} {'total':>8} {'self':>8}  timeline")
+
+    def show(s, depth):
+        if s["duration"] * 1000 < min_ms:
+            return
+        kids = sorted(children.get(s["id"], []), key=lambda c: c["start"])
+        self_time = max(0.0, s["duration"] - sum(c["duration"] for c in kids))
+        offset = int(s["start"] / total * width)
+        bar = " " * offset + "█" * max(1, round(s["duration"] / total * width))
+        label = ("  " * depth + s["name"] + ("" if s["status"] == "ok" else f" [{s['status']}]"))[:44]
+        print(f"{label:<44} {s['duration']:>7.1f}s {self_time:>7.1f}s  |{bar[:width]:<{width}}|")
+        for kid in kids:
+            show(kid, depth + 1)
+
+    for root in sorted(children.get(None, []), key=lambda s: s["start"]):
+        show(root, 0)
+
+    by_name = {}
+    for s in spans:
+        if s["parent"] is None:
+            continue
+        kids = children.get(s["id"], [])
+        entry = by_name.setdefault(s["name"], [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += s["duration"]
+        entry[2] += max(0.0, s["duration"] - sum(c["duration"] for c in kids))
+    print(f"\n{'by name (self time)':<44} {'count':>6} {'total':>8} {'self':>8}")
+    for name, (count, duration, self_time) in sorted(by_name.items(), key=lambda item: -item[1][2])[:15]:
+        print(f"{name[:44]:<44} {count:>6} {duration:>7.1f}s {self_time:>7.1f}s")
+
+
+def find_trace(which: str = "latest") -> str:
+    """A trace file path from a path, 'latest', or part of a file name / run id."""
+    if os.path.isfile(which):
+        return which
+    files = sorted(f for f in os.listdir(RUN_TRACE_DIR) if f.endswith(".jsonl")) if os.path.isdir(RUN_TRACE_DIR) else []
+    if which != "latest":
+        files = [f for f in files if which in f] or [f for f in files if load(os.path.join(RUN_TRACE_DIR, f))[0].get("run_id") == which]
+    if not files:
+        raise FileNotFoundError(f"No run trace matching '{which}' in {RUN_TRACE_DIR}")
+    return os.path.join(RUN_TRACE_DIR, files[-1])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    parser = argparse.ArgumentParser(description="Show where the time of a traced run went")
+    parser.add_argument("trace", nargs="?", default="latest", help="Trace file, run id, or 'latest'")
+    parser.add_argument("--min-ms", type=float, default=0, help="Hide spans shorter than this")
+    parser.add_argument("--width", type=int, default=40, help="Timeline width in characters")
+    args = parser.parse_args()
+    report(find_trace(args.trace), args.min_ms, args.width)
@@ -1,323 +1,578 @@
 import os
 import sys
 import time
-import shutil
+import json
+import hashlib
+from datetime import datetime
 from playwright.sync_api import sync_playwright
 from dotenv import load_dotenv
+from browser_manager import BrowserManager, open_context
+import page_waits
+from page_waits import wait_for_whisk_ready, current_blobs
+from blob_transfer import fetch_blob_bytes, sniff_image_type
+from response_capture import ResponseCapture
+import image_pipeline
+import face_scorer
+import resource_policy
+from text_input import enter_text
+from whisk_results import GenerationResult, PromptQueue, salvage
+from content_backlog import ContentBacklog, BACKLOG_HARVEST
+import tracing
+import run_metrics
+import personas
 
 load_dotenv()
 sys.stdout.reconfigure(encoding='utf-8')
 
 REFERENCE_IMAGE_PATH = os.getenv("REFERENCE_IMAGE_PATH", "reference_image.jpg")
-STATE_FILE = "whisk_state.json"
-IS_HEADLESS = os.getenv("HEADLESS", "false").lower() == "true"
+# Whisk project URL per reference-image hash, so the face is uploaded and analysed once
+STATE_FILE = os.getenv("WHISK_STATE_FILE", "whisk_state.json")
+WHISK_URL = os.getenv("WHISK_URL", "https://labs.google/fx/tools/whisk/project")
+WHISK_PROFILE_DIR = os.getenv("WHISK_PROFILE_DIR", "chrome_profile")
+# Deadline for each generation pass to come back (until run_metrics has enough history)
+GENERATION_TIMEOUT = float(os.getenv("WHISK_GENERATION_TIMEOUT", "90"))
+# Number of Whisk tabs generating at the same time (1 = the original single-tab flow)
+WHISK_CONCURRENCY = int(os.getenv("WHISK_CONCURRENCY", "1"))
+# How long the multi-tab scheduler idles between rounds when no tab is ready
+POLL_INTERVAL_MS = 250
+# Reload the tab's project before a retry, in case the editor itself got stuck
+RETRY_RELOAD = os.getenv("WHISK_RETRY_RELOAD", "1") != "0"
 
+backlog = ContentBacklog()
 
-def generate_images(prompts: list, output_prefix: str = "generated_daily_post"):
+
+def generate_images(prompts: list, output_prefix: str = "generated_daily_post", concurrency: int = None, browser: BrowserManager = None,
+                    on_image_saved=None, theme: str = None):
     """
     Automates Whisk AI to generate multiple images by looping over a list of prompts.
-    Uses the double-generation trick for maximum face accuracy per prompt.
+    The first pass's variations are scored against the reference face
+    (face_scorer) and the best-scoring variation is kept. The double-generation
+    trick always runs unless FACE_MATCH_THRESHOLD is set (opt-in) and the best
+    first-pass variation reaches it.
+
+    With concurrency > 1, up to that many tabs are opened in the same persistent
+    context, each uploads the subject once, and prompts are spread across them so
+    the generations run at the same time. Results always come back in prompt order.
+
+    Pass a BrowserManager to reuse its warm Chrome instead of launching one.
+    `prompts` may also be a zero-argument callable; it is only called once the
+    tabs have finished navigation and face analysis, so that work can overlap
+    with prompt writing.
+
+    `on_image_saved(idx, path)` is called for each real (non-fallback) image
+    on this thread before generate_images returns, so a checkpoint is never
+    behind the returned result. Cropping and resizing run on a process pool
+    (image_pipeline) while the browser continues.
+
+    Every variation Whisk returns (both passes) is also kept in the content
+    backlog under `theme`, so unused ones can fill later posts.
+
+    A prompt that fails (no image, or an error on its tab) is retried in the
+    same session, up to WHISK_PROMPT_RETRIES times each and WHISK_RETRY_BUDGET in total,
+    after reloading the tab's project when RETRY_RELOAD is set. Images already
+    saved are always kept: only slots that never got one are filled with a copy
+    of the reference image, and the returned GenerationResult says which.
     """
-    print(f"Starting Whisk AI Automation for {len(prompts)} prompts...")
-    
+    queue = PromptQueue(prompts)
+    if callable(prompts):
+        print("Starting Whisk AI Automation (prompts will be supplied once Whisk is ready)...")
+    else:
+        print(f"Starting Whisk AI Automation for {len(prompts)} prompts...")
+
     if not os.path.exists(REFERENCE_IMAGE_PATH):
         print(f"[ERROR] Reference image not found: {REFERENCE_IMAGE_PATH}")
-        return []
+        return GenerationResult()
 
     abs_ref_image = os.path.abspath(REFERENCE_IMAGE_PATH)
     abs_output_prefix = os.path.abspath(output_prefix)
+    ref_hash = _reference_hash(abs_ref_image)
+    tab_count = max(1, concurrency or WHISK_CONCURRENCY)
+    if not callable(prompts):
+        tab_count = min(tab_count, len(prompts))
 
-    saved_images = []
-
-    with sync_playwright() as p:
-        chrome_path = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
-        if not os.path.exists(chrome_path):
-            chrome_path = r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe"
-        user_data_dir = os.path.join(os.getcwd(), "chrome_profile")
-
+    with personas.slot("whisk"), sync_playwright() as p, tracing.span("whisk", tabs=tab_count) as trace:
+        results = {}
         try:
-            print(f"Launching Chrome from {chrome_path} (Headless: {IS_HEADLESS})...")
-            context = p.chromium.launch_persistent_context(
-                user_data_dir=user_data_dir,
-                executable_path=chrome_path,
-                headless=IS_HEADLESS,
-                channel="chrome",
-                args=["--disable-blink-features=AutomationControlled"]
-            )
+            context, release = open_context(p, WHISK_PROFILE_DIR, browser)
         except Exception as e:
             print(f"[ERROR] Failed to launch Chrome: {e}")
-            return _fallback_all(abs_ref_image, abs_output_prefix, len(prompts))
-
-        page = context.new_page()
+            return salvage(results, queue.count(), abs_ref_image, abs_output_prefix, on_image_saved)
 
         try:
-            print("Navigating to Whisk AI...")
-            page.goto("https://labs.google/fx/tools/whisk/project", timeout=60000)
-            time.sleep(6)
+            if tab_count > 1:
+                print(f"Running prompts across {tab_count} tabs...")
+            stats = face_scorer.RunStats()
+            harvest = _Harvest(theme, datetime.now().strftime("%Y%m%d-%H%M%S")) if BACKLOG_HARVEST else None
+            workers = [
+                _tab_worker(context.new_page(), tab, queue, results, abs_ref_image, ref_hash, abs_output_prefix, stats,
+                            harvest, trace)
+                for tab in range(tab_count)
+            ]
+            _drive(workers)
+            stats.report()
+            if harvest:
+                harvest.report()
 
-            # ── Dismiss popup if present ────────────────────────────────────────
+            generated = salvage(results, queue.count(), abs_ref_image, abs_output_prefix, on_image_saved)
+            trace.set(images=len(generated.real), fallback=len(generated.fallback), retries=queue.retries_used)
+            if generated.real:
+                print(f"Successfully generated {len(generated.real)} heavily unique images!")
+            return generated
+
+        except Exception as e:
+            # Whatever was saved before the error is kept; only the rest falls back
+            print(f"[ERROR] Whisk automation error during multi-prompt: {e}")
+            return salvage(results, queue.count(), abs_ref_image, abs_output_prefix, on_image_saved)
+
+        finally:
+            print("Closing browser session...")
             try:
-                close_btns = page.locator("button:has-text('CLOSE'), button:has-text('Close')").all()
-                for btn in close_btns:
-                    if btn.is_visible():
-                        btn.click()
-                        print("Dismissed popup.")
-                        time.sleep(1)
-                        break
+                release()
             except Exception:
                 pass
 
-            # ── Check if logged in ──────────────────────────────────────────────
-            if "google.com/signin" in page.url or "accounts.google.com" in page.url:
-                print("[WARNING] Not logged in to Google. Please log in manually.")
-                while "google.com/signin" in page.url or "accounts.google.com" in page.url:
-                    time.sleep(3)
-                print("Login detected! Continuing...")
-                time.sleep(5)
 
-            # ── Upload face (Subject slot) ──────────────────────────────────────
-            print(f"Uploading reference face image: {abs_ref_image}")
-            page.locator("button:has-text('ADD IMAGES')").click()
-            time.sleep(2)
+class _Harvest:
+    """Files every variation of this run into the content backlog as one batch."""
+
+    def __init__(self, theme: str, batch: str):
+        self.theme = theme
+        self.batch = batch
+        self.stored = 0
+
+    def add(self, variations: list, prompt_text: str, chosen):
+        try:
+            extra = [v for v in variations if v is not chosen]
+            self.stored += backlog.add(extra, prompt_text, self.theme, self.batch)
+            if chosen:
+                self.stored += backlog.add([chosen], prompt_text, self.theme, self.batch, used_run="generated")
+        except Exception as e:
+            print(f"[WARNING] Could not add variations to the content backlog: {e}")
+
+    def report(self):
+        if self.stored:
+            print(f"Added {self.stored} variations to the content backlog ({backlog.unused_count(self.theme)} unused for '{self.theme}').")
+
+
+def _drive(workers: list):
+    """
+    Runs tab workers to completion. A worker is a generator that yields a
+    page_waits.Wait for its page and is sent the wait's result back.
+
+    With a single worker in flight each wait blocks on its event-driven
+    wait_for_function; with several, every pending wait is polled in turn so
+    all tabs make progress while their generations run server-side.
+    A wait that raises (e.g. the tab crashed) is thrown into its worker.
+    """
+    pending = {}  # worker -> (page, wait, start)
+
+    def advance(worker, value=None, error=None):
+        try:
+            page, wait = worker.throw(error) if error else worker.send(value)
+        except StopIteration:
+            pending.pop(worker, None)
+            return
+        pending[worker] = (page, wait, time.monotonic())
+
+    for worker in workers:
+        advance(worker)
 
-            face_uploaded = False
+    while pending:
+        if len(pending) == 1:
+            worker, (page, wait, _) = next(iter(pending.items()))
             try:
-                file_inputs = page.locator("input[type='file'][accept='image/*']").all()
-                if file_inputs:
-                    file_inputs[0].set_input_files(abs_ref_image)
-                    print("Face image uploaded to SUBJECT slot via file input!")
-                    face_uploaded = True
-                    time.sleep(3)
-                else:
-                    print("[WARNING] No file inputs found after ADD IMAGES click.")
+                value = page_waits.wait_for(page, wait)
             except Exception as e:
-                print(f"[WARNING] Direct file input failed: {e}")
-
-            if not face_uploaded:
-                try:
-                    with page.expect_file_chooser(timeout=8000) as fc_info:
-                        page.locator("button:has-text('control_point')").first.click()
-                    file_chooser = fc_info.value
-                    file_chooser.set_files(abs_ref_image)
-                    print("Face uploaded via control_point button!")
-                    time.sleep(3)
-                except Exception as e2:
-                    print(f"[WARNING] All face upload attempts failed: {e2}. Proceeding without face reference.")
-
-            # ── Wait for face analysis ──────────────────────────────────────────
-            print("Waiting for Whisk to analyze the face image...")
-            for i in range(30):
-                time.sleep(1)
-                try:
-                    page_text = page.locator("body").inner_text()
-                    if "analyzing image" not in page_text.lower():
-                        print(f"Image analysis complete! ({i+1}s)")
-                        break
-                    if i % 5 == 0:
-                        print(f"  Still analyzing... ({i+1}s)")
-                except Exception:
-                    pass
-            time.sleep(15)  # Buffer after analysis
-
-            def click_generate():
-                page.evaluate("""
-                    () => {
-                        const btns = document.querySelectorAll('button');
-                        for (const b of btns) {
-                            if (b.innerText && b.innerText.includes('arrow_forward')) {
-                                b.click(); return;
-                            }
-                        }
-                        for (const b of btns) {
-                            if (b.innerText && (b.innerText.toLowerCase().includes('generate') || b.innerText.toLowerCase().includes('submit'))) {
-                                b.click(); return;
-                            }
-                        }
-                    }
-                """)
-
-            # ── Iterate over all 3 prompts ─────────────────────────────────────
-            for idx, prompt_text in enumerate(prompts):
-                print(f"\n---> Generating Image {idx + 1} of {len(prompts)} <---")
-                
-                # Enter prompt
-                print("Entering prompt...")
-                prompt_box = page.locator("textarea, input[type='text'], [contenteditable='true']").first
-                prompt_box.click(force=True)
-                time.sleep(0.5)
-                # Select all and delete previous prompt
-                page.keyboard.press("Control+A")
-                page.keyboard.press("Backspace")
-                time.sleep(0.5)
-                # clear robustly via JS
-                page.evaluate("() => { const el = document.querySelector('textarea, input[type=\"text\"], [contenteditable=\"true\"]'); if(el) { if(el.value !== undefined) el.value = ''; else el.innerText = ''; } }")
-                time.sleep(0.5)
-                prompt_box.fill(prompt_text)
-                time.sleep(1)
-
-                # Set aspect ratio (only needed on the first prompt)
-                if idx == 0:
-                    print("Setting aspect ratio to 9:16 PORTRAIT...")
-                    page.evaluate("""
-                        () => {
-                            const btns = document.querySelectorAll('button');
-                            for (const b of btns) {
-                                if (b.innerText && b.innerText.includes('aspect_ratio')) {
-                                    b.click(); return;
-                                }
-                            }
-                        }
-                    """)
-                    time.sleep(1)
-                    try:
-                        page.locator("text=9:16").click()
-                        print("9:16 PORTRAIT selected!")
-                    except Exception:
-                        try:
-                            page.locator("text=PORTRAIT").click()
-                            print("PORTRAIT selected!")
-                        except Exception:
-                            pass
-                    time.sleep(1)
-
-                # Record blob count before generation
-                imgs_before = page.locator("img[src^='blob:']").all()
-                blobs_before = [img.get_attribute("src") for img in imgs_before if (img.get_attribute("src") or "").startswith("blob:")]
-
-                # ── Click Generate (First Pass) ────────────────────────────────────
-                print(f"Clicking Generate (First pass for Prompt {idx+1})...")
-                click_generate()
-                time.sleep(2)
-                
-                print("Waiting for FIRST generation completion (up to 90s)...")
-                initial_blobs_this_run = []
-                for _ in range(45):
-                    time.sleep(2)
-                    try:
-                        imgs = page.locator("img[src^='blob:']").all()
-                        current_blobs = [img.get_attribute("src") for img in imgs if (img.get_attribute("src") or "").startswith("blob:")]
-                        
-                        new_blobs = [b for b in current_blobs if b not in blobs_before]
-                        if len(new_blobs) > 0:
-                            print("First generation appeared! Waiting 10s...")
-                            time.sleep(10)
-                            imgs = page.locator("img[src^='blob:']").all()
-                            initial_blobs_this_run = [img.get_attribute("src") for img in imgs if (img.get_attribute("src") or "").startswith("blob:")]
-                            break
-                    except Exception:
-                        pass
-                
-                # ── Click Generate AGAIN for accurate face match ─────────────────
-                print(f"Clicking Generate a SECOND time (for Prompt {idx+1}) to refine face match...")
-                click_generate()
-                time.sleep(2)
-                
-                print("Waiting for SECOND generation completion (up to 90s)...")
-                newest_blob_url = None
-                for _ in range(45):
-                    time.sleep(2)
-                    try:
-                        imgs = page.locator("img[src^='blob:']").all()
-                        current_blobs = [img.get_attribute("src") for img in imgs if (img.get_attribute("src") or "").startswith("blob:")]
-                        
-                        new_blobs_second_run = [b for b in current_blobs if b not in initial_blobs_this_run and b not in blobs_before]
-                        
-                        if len(initial_blobs_this_run) > 0 and len(new_blobs_second_run) > 0:
-                            print(f"Second generation for Prompt {idx+1} appeared!")
-                            time.sleep(10)  # wait for all variations to settle
-                            imgs = page.locator("img[src^='blob:']").all()
-                            current_blobs = [img.get_attribute("src") for img in imgs if (img.get_attribute("src") or "").startswith("blob:")]
-                            newest_blob_url = current_blobs[-1]
-                            break
-                        elif len(initial_blobs_this_run) == 0 and len(new_blobs) > 0:
-                            # fallback if first run failed to register
-                            time.sleep(10)
-                            imgs = page.locator("img[src^='blob:']").all()
-                            current_blobs = [img.get_attribute("src") for img in imgs if (img.get_attribute("src") or "").startswith("blob:")]
-                            newest_blob_url = current_blobs[-1]
-                            break
-                    except Exception:
-                        pass
-
-                if not newest_blob_url and len(initial_blobs_this_run) > 0:
-                    newest_blob_url = initial_blobs_this_run[-1]
-                
-                if not newest_blob_url:
-                    print(f"[WARNING] Blob not found for prompt {idx+1}. Skipping.")
-                    continue
-
-                # ── Save the finalized image ──────────────────────────────────────
-                print(f"Saving finalized image {idx+1} from blob URL...")
-                try:
-                    img_data = page.evaluate("""
-                        async (blobUrl) => {
-                            const res = await fetch(blobUrl);
-                            const blob = await res.blob();
-                            const buf = await blob.arrayBuffer();
-                            return Array.from(new Uint8Array(buf));
-                        }
-                    """, newest_blob_url)
-                    
-                    current_output_path = f"{abs_output_prefix}_{idx+1}.jpg"
-                    with open(current_output_path, "wb") as f:
-                        f.write(bytes(img_data))
-                    size_kb = os.path.getsize(current_output_path) // 1024
-                    print(f"Image {idx+1} saved: {current_output_path} ({size_kb} KB)")
-                    
-                    if size_kb > 1:
-                        # ── Ensure exactly 9:16 portrait via PIL center-crop ─────────────
-                        try:
-                            from PIL import Image
-                            img = Image.open(current_output_path)
-                            w, h = img.size
-                            target_ratio = 9 / 16
-                            current_ratio = w / h
-                            if abs(current_ratio - target_ratio) > 0.02:
-                                if current_ratio > target_ratio:
-                                    new_w = int(h * target_ratio)
-                                    left = (w - new_w) // 2
-                                    img = img.crop((left, 0, left + new_w, h))
-                                else:
-                                    new_h = int(w / target_ratio)
-                                    top = (h - new_h) // 2
-                                    img = img.crop((0, top, w, top + new_h))
-                            img = img.resize((1080, 1920), Image.LANCZOS)
-                            img.save(current_output_path, "JPEG", quality=95)
-                            print(f"Image {idx+1} resized to exactly 9:16 (1080x1920)!")
-                        except Exception as pil_err:
-                            print(f"[WARNING] PIL resize failed for image {idx+1}: {pil_err}")
-                        
-                        saved_images.append(current_output_path)
-                except Exception as e:
-                    print(f"Blob save failed for image {idx+1}: {e}")
-
-            if not saved_images:
-                return _fallback_all(abs_ref_image, abs_output_prefix, len(prompts))
-
-            print(f"Successfully generated {len(saved_images)} heavily unique images!")
-            return saved_images
+                advance(worker, error=e)
+            else:
+                advance(worker, value)
+            continue
 
-        except Exception as e:
-            print(f"[ERROR] Whisk automation error during multi-prompt: {e}")
-            return _fallback_all(abs_ref_image, abs_output_prefix, len(prompts))
+        progressed = False
+        for worker, (page, wait, start) in list(pending.items()):
+            try:
+                finished, value = page_waits.poll(page, wait, start)
+            except Exception as e:
+                advance(worker, error=e)
+                progressed = True
+                continue
+            if finished:
+                advance(worker, value)
+                progressed = True
+        if not progressed and pending:
+            next(iter(pending.values()))[0].wait_for_timeout(POLL_INTERVAL_MS)
 
-        finally:
-            print("Closing browser session...")
+
+def _tab_worker(page, tab: int, queue: PromptQueue, results: dict, abs_ref_image: str, ref_hash: str, abs_output_prefix: str,
+                stats: face_scorer.RunStats = None, harvest: _Harvest = None, trace=tracing.NULL_SPAN):
+    """
+    Prepares one Whisk tab, then keeps taking prompts off the shared queue until it is empty.
+    A failed prompt goes back on the queue (see PromptQueue.retry), after reloading this
+    tab's project. A tab that cannot be prepared stops; the other tabs take its prompts.
+    Tabs interleave on one thread, so their spans are parented explicitly rather than by nesting.
+    """
+    routes = resource_policy.install(page, resource_policy.WHISK)
+    capture = ResponseCapture(page)
+    tab_trace = tracing.span("whisk tab", parent=trace, tab=tab + 1)
+    try:
+        yield from _prepare_page(page, tab, abs_ref_image, ref_hash, tab_trace)
+        first_on_page = True
+        while (item := queue.take()) is not None:
+            idx, prompt_text = item
+            total = len(queue.resolve())
+            attempt = queue.attempt(idx)
+            prompt_trace = tab_trace.step("prompt", prompt=idx + 1, attempt=attempt)
             try:
-                context.close()
-            except Exception:
-                pass
+                saved = yield from _generate_prompt(page, capture, idx, prompt_text, total, first_on_page, abs_output_prefix,
+                                                    abs_ref_image, stats, harvest, prompt_trace)
+            except Exception as e:
+                print(f"[ERROR] Prompt {idx+1} failed{f' on tab {tab + 1}' if tab else ''}: {e}")
+                prompt_trace.end("error", e)
+                saved = None
+            first_on_page = False
+            if saved:
+                results[idx] = saved
+                saved.add_done_callback(lambda f, idx=idx: _on_processed(idx, f))
+                continue
+
+            if not queue.retry(idx, prompt_text):
+                print(f"[WARNING] No retries left for prompt {idx+1} after {attempt} attempt(s).")
+                continue
+            print(f"[RETRY] Prompt {idx+1} queued for attempt {attempt + 1}.")
+            if RETRY_RELOAD:
+                yield from _prepare_page(page, tab, abs_ref_image, ref_hash, tab_trace)
+                first_on_page = True
+    except Exception as e:
+        print(f"[ERROR] Whisk tab {tab + 1} stopped: {e}")
+        tab_trace.end("error", e)
+    finally:
+        tab_trace.end()
+        routes.report()
+
+
+def _prepare_page(page, tab: int, abs_ref_image: str, ref_hash: str, trace=tracing.NULL_SPAN):
+    """
+    Gets a tab to a Whisk project whose subject is the reference face.
+    Reuses the project saved in STATE_FILE for this exact reference image when it
+    is still valid; otherwise navigates fresh, uploads the face and waits for analysis.
+    """
+    saved = _load_state().get(ref_hash)
+    if saved:
+        print(f"Reusing prepared Whisk project{f' (tab {tab + 1})' if tab else ''}: {saved['project_url']}")
+        nav = trace.step("navigate", reused=True)
+        page.goto(saved["project_url"], timeout=60000)
+        yield page, page_waits.whisk_ready()
+        _dismiss_popup(page)
+        _ensure_logged_in(page)
+        if (yield page, page_waits.project_ready(saved["project_url"])) is not None:
+            print("Subject already uploaded and analysed. Skipping upload.")
+            return
+        print("[WARNING] Saved Whisk project is stale. Falling back to a fresh upload.")
+        nav.set(stale=True)
+        _forget_project(ref_hash)
+
+    print(f"Navigating to Whisk AI{f' (tab {tab + 1})' if tab else ''}...")
+    trace.step("navigate", reused=False)
+    page.goto(WHISK_URL, timeout=60000)
+    yield page, page_waits.whisk_ready()
+    _dismiss_popup(page)
+    _ensure_logged_in(page)
+
+    # ── Upload face (Subject slot) ──────────────────────────────────────
+    print(f"Uploading reference face image: {abs_ref_image}")
+    upload = trace.step("face upload")
+    page.locator("button:has-text('ADD IMAGES')").click()
+
+    face_uploaded = False
+    try:
+        file_input = page.locator("input[type='file'][accept='image/*']").first
+        file_input.wait_for(state="attached", timeout=5000)
+        file_inputs = page.locator("input[type='file'][accept='image/*']").all()
+        if file_inputs:
+            file_inputs[0].set_input_files(abs_ref_image)
+            print("Face image uploaded to SUBJECT slot via file input!")
+            face_uploaded = True
+        else:
+            print("[WARNING] No file inputs found after ADD IMAGES click.")
+    except Exception as e:
+        print(f"[WARNING] Direct file input failed: {e}")
+
+    if not face_uploaded:
+        try:
+            with page.expect_file_chooser(timeout=8000) as fc_info:
+                page.locator("button:has-text('control_point')").first.click()
+            file_chooser = fc_info.value
+            file_chooser.set_files(abs_ref_image)
+            print("Face uploaded via control_point button!")
+        except Exception as e2:
+            print(f"[WARNING] All face upload attempts failed: {e2}. Proceeding without face reference.")
+
+    # ── Wait for face analysis ──────────────────────────────────────────
+    upload.set(uploaded=face_uploaded)
+    print("Waiting for Whisk to analyze the face image...")
+    analysis = trace.step("face analysis")
+    if (yield page, page_waits.analyzing(True)) is None:
+        print("  Analysis banner never appeared; assuming it already finished.")
+    analysed = (yield page, page_waits.analyzing(False)) is not None
+    if analysed:
+        print("Image analysis complete!")
+    yield page, page_waits.images_loaded()
+    analysis.end(analysed=analysed)
+
+    if face_uploaded and analysed and page.url.rstrip("/") != WHISK_URL:
+        _remember_project(ref_hash, page.url)
+
+
+def _dismiss_popup(page):
+    try:
+        close_btns = page.locator("button:has-text('CLOSE'), button:has-text('Close')").all()
+        for btn in close_btns:
+            if btn.is_visible():
+                btn.click()
+                btn.wait_for(state="hidden", timeout=5000)
+                print("Dismissed popup.")
+                break
+    except Exception:
+        pass
+
+
+def _ensure_logged_in(page):
+    if "google.com/signin" in page.url or "accounts.google.com" in page.url:
+        print("[WARNING] Not logged in to Google. Please log in manually.")
+        page.wait_for_url(lambda url: "google.com/signin" not in url and "accounts.google.com" not in url, timeout=0)
+        print("Login detected! Continuing...")
+        wait_for_whisk_ready(page)
+
+
+def _reference_hash(path: str) -> str:
+    """Content hash of the reference image, so a new face never reuses an old project."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_state() -> dict:
+    try:
+        with open(STATE_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[WARNING] Ignoring unreadable {STATE_FILE}: {e}")
+        return {}
+
+
+def _write_state(state: dict):
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _remember_project(ref_hash: str, project_url: str):
+    state = _load_state()
+    state[ref_hash] = {"project_url": project_url, "saved_at": datetime.now().isoformat(timespec="seconds")}
+    _write_state(state)
+    print(f"Saved Whisk project for reuse: {project_url}")
+
+
+def _forget_project(ref_hash: str):
+    state = _load_state()
+    if state.pop(ref_hash, None) is not None:
+        _write_state(state)
+
+
+def _click_generate(page):
+    page.evaluate("""
+        () => {
+            const btns = document.querySelectorAll('button');
+            for (const b of btns) {
+                if (b.innerText && b.innerText.includes('arrow_forward')) {
+                    b.click(); return;
+                }
+            }
+            for (const b of btns) {
+                if (b.innerText && (b.innerText.toLowerCase().includes('generate') || b.innerText.toLowerCase().includes('submit'))) {
+                    b.click(); return;
+                }
+            }
+        }
+    """)
+
+
+def _set_aspect_ratio(page):
+    print("Setting aspect ratio to 9:16 PORTRAIT...")
+    page.evaluate("""
+        () => {
+            const btns = document.querySelectorAll('button');
+            for (const b of btns) {
+                if (b.innerText && b.innerText.includes('aspect_ratio')) {
+                    b.click(); return;
+                }
+            }
+        }
+    """)
+    try:
+        page.locator("text=9:16").click(timeout=5000)
+        print("9:16 PORTRAIT selected!")
+    except Exception:
+        try:
+            page.locator("text=PORTRAIT").click(timeout=5000)
+            print("PORTRAIT selected!")
+        except Exception:
+            pass
+
+
+def _generate_prompt(page, capture: ResponseCapture, idx: int, prompt_text: str, total: int, first_on_page: bool, abs_output_prefix: str,
+                     abs_ref_image: str, stats: face_scorer.RunStats = None, harvest: _Harvest = None, prompt_trace=tracing.NULL_SPAN):
+    """
+    Runs the first generation pass for one prompt on `page`, a second pass only if
+    no variation matches the reference face well enough, and saves the best one.
+    Returns the pool Future for the saved image, or None.
+    """
+    print(f"\n---> Generating Image {idx + 1} of {total} <---")
+
+    # Enter prompt
+    print("Entering prompt...")
+    prompt_trace.step("enter prompt")
+    prompt_box = page.locator("textarea, input[type='text'], [contenteditable='true']").first
+    if not enter_text(page, prompt_box, prompt_text, label=f"Prompt {idx+1}"):
+        print(f"[WARNING] Prompt {idx+1} may not match exactly; generating anyway.")
+
+    # Set aspect ratio (only needed once per tab)
+    if first_on_page:
+        prompt_trace.step("aspect ratio")
+        _set_aspect_ratio(page)
+
+    # Only used if the network capture misses (e.g. Whisk renamed its endpoint)
+    blobs_before = current_blobs(page)
+
+    # ── Click Generate (First Pass) ────────────────────────────────────
+    print(f"Clicking Generate (First pass for Prompt {idx+1})...")
+    generation = prompt_trace.step("generation pass", pass_no=1)
+    capture.arm(idx, 1)
+    _click_generate(page)
+
+    generation_timeout = run_metrics.deadline("whisk.generation", GENERATION_TIMEOUT)
+    print(f"Waiting for FIRST generation completion (up to {generation_timeout:.0f}s)...")
+    first_pass = (yield page, capture.wait(idx, 1, timeout=generation_timeout, label=f"Prompt {idx+1} first pass")) or []
+    generation.end(variations=len(first_pass))
+    with tracing.span("face scoring", parent=prompt_trace, pass_no=1) as scoring:
+        chosen, chosen_score = face_scorer.best(first_pass, abs_ref_image)
+        scoring.set(score=chosen_score)
+    variations = list(first_pass)
+    if first_pass:
+        print(f"First generation arrived ({len(first_pass)} variations)!"
+              + (f" Best face score: {chosen_score:.2f}" if chosen_score is not None else ""))
+
+    skip_second = face_scorer.skip_second_pass(chosen_score)
+    if skip_second:
+        print(f"Face match is good enough (>= {face_scorer.FACE_MATCH_THRESHOLD}); skipping the second pass.")
+    else:
+        # ── Click Generate AGAIN for accurate face match ─────────────────
+        print(f"Clicking Generate a SECOND time (for Prompt {idx+1}) to refine face match...")
+        generation = prompt_trace.step("generation pass", pass_no=2)
+        capture.arm(idx, 2)
+        _click_generate(page)
+
+        print(f"Waiting for SECOND generation completion (up to {generation_timeout:.0f}s)...")
+        second_pass = (yield page, capture.wait(idx, 2, timeout=generation_timeout, label=f"Prompt {idx+1} second pass")) or []
+        generation.end(variations=len(second_pass))
+        if second_pass:
+            with tracing.span("face scoring", parent=prompt_trace, pass_no=2) as scoring:
+                refined, refined_score = face_scorer.best(second_pass, abs_ref_image)
+                scoring.set(score=refined_score)
+            variations += second_pass
+            print(f"Second generation for Prompt {idx+1} arrived ({len(second_pass)} variations)!"
+                  + (f" Best face score: {refined_score:.2f}" if refined_score is not None else ""))
+            # Without scores the refined pass wins, as it always did
+            if chosen_score is None or refined_score is None or refined_score >= chosen_score:
+                chosen, chosen_score = refined, refined_score
+
+    if stats is not None:
+        stats.record(skip_second, chosen_score)
+    prompt_trace.set(second_pass=not skip_second, score=chosen_score)
+    if harvest and variations:
+        harvest.add(variations, prompt_text, chosen)
+    prompt_trace.step("save image", salvaged=not chosen)
+    if chosen:
+        img_data = chosen.data
+    else:
+        img_data = _salvage_from_dom(page, blobs_before, idx)
+
+    if not img_data:
+        print(f"[WARNING] No generated image found for prompt {idx+1}. Skipping.")
+        prompt_trace.end("error", "no generated image")
+        return None
+
+    saved = _save_image(img_data, idx, abs_output_prefix, prompt_trace)
+    prompt_trace.end()
+    return saved
+
+
+def _salvage_from_dom(page, blobs_before: list, idx: int):
+    """Last resort when no generation response was captured: reads the newest blob: image on the page."""
+    new_blobs = [b for b in current_blobs(page) if b not in blobs_before]
+    if not new_blobs:
+        return None
+    print(f"[WARNING] No generation response captured for prompt {idx+1}; reading newest blob image from the page.")
+    try:
+        return fetch_blob_bytes(page, new_blobs[-1])
+    except Exception as e:
+        print(f"Blob read failed for image {idx+1}: {e}")
+        return None
 
 
-def _fallback_all(ref_image: str, output_prefix: str, count: int) -> list[str]:
-    """Copies the reference image multiple times as a fallback."""
-    print(f"[FALLBACK] Using reference image to fill {count} slots.")
-    paths = []
-    for i in range(count):
-        pth = f"{output_prefix}_{i+1}.jpg"
-        shutil.copy(ref_image, pth)
-        paths.append(pth)
-    return paths
+def _save_image(img_data: bytes, idx: int, abs_output_prefix: str, trace=tracing.NULL_SPAN):
+    """
+    Validates generated image bytes and hands them to the post-processing pool,
+    which crops them to 9:16 and writes the file while the browser moves on.
+    Returns a Future of the pool's result, or None if the bytes are unusable.
+    """
+    if not sniff_image_type(img_data):
+        print(f"Image save failed for image {idx+1}: payload is not a JPEG/PNG/WEBP image")
+        return None
+    if len(img_data) // 1024 <= 1:
+        print(f"Image save failed for image {idx+1}: only {len(img_data)} bytes")
+        return None
+
+    current_output_path = f"{abs_output_prefix}_{idx+1}.jpg"
+    print(f"Image {idx+1} received ({len(img_data) // 1024} KB). Post-processing in the background...")
+    future = image_pipeline.submit(img_data, current_output_path)
+    _trace_processing(tracing.span("pil process", parent=trace, bytes_in=len(img_data)), future)
+    return future
+
+
+def _trace_processing(span, future):
+    """Ends `span` when the pool finishes the image (queueing included), on the pool's callback thread."""
+    def done(f):
+        try:
+            result = f.result()
+        except Exception as e:
+            span.end("error", e)
+            return
+        span.end("error" if result["error"] else "ok", result["error"], bytes_out=result["bytes_out"], quality=result["quality"])
+    future.add_done_callback(done)
+
+
+def _on_processed(idx: int, future):
+    """
+    Reports a finished post-processing job. Runs on the pool's callback thread,
+    which may be after result() has already returned elsewhere, so it only logs.
+    """
+    try:
+        result = future.result()
+    except Exception as e:
+        print(f"Image save failed for image {idx+1}: {e}")
+        return
+    if result["error"]:
+        print(f"[WARNING] PIL resize failed for image {idx+1}: {result['error']}")
+    else:
+        print(f"Image {idx+1} saved at exactly 9:16 (1080x1920): {result['path']} "
+              f"({result['bytes_out'] // 1024} KB, q{result['quality']}, {result['saved_bytes'] // 1024} KB saved vs q95)")
+
 
 if __name__ == "__main__":
     test_prompts = [
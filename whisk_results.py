@@ -0,0 +1,102 @@
+import os
+import shutil
+from collections import deque
+
+# The prompt queue and slot-aligned results of one Whisk run. Kept free of any
+# browser code so retry and salvage behaviour can be tested on its own.
+
+# Extra attempts a failed prompt gets in the same session, and how many the whole run may spend
+PROMPT_RETRIES = int(os.getenv("WHISK_PROMPT_RETRIES", "1"))
+RETRY_BUDGET = int(os.getenv("WHISK_RETRY_BUDGET", "3"))
+
+
+class GenerationResult(list):
+    """
+    Image paths in prompt order, one per prompt. Slots in `fallback` hold a copy
+    of the reference image because their prompt never produced an image; every
+    other slot is a real generation.
+    """
+
+    def __init__(self, paths: list = (), fallback: list = ()):
+        super().__init__(paths)
+        self.fallback = sorted(fallback)
+
+    def is_real(self, idx: int) -> bool:
+        return idx not in self.fallback
+
+    @property
+    def real(self) -> list:
+        """Paths of the real generations only, in prompt order."""
+        return [path for idx, path in enumerate(self) if self.is_real(idx)]
+
+
+class PromptQueue:
+    """Prompts shared by all tabs. The source list (or callable) is resolved on first use."""
+
+    def __init__(self, source, retries: int = PROMPT_RETRIES, budget: int = RETRY_BUDGET):
+        self._source = source
+        self._prompts = None
+        self._pending = deque()
+        self._retries = retries
+        self._budget = budget
+        self._failures = {}
+        self.retries_used = 0
+
+    def resolve(self) -> list:
+        if self._prompts is None:
+            self._prompts = list(self._source() if callable(self._source) else self._source)
+            self._pending.extend(enumerate(self._prompts))
+        return self._prompts
+
+    def take(self):
+        """Returns the next (idx, prompt) to generate, or None when all are taken."""
+        self.resolve()
+        return self._pending.popleft() if self._pending else None
+
+    def attempt(self, idx: int) -> int:
+        """Which attempt at prompt `idx` is about to run (1 = the first)."""
+        return self._failures.get(idx, 0) + 1
+
+    def retry(self, idx: int, prompt: str) -> bool:
+        """Puts a failed prompt back at the end of the queue if its retries and the run's budget allow."""
+        self._failures[idx] = self._failures.get(idx, 0) + 1
+        if self._failures[idx] > self._retries or self.retries_used >= self._budget:
+            return False
+        self.retries_used += 1
+        self._pending.append((idx, prompt))
+        return True
+
+    def count(self) -> int:
+        """Number of prompts; resolves a deferred source, or 0 if it failed."""
+        try:
+            return len(self.resolve())
+        except Exception as e:
+            print(f"[ERROR] Prompts never became available: {e}")
+            return 0
+
+
+def salvage(results: dict, count: int, ref_image: str, output_prefix: str, on_image_saved=None) -> GenerationResult:
+    """
+    Collects the images handed to the post-processing pool, checkpointing each
+    through `on_image_saved` as it is collected, and copies the reference image
+    into only the slots that never got one.
+    """
+    paths, fallback = [], []
+    for idx in range(count):
+        if idx in results:
+            try:
+                path = results[idx].result()["path"]
+            except Exception:
+                path = None  # already reported by whisk_automator._on_processed
+            if path:
+                if on_image_saved:
+                    on_image_saved(idx, path)
+                paths.append(path)
+                continue
+        pth = f"{output_prefix}_{idx+1}.jpg"
+        shutil.copy(ref_image, pth)
+        paths.append(pth)
+        fallback.append(idx)
+    if fallback:
+        print(f"[FALLBACK] Using reference image to fill {len(fallback)} of {count} slots: {[i + 1 for i in fallback]}")
+    return GenerationResult(paths, fallback)